@@ -0,0 +1,225 @@
+"""
+Benchmarks for the trading hot paths, run offline against testing.mock_exchange.MockExchange.
+
+    python benchmark.py                   # run and compare with benchmark_baseline.json
+    python benchmark.py --save-baseline   # run and store the results as the new baseline
+    python benchmark.py --latency 0.005   # add 5 ms of simulated network latency per call
+
+Every result is in seconds (lower is better). A result more than --tolerance slower than
+its baseline is reported as a regression and makes the script exit with status 1.
+Baselines depend on the machine, so refresh them when the hardware changes.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+import bot
+from testing.mock_exchange import FakeUserDataStreamServer, MockExchange
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+GRID_SIZES = (10, 100, 500)
+SCAN_SYMBOLS = 2000
+PAIR = "BTCUSDT"
+DEFAULT_TOLERANCE = 1.0
+DEFAULT_REPEAT = 5
+
+
+def grid_params(grids):
+    return {'pair': PAIR, 'lower_bound': 90.0, 'upper_bound': 110.0, 'grids': grids, 'investment': 20.0 * grids}
+
+
+def sweep_path(sweeps=2, points=2000):
+    """Starts at 100 and sweeps the whole grid range down and up `sweeps` times."""
+    legs = [np.linspace(100, 89, points // 2)]
+    for _ in range(sweeps):
+        legs += [np.linspace(89, 111, points), np.linspace(111, 89, points)]
+    return np.concatenate(legs)
+
+
+def make_exchange(latency, path=None):
+    return MockExchange({PAIR: sweep_path() if path is None else path}, latency=latency,
+                            weight_per_minute=10 ** 9, orders_per_10s=10 ** 9)
+
+
+def make_bot(exchange, grids, stream_url=None):
+    bot.symbol_cache.invalidate()
+    return bot.GridBot(exchange, grid_params(grids), None, stream_url=stream_url)
+
+
+def bench_grid_setup(grids, latency):
+    """Seconds to build and place a fresh ladder."""
+    grid_bot = make_bot(make_exchange(latency), grids)
+    start = time.perf_counter()
+    grid_bot.setup_grid()
+    return time.perf_counter() - start
+
+
+def bench_fill_handling(grids, latency):
+    """Mean seconds from a fill event to its counter-order, over full price sweeps."""
+    exchange = make_exchange(latency)
+    grid_bot = make_bot(exchange, grids)
+    grid_bot.setup_grid()
+    timings = []
+
+    def on_fill(event):
+        start = time.perf_counter()
+        grid_bot.handle_filled_order(bot.UserDataStream.execution_report_to_order(event))
+        timings.append(time.perf_counter() - start)
+
+    exchange.subscribe(on_fill)
+    while not exchange.exhausted():
+        exchange.step(100)
+    if not timings:
+        raise RuntimeError("The price path did not fill any grid order")
+    return sum(timings) / len(timings)
+
+
+def bench_regrid(grids, latency):
+    """Seconds to shift a live grid up by a tenth of its levels, as a trailing grid re-centres."""
+    exchange = make_exchange(latency)
+    grid_bot = make_bot(exchange, grids)
+    grid_bot.setup_grid(100.0)
+    lower, upper = grid_bot.params['lower_bound'], grid_bot.params['upper_bound']
+    shift = max(grids // 10, 1) * (upper - lower) / (grids - 1)
+    params = dict(grid_bot.params, lower_bound=lower + shift, upper_bound=upper + shift)
+    start = time.perf_counter()
+    grid_bot.regrid(params, 100.0 + shift)
+    return time.perf_counter() - start
+
+
+def scanner_message(symbols, rng):
+    now = int(time.time() * 1000)
+    closes = rng.uniform(1, 100, len(symbols))
+    volumes = rng.uniform(0, 1e7, len(symbols))
+    return [
+        {'e': '24hrMiniTicker', 'E': now, 's': s, 'c': f"{c:.4f}", 'o': '50', 'h': '101', 'l': '0.5',
+         'v': '1000', 'q': f"{q:.2f}"}
+        for s, c, q in zip(symbols, closes, volumes)
+    ]
+
+
+def bench_market_scan(latency):
+    """Seconds to apply one all-market ticker message and rank the top 10 pairs."""
+    rng = np.random.default_rng(7)
+    symbols = [f"C{i}USDT" for i in range(SCAN_SYMBOLS)]
+    scanner = bot.MarketScanner(universe=symbols)
+    messages = [scanner_message(symbols, rng) for _ in range(5)]
+    scanner.process(messages[0])
+    start = time.perf_counter()
+    for message in messages[1:]:
+        scanner.process(message)
+        scanner.top(10)
+    return (time.perf_counter() - start) / (len(messages) - 1)
+
+
+def bench_shutdown(grids, latency):
+    """Seconds from stop() to the bot thread having cancelled its ladder and exited."""
+    server = FakeUserDataStreamServer().start()
+    try:
+        exchange = make_exchange(latency)
+        grid_bot = make_bot(exchange, grids, stream_url=server.url)
+        grid_bot.start()
+        deadline = time.time() + 60
+        while (grid_bot.book is None or len(grid_bot.book.open_orders()) < len(grid_bot.book) - 1) \
+                and time.time() < deadline:
+            time.sleep(0.01)
+        start = time.perf_counter()
+        grid_bot.stop()
+        grid_bot.join(30)
+        elapsed = time.perf_counter() - start
+        if grid_bot.is_alive() or exchange.get_open_orders(symbol=PAIR):
+            raise RuntimeError("Bot did not shut down cleanly")
+        return elapsed
+    finally:
+        server.stop()
+
+
+def run_benchmarks(sizes, latency, repeat):
+    cases = []
+    for grids in sizes:
+        cases.append((f"grid_setup[{grids}]", bench_grid_setup, (grids, latency)))
+        cases.append((f"fill_handling[{grids}]", bench_fill_handling, (grids, latency)))
+        cases.append((f"shutdown[{grids}]", bench_shutdown, (grids, latency)))
+        cases.append((f"regrid[{grids}]", bench_regrid, (grids, latency)))
+    cases.append((f"market_scan[{SCAN_SYMBOLS}]", bench_market_scan, (latency,)))
+
+    results = {}
+    for name, fn, args in cases:
+        # Best of N: the least disturbed run is the most repeatable
+        results[name] = min(fn(*args) for _ in range(repeat))
+        print(f"  {name:<24} {results[name] * 1000:10.3f} ms", flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Prints results next to the baseline and returns the names of regressed benchmarks."""
+    regressions = []
+    print(f"\n{'benchmark':<24} {'result ms':>12} {'baseline ms':>12} {'ratio':>7}")
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name:<24} {value * 1000:12.3f} {'-':>12} {'-':>7}  (new)")
+            continue
+        ratio = value / reference if reference else float('inf')
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<24} {value * 1000:12.3f} {reference * 1000:12.3f} {ratio:7.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the grid bot's hot paths against a mock exchange.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(GRID_SIZES), help="Grid sizes to benchmark")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds of latency per exchange call")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per benchmark (best is kept)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown against the baseline, e.g. 1.0 allows twice the baseline time")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    # Benchmarks measure our own code, not Binance's limits
+    bot.rate_limiter = bot.RateLimiter(weight_per_minute=10 ** 9, orders_per_10s=10 ** 9)
+
+    print(f"Running benchmarks (latency {args.latency * 1000:g} ms, best of {args.repeat})...")
+    results = run_benchmarks(args.sizes, args.latency, args.repeat)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                'machine': platform.platform(),
+                'python': platform.python_version(),
+                'latency': args.latency,
+                'results': results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}. Run with --save-baseline to create one.")
+        return 0
+    with open(args.baseline) as f:
+        stored = json.load(f)
+    if stored.get('latency') != args.latency:
+        print(f"\nBaseline was recorded with latency {stored.get('latency')}s; comparison skipped.")
+        return 0
+    regressions = compare(results, stored['results'], args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
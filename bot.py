@@ -1,576 +1,3987 @@
-import tkinter
-import customtkinter
 import threading
 import queue
 import time
 import json
 import logging
+import os
+import sys
+import signal
+import argparse
+import asyncio
+import uuid
+import bisect
+import hashlib
+import importlib
+import functools
+import math
+import sqlite3
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+import websockets
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from binance.client import Client
-from binance.exceptions import BinanceAPIException
-import pandas as pd
-import numpy as np
-import google.generativeai as genai
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+from binance.helpers import interval_to_milliseconds
 
-# --- Basic Configuration ---
-# Set the appearance and color theme for the GUI
-customtkinter.set_appearance_mode("Dark")
-customtkinter.set_default_color_theme("blue")
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-class BinanceGridBotApp(customtkinter.CTk):
-    def __init__(self):
-        super().__init__()
-
-        self.title("AI-Powered Binance Grid Trading Bot")
-        self.geometry("1100x780")
-
-        self.bot_thread = None
-        self.bot_running = False
-        self.gui_queue = queue.Queue()
-
-        # --- Main Grid Layout ---
-        self.grid_columnconfigure(1, weight=1)
-        self.grid_rowconfigure(0, weight=1)
-
-        # --- Left Frame for Controls ---
-        self.left_frame = customtkinter.CTkFrame(self, width=280, corner_radius=10)
-        self.left_frame.grid(row=0, column=0, padx=20, pady=20, sticky="nsew")
-        self.left_frame.grid_propagate(False)
 
-        # --- Right Frame for Dashboard ---
-        self.right_frame = customtkinter.CTkFrame(self, corner_radius=10)
-        self.right_frame.grid(row=0, column=1, padx=(0, 20), pady=20, sticky="nsew")
-        self.right_frame.grid_columnconfigure(0, weight=1)
-        self.right_frame.grid_rowconfigure(0, weight=1)
+class _LazyModule:
+    """Stands in for a heavy module and imports it on first attribute access."""
 
-        self.create_controls()
-        self.create_dashboard()
+    def __init__(self, name):
+        self._name = name
+        self._module = None
 
-        # Start the GUI update loop
-        self.after(100, self.process_gui_queue)
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
 
-    def create_controls(self):
-        """Creates all the input fields and buttons in the left control frame."""
-        frame = self.left_frame
-        
-        # --- Title ---
-        title_label = customtkinter.CTkLabel(frame, text="Bot Configuration", font=customtkinter.CTkFont(size=20, weight="bold"))
-        title_label.pack(pady=20)
-
-        # --- API Configuration ---
-        api_frame = customtkinter.CTkFrame(frame)
-        api_frame.pack(pady=10, padx=10, fill="x")
-        api_label = customtkinter.CTkLabel(api_frame, text="Binance Credentials", font=customtkinter.CTkFont(size=14, weight="bold"))
-        api_label.pack(pady=(5,10))
-
-        self.api_key_entry = customtkinter.CTkEntry(api_frame, placeholder_text="API Key")
-        self.api_key_entry.pack(pady=5, padx=10, fill="x")
-        self.api_secret_entry = customtkinter.CTkEntry(api_frame, placeholder_text="API Secret", show="*")
-        self.api_secret_entry.pack(pady=5, padx=10, fill="x")
-
-        # --- Environment Selection ---
-        self.env_selection = customtkinter.CTkSegmentedButton(frame, values=["Demo (Testnet)", "Live Trading"])
-        self.env_selection.pack(pady=10, padx=10, fill="x")
-        self.env_selection.set("Demo (Testnet)")
-
-        # --- AI Strategy Assistant ---
-        ai_frame = customtkinter.CTkFrame(frame)
-        ai_frame.pack(pady=10, padx=10, fill="x")
-        ai_label = customtkinter.CTkLabel(ai_frame, text="AI Strategy Assistant", font=customtkinter.CTkFont(size=14, weight="bold"))
-        ai_label.pack(pady=(5,10))
-
-        self.gemini_api_key_entry = customtkinter.CTkEntry(ai_frame, placeholder_text="Google Gemini API Key", show="*")
-        self.gemini_api_key_entry.pack(pady=5, padx=10, fill="x")
-
-        self.find_opportunity_button = customtkinter.CTkButton(ai_frame, text="Find Best Opportunity", command=self.find_best_opportunity)
-        self.find_opportunity_button.pack(pady=10, padx=10, fill="x")
-        self.ai_recommendation_label = customtkinter.CTkLabel(ai_frame, text="Recommendation will appear here...", wraplength=220, justify="left")
-        self.ai_recommendation_label.pack(pady=5, padx=10)
-
-        # --- Manual Bot Configuration ---
-        manual_frame = customtkinter.CTkFrame(frame)
-        manual_frame.pack(pady=10, padx=10, fill="x")
-        manual_label = customtkinter.CTkLabel(manual_frame, text="Manual Configuration", font=customtkinter.CTkFont(size=14, weight="bold"))
-        manual_label.pack(pady=(5,10))
-
-        self.pair_entry = customtkinter.CTkEntry(manual_frame, placeholder_text="Trading Pair (e.g., BTCUSDT)")
-        self.pair_entry.pack(pady=5, padx=10, fill="x")
-        self.lower_bound_entry = customtkinter.CTkEntry(manual_frame, placeholder_text="Lower Price Boundary")
-        self.lower_bound_entry.pack(pady=5, padx=10, fill="x")
-        self.upper_bound_entry = customtkinter.CTkEntry(manual_frame, placeholder_text="Upper Price Boundary")
-        self.upper_bound_entry.pack(pady=5, padx=10, fill="x")
-        self.grids_entry = customtkinter.CTkEntry(manual_frame, placeholder_text="Number of Grids")
-        self.grids_entry.pack(pady=5, padx=10, fill="x")
-        self.investment_entry = customtkinter.CTkEntry(manual_frame, placeholder_text="Total Investment (e.g., 1000 USDT)")
-        self.investment_entry.pack(pady=5, padx=10, fill="x")
-
-        # --- Bot Controls ---
-        self.start_bot_button = customtkinter.CTkButton(frame, text="Start Bot", command=self.start_bot)
-        self.start_bot_button.pack(pady=15, padx=10, fill="x")
-        self.stop_bot_button = customtkinter.CTkButton(frame, text="Stop Bot", command=self.stop_bot, state="disabled")
-        self.stop_bot_button.pack(pady=5, padx=10, fill="x")
-
-    def create_dashboard(self):
-        """Creates the text box for logging bot activity."""
-        self.dashboard_textbox = customtkinter.CTkTextbox(self.right_frame, state="disabled", corner_radius=10, font=("Courier", 13))
-        self.dashboard_textbox.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
-
-    def log_to_dashboard(self, message):
-        """Thread-safe method to log messages to the GUI."""
-        self.gui_queue.put(message)
-
-    def process_gui_queue(self):
-        """Processes messages from the queue to update the GUI."""
-        while not self.gui_queue.empty():
-            try:
-                message = self.gui_queue.get_nowait()
-                self.dashboard_textbox.configure(state="normal")
-                self.dashboard_textbox.insert("end", message + "\n")
-                self.dashboard_textbox.see("end")
-                self.dashboard_textbox.configure(state="disabled")
-            except queue.Empty:
-                pass
-        self.after(100, self.process_gui_queue)
 
-    def find_best_opportunity(self):
-        """Starts a thread to get the LLM recommendation."""
-        self.log_to_dashboard("AI Assistant: Starting market analysis...")
-        self.find_opportunity_button.configure(state="disabled", text="Analyzing...")
-        
-        # Run analysis in a separate thread to not freeze the GUI
-        threading.Thread(target=self.run_llm_analysis, daemon=True).start()
+# --- Basic Configuration ---
+# NumPy and Gemini only load once analysis, backtesting or the AI assistant is used,
+# so a headless grid daemon starts fast and stays small
+np = _LazyModule('numpy')
+genai = _LazyModule('google.generativeai')
 
-    def run_llm_analysis(self):
-        """Gathers data, queries the LLM, and updates the GUI."""
-        try:
-            client = self.get_binance_client() # Use a temporary client for data fetching
-            if not client:
-                 self.log_to_dashboard("AI Assistant Error: Please enter valid API keys first.")
-                 self.find_opportunity_button.configure(state="normal", text="Find Best Opportunity")
-                 return
-            
-            # Dynamically fetch high-volume pairs instead of using a hardcoded list.
-            pairs = self.fetch_high_volume_pairs(client, limit=10)
-            self.log_to_dashboard(f"AI Assistant: Analyzing pairs: {', '.join(pairs)}")
-            
-            gemini_api_key = self.gemini_api_key_entry.get()
-            if not gemini_api_key:
-                self.log_to_dashboard("AI Assistant Error: Please enter your Google Gemini API key.")
-                self.after(0, lambda: self.find_opportunity_button.configure(state="normal", text="Find Best Opportunity"))
-                return
-                 
-            market_data = self.gather_market_data(client, pairs)
-            
-            if market_data:
-                recommendation = self.get_gemini_recommendation(market_data, gemini_api_key)
-            else:
-                recommendation = None
-                self.log_to_dashboard("AI Assistant: No market data gathered. Cannot get recommendation.")
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-            if recommendation:
-                self.log_to_dashboard("AI Assistant: Analysis complete. Found an opportunity!")
-                # Update GUI from the main thread
-                self.after(0, self.update_ui_with_recommendation, recommendation)
-            else:
-                self.log_to_dashboard("AI Assistant: Could not determine a clear opportunity.")
-        
-        except Exception as e:
-            self.log_to_dashboard(f"AI Assistant Error: {e}")
-        finally:
-            # Re-enable the button from the main thread
-            self.after(0, lambda: self.find_opportunity_button.configure(state="normal", text="Find Best Opportunity"))
+class MarketAnalyzer:
+    """
+    Headless market analysis, shared by the GUI and the command line: candidate pairs
+    from the live scanner (or REST), indicators over stored candles, Gemini
+    recommendations and the grid parameter sweep.
+    """
+    ANALYSIS_INTERVAL = Client.KLINE_INTERVAL_4HOUR
+    ANALYSIS_DAYS = 30
+    DEFAULT_PAIRS = ['BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'SOLUSDT', 'XRPUSDT', 'ADAUSDT']
+
+    def __init__(self, log=None, advisor=None):
+        self.log = log or logging.info
+        self.advisor = advisor or GeminiAdvisor(log=self.log)
+        self.market_scanner = None
+
+    def ensure_market_scanner(self, client):
+        """Starts the all-market ticker scanner, restarting it if the environment changed."""
+        testnet = getattr(client, 'testnet', False)
+        scanner = self.market_scanner
+        if scanner is None or scanner.testnet != testnet or not scanner.is_alive():
+            if scanner:
+                scanner.stop()
+            scanner = MarketScanner(testnet=testnet, log=self.log)
+            scanner.start()
+            self.market_scanner = scanner
+        return scanner
 
     def fetch_high_volume_pairs(self, client, limit=10):
-        """Fetches the top N USDT pairs by 24h trading volume."""
+        """Returns the top N USDT pairs by 24h trading volume, from the live scanner when it is warm."""
         try:
-            self.log_to_dashboard("AI Assistant: Fetching all market tickers from Binance...")
+            symbols = symbol_cache.tradable_pairs(client, 'USDT')
+            scanner = self.ensure_market_scanner(client)
+            scanner.set_universe(symbols)
+            if scanner.is_warm():
+                top_pairs = scanner.top(limit)
+                if top_pairs:
+                    self.log(f"AI Assistant: Found top {len(top_pairs)} high-volume pairs from the live market scanner.")
+                    return top_pairs
+
+            self.log("AI Assistant: Fetching all market tickers from Binance...")
             all_tickers = client.get_ticker()
-            
-            # Filter for USDT pairs and also filter out leveraged tokens (e.g., BTCUP, BTCDOWN)
-            usdt_pairs = [
-                t for t in all_tickers 
-                if t['symbol'].endswith('USDT') and 'UP' not in t['symbol'] and 'DOWN' not in t['symbol']
-            ]
+            usdt_pairs = [t for t in all_tickers if t['symbol'] in symbols]
             
             # Sort by quote volume (volume in USDT)
             sorted_pairs = sorted(usdt_pairs, key=lambda x: float(x['quoteVolume']), reverse=True)
             
             top_pairs = [p['symbol'] for p in sorted_pairs[:limit]]
-            self.log_to_dashboard(f"AI Assistant: Found top {limit} high-volume pairs.")
+            self.log(f"AI Assistant: Found top {limit} high-volume pairs.")
             return top_pairs
             
         except Exception as e:
-            self.log_to_dashboard(f"AI Assistant Error: Could not fetch high-volume pairs: {e}")
+            self.log(f"AI Assistant Error: Could not fetch high-volume pairs: {e}")
             # Fallback to a default list in case of error
-            return ['BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'SOLUSDT', 'XRPUSDT', 'ADAUSDT']
+            return list(self.DEFAULT_PAIRS)
 
     def gather_market_data(self, client, pairs):
         """Fetches and analyzes historical data for a list of pairs."""
         all_data = []
+        # 30 days of 4-hour candles for all pairs at once. Only candles that are not
+        # in the local store yet are downloaded.
+        fetcher = KlineFetcher(client, log=self.log)
+        start_ms = int((time.time() - self.ANALYSIS_DAYS * 24 * 60 * 60) * 1000)
+        candles_by_pair = candle_store.candles_many(fetcher, pairs, self.ANALYSIS_INTERVAL, start_ms)
+        loaded_pairs, loaded_candles = [], []
         for pair in pairs:
-            try:
-                # Fetch 30 days of 4-hour candles
-                klines = client.get_historical_klines(pair, Client.KLINE_INTERVAL_4HOUR, "30 day ago UTC")
-                df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])
-                
-                for col in ['open', 'high', 'low', 'close', 'volume']:
-                    df[col] = pd.to_numeric(df[col])
-
-                # --- Data Analysis ---
-                # 1. Price Range
-                support = df['low'].min()
-                resistance = df['high'].max()
-                current_price = df['close'].iloc[-1]
-
-                # 2. Volatility (ATR)
-                df['tr1'] = df['high'] - df['low']
-                df['tr2'] = abs(df['high'] - df['close'].shift())
-                df['tr3'] = abs(df['low'] - df['close'].shift())
-                df['tr'] = df[['tr1', 'tr2', 'tr3']].max(axis=1)
-                atr = df['tr'].ewm(span=14, adjust=False).mean().iloc[-1]
-                atr_percentage = (atr / current_price) * 100
-
-                # 3. Trend (simple check for ranginess)
-                price_range = resistance - support
-                is_ranging = (current_price > support + 0.15 * price_range) and \
-                             (current_price < resistance - 0.15 * price_range)
-
-                all_data.append({
-                    "pair": pair,
-                    "current_price": f"{current_price:.4f}",
-                    "support": f"{support:.4f}",
-                    "resistance": f"{resistance:.4f}",
-                    "atr_percentage": f"{atr_percentage:.2f}%",
-                    "is_ranging": is_ranging
-                })
-                self.log_to_dashboard(f"AI Assistant: Analyzed {pair}.")
-                time.sleep(0.2) # Avoid hitting API rate limits
-            except Exception as e:
-                self.log_to_dashboard(f"AI Assistant: Could not analyze {pair}. Reason: {e}")
-        return all_data
-
-    def get_gemini_recommendation(self, market_data, api_key):
-        """
-        Calls the Google Gemini API to get a trading recommendation.
-        """
-        self.log_to_dashboard("AI Assistant: Contacting Google Gemini for analysis...")
-
-        try:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-pro')
-
-            # --- Construct the prompt for the LLM ---
-            prompt = f"""
-            You are an expert crypto market analyst specializing in grid trading strategies. 
-            Based on the following market data for several cryptocurrencies, identify the single best candidate for a profitable grid trading bot.
-            The ideal candidate is a high-volume asset in a stable, sideways market (where 'is_ranging' is true) with high volatility within its range (high 'atr_percentage').
-
-            Analyze the data and respond ONLY with a valid JSON object containing your top recommendation. Do not include any text or markdown formatting before or after the JSON.
-
-            Market Data:
-            {json.dumps(market_data, indent=2)}
-
-            Your Task:
-            Respond in a JSON format with your top recommendation. Provide the 'trading_pair', a 'lower_bound' (based on support), an 'upper_bound' (based on resistance), and a recommended 'grid_density' (an integer between 20 and 50). Include a short 'justification' explaining why this pair is the best choice right now.
-
-            Example JSON output format:
-            {{
-                "trading_pair": "SOLUSDT",
-                "lower_bound": "120.5000",
-                "upper_bound": "155.7500",
-                "grid_density": 30,
-                "justification": "SOLUSDT shows high volatility in a clearly defined range, making it ideal for capturing profits from price swings."
-            }}
-            """
-
-            response = model.generate_content(prompt)
-            
-            # Clean up the response to ensure it's valid JSON
-            cleaned_response_text = response.text.strip().replace('```json', '').replace('```', '').strip()
-            
-            self.log_to_dashboard("AI Assistant: Received recommendation from Gemini.")
-            recommendation = json.loads(cleaned_response_text)
-            
-            # Basic validation of the received data
-            if all(k in recommendation for k in ['trading_pair', 'lower_bound', 'upper_bound', 'grid_density', 'justification']):
-                return recommendation
+            candles = candles_by_pair[pair]
+            if isinstance(candles, Exception):
+                self.log(f"AI Assistant: Could not analyze {pair}. Reason: {candles}")
+            elif len(candles) == 0:
+                self.log(f"AI Assistant: Could not analyze {pair}. Reason: no candle data")
             else:
-                self.log_to_dashboard("AI Assistant Error: Gemini response was missing required fields.")
-                return None
-
-        except Exception as e:
-            self.log_to_dashboard(f"AI Assistant Error during Gemini API call: {e}")
-            self.log_to_dashboard("Check your Gemini API key and ensure the model 'gemini-pro' is available.")
-            return None
-
-    def update_ui_with_recommendation(self, recommendation):
-        """Populates the GUI fields with the AI's suggestion."""
-        self.pair_entry.delete(0, "end")
-        self.pair_entry.insert(0, recommendation['trading_pair'])
-        
-        self.lower_bound_entry.delete(0, "end")
-        self.lower_bound_entry.insert(0, recommendation['lower_bound'])
-
-        self.upper_bound_entry.delete(0, "end")
-        self.upper_bound_entry.insert(0, recommendation['upper_bound'])
-
-        self.grids_entry.delete(0, "end")
-        self.grids_entry.insert(0, str(recommendation['grid_density']))
-
-        self.ai_recommendation_label.configure(text=recommendation['justification'])
-
-    def get_binance_client(self):
-        """Creates a Binance client based on GUI settings."""
-        api_key = self.api_key_entry.get()
-        api_secret = self.api_secret_entry.get()
-        if not api_key or not api_secret:
-            return None
-            
-        testnet = self.env_selection.get() == "Demo (Testnet)"
-        return Client(api_key, api_secret, testnet=testnet)
-
-    def start_bot(self):
-        """Validates inputs and starts the bot thread."""
-        if self.bot_running:
-            self.log_to_dashboard("Bot is already running.")
-            return
+                loaded_pairs.append(pair)
+                loaded_candles.append(candles)
+
+        # --- Data Analysis ---
+        # Support/resistance, ATR, ranginess and range statistics for all pairs in one pass
+        indicators = IndicatorEngine().compute(
+            loaded_pairs, loaded_candles, interval_to_milliseconds(self.ANALYSIS_INTERVAL)
+        )
+        for row in indicators:
+            all_data.append({
+                "pair": str(row['pair']),
+                "current_price": f"{row['current_price']:.4f}",
+                "support": f"{row['support']:.4f}",
+                "resistance": f"{row['resistance']:.4f}",
+                "atr_percentage": f"{row['atr_percentage']:.2f}%",
+                "is_ranging": bool(row['is_ranging']),
+                "band_crossings": int(row['band_crossings']),
+                "realized_volatility": f"{row['realized_volatility']:.2f}%"
+            })
+        self.log(f"AI Assistant: Analyzed {len(all_data)} pairs.")
+        return all_data
 
-        try:
-            params = {
-                "pair": self.pair_entry.get(),
-                "lower_bound": float(self.lower_bound_entry.get()),
-                "upper_bound": float(self.upper_bound_entry.get()),
-                "grids": int(self.grids_entry.get()),
-                "investment": float(self.investment_entry.get())
-            }
-            
-            if params['lower_bound'] >= params['upper_bound'] or params['grids'] < 2:
-                raise ValueError("Invalid grid parameters.")
+    def get_recommendation(self, market_data, api_key):
+        """Gemini recommendation for the gathered market data (cached, with a local fallback)."""
+        return self.advisor.recommend(market_data, api_key)
 
-        except ValueError as e:
-            self.log_to_dashboard(f"Error: Invalid input. Please check your parameters. Details: {e}")
-            return
+    def optimize(self, client, pairs, investment=None):
+        """Backtests grid settings for `pairs` over recent history. Returns the ranked table."""
+        fetcher = KlineFetcher(client, log=self.log)
+        start_ms = int((time.time() - GridOptimizer.LOOKBACK_DAYS * 24 * 60 * 60) * 1000)
+        candles_by_pair = candle_store.candles_many(fetcher, pairs, candle_store.base_interval, start_ms)
+        candles_by_pair = {p: c for p, c in candles_by_pair.items() if not isinstance(c, Exception) and len(c)}
 
-        client = self.get_binance_client()
-        if not client:
-            self.log_to_dashboard("Error: Binance API keys are required.")
-            return
+        optimizer = GridOptimizer(investment or GridOptimizer.DEFAULT_INVESTMENT)
+        started = time.perf_counter()
+        table = optimizer.optimize(candles_by_pair)
+        self.log(f"Optimizer: Scored {optimizer.last_run_size} configurations in {time.perf_counter() - started:.1f}s.")
+        return table
 
-        self.bot_running = True
-        self.toggle_controls_state()
-        
-        self.bot_thread = GridBot(client, params, self.gui_queue)
-        self.bot_thread.start()
-        
-        self.log_to_dashboard("Bot has been started.")
 
-    def stop_bot(self):
-        """Signals the bot thread to stop."""
-        if not self.bot_running or not self.bot_thread:
-            self.log_to_dashboard("Bot is not currently running.")
-            return
+class GridBot(threading.Thread):
+    # Binance's "Unknown order sent." error, returned by the bulk cancel when nothing is open
+    NO_OPEN_ORDERS_CODE = -2011
 
-        self.log_to_dashboard("Stopping bot... Please wait for open orders to be cancelled.")
-        self.bot_thread.stop()
-        self.bot_thread.join() # Wait for the thread to finish
-        self.bot_running = False
-        self.toggle_controls_state()
-        self.log_to_dashboard("Bot has been stopped.")
-
-    def toggle_controls_state(self):
-        """Enables/disables GUI controls based on bot status."""
-        state = "disabled" if self.bot_running else "normal"
-        self.start_bot_button.configure(state=("disabled" if self.bot_running else "normal"))
-        self.stop_bot_button.configure(state=("normal" if self.bot_running else "disabled"))
-        
-        # Disable all configuration entries when bot is running
-        self.api_key_entry.configure(state=state)
-        self.api_secret_entry.configure(state=state)
-        self.env_selection.configure(state=state)
-        self.gemini_api_key_entry.configure(state=state)
-        self.find_opportunity_button.configure(state=state)
-        self.pair_entry.configure(state=state)
-        self.lower_bound_entry.configure(state=state)
-        self.upper_bound_entry.configure(state=state)
-        self.grids_entry.configure(state=state)
-        self.investment_entry.configure(state=state)
+    # Open orders of one symbol cost 6 request weight
+    OPEN_ORDERS_WEIGHT = 6
 
+    # A re-grid keeps a live order on a surviving level if its size is within this
+    # fraction of the new target; resizing it would cost a request and queue priority
+    REGRID_QTY_TOLERANCE = 0.05
+    # How often an idle bot marks its position to market (and a trailing grid checks
+    # whether price has left its range)
+    MARK_INTERVAL = 5
 
-class GridBot(threading.Thread):
-    def __init__(self, client, params, gui_queue):
+    def __init__(self, client, params, gui_queue, stream_url=None, journal=None):
         super().__init__(daemon=True)
         self.client = client
         self.params = params
+        # The configured settings; re-grids and trailing re-centres only change self.params
+        self.base_params = dict(params)
         self.gui_queue = gui_queue
+        self.stream_url = stream_url
+        self.journal = journal
+        self.journal_key = GridJournal.key_for(client, params['pair'])
         self._is_running = True
-        self.total_pnl = 0.0
+        self.detach = False
+        self.ledger = None
+        self.fill_queue = queue.Queue()
+        self.user_stream = None
+        self.book = None
+        self.ladder = None
+        self.reconciler = None
+        self.orders_placed = 0
+
+    @property
+    def total_pnl(self):
+        """Realized P&L of the grid, fees included."""
+        return self.ledger.realized if self.ledger else 0.0
 
     def log(self, message):
         """Send a log message to the main GUI thread."""
         logging.info(message)
-        self.gui_queue.put(f"[{self.params['pair']}] {message}")
+        if self.gui_queue is not None:
+            self.gui_queue.put(f"[{self.params['pair']}] {message}")
 
-    def stop(self):
-        """Signal the bot to stop."""
+    def stop(self, detach=False):
+        """
+        Signal the bot to stop. Returns immediately; the bot thread cleans up on its own.
+        With detach, the orders stay open and journaled for a warm restart (see release_grid).
+        """
+        self.detach = detach
         self._is_running = False
+        # Wake the main loop right away instead of at its next timeout
+        self.fill_queue.put(None)
 
     def run(self):
         """The main logic loop for the grid trading bot."""
+        crashed = False
         try:
             self.log("Initializing bot...")
             # --- Initial Setup ---
-            self.cancel_all_orders()
-            
-            current_price = float(self.client.get_symbol_ticker(symbol=self.params['pair'])['price'])
-            self.log(f"Current price of {self.params['pair']} is {current_price}")
-
-            # --- Grid Calculation ---
-            grid_lines = np.linspace(self.params['lower_bound'], self.params['upper_bound'], self.params['grids'])
-            buy_orders = []
-            sell_orders = []
-            
-            quote_asset = self.get_quote_asset()
-            base_asset = self.get_base_asset()
-
-            investment_per_grid = self.params['investment'] / (len(grid_lines) - 1)
-            
-            # --- Place Initial Orders ---
-            for line in grid_lines:
-                qty_to_trade = self.calculate_quantity(investment_per_grid, line)
-                
-                if line < current_price:
-                    # Place buy orders below current price
-                    order = self.place_order(self.params['pair'], 'BUY', qty_to_trade, line)
-                    if order: buy_orders.append(order)
-                else:
-                    # Place sell orders above current price
-                    order = self.place_order(self.params['pair'], 'SELL', qty_to_trade, line)
-                    if order: sell_orders.append(order)
-            
-            self.log(f"Placed {len(buy_orders)} initial buy orders and {len(sell_orders)} initial sell orders.")
+            # Subscribe to fills before placing or restoring anything so no execution report is missed
+            self.start_user_stream()
+            with metrics.time(STAGE_LATENCY, 'restore_grid'):
+                missed_fills = self.restore_grid()
+            if missed_fills is None:
+                with metrics.time(STAGE_LATENCY, 'cancel_all_orders'):
+                    self.cancel_all_orders()
+                with metrics.time(STAGE_LATENCY, 'setup_grid'):
+                    self.setup_grid()
+            else:
+                for order in missed_fills:
+                    self.fill_queue.put(order)
             
             # --- Main Loop ---
+            # Fills are pushed into fill_queue by the user-data stream as they happen. REST
+            # polling only kicks in while the stream is unavailable.
+            last_poll = last_mark = time.time()
             while self._is_running:
-                time.sleep(10) # Check for filled orders every 10 seconds
-                filled_orders = self.check_filled_orders()
-
-                for filled_order in filled_orders:
-                    filled_price = float(filled_order['price'])
-                    filled_qty = float(filled_order['executedQty'])
-                    grid_step = (self.params['upper_bound'] - self.params['lower_bound']) / (self.params['grids'] - 1)
-
-                    if filled_order['side'] == 'BUY':
-                        self.log(f"BUY order filled at {filled_price}")
-                        # Place a corresponding sell order one grid up
-                        sell_price = filled_price + grid_step
-                        if sell_price <= self.params['upper_bound']:
-                            self.place_order(self.params['pair'], 'SELL', filled_qty, sell_price)
-                    
-                    elif filled_order['side'] == 'SELL':
-                        self.log(f"SELL order filled at {filled_price}")
-                        # Calculate profit for this buy-sell pair
-                        pnl = (filled_price - (filled_price - grid_step)) * filled_qty
-                        self.total_pnl += pnl
-                        self.log(f"PROFIT from trade: {pnl:.4f} {quote_asset}. Total P&L: {self.total_pnl:.4f} {quote_asset}")
-                        # Place a corresponding buy order one grid down
-                        buy_price = filled_price - grid_step
-                        if buy_price >= self.params['lower_bound']:
-                             self.place_order(self.params['pair'], 'BUY', filled_qty, buy_price)
+                try:
+                    filled_order = self.fill_queue.get(timeout=1)
+                except queue.Empty:
+                    if not self.stream_connected() and time.time() - last_poll >= self.reconciler.next_interval():
+                        last_poll = time.time()
+                        for order in self.check_filled_orders():
+                            self.fill_queue.put(order)
+                    if time.time() - last_mark >= self.MARK_INTERVAL:
+                        last_mark = time.time()
+                        price = self.mark_to_market()
+                        if price is not None and self.params.get('trailing'):
+                            self.check_trailing(price)
+                    continue
+
+                if filled_order is None:
+                    continue
+                if 'regrid' in filled_order:
+                    try:
+                        with metrics.time(STAGE_LATENCY, 'regrid'):
+                            self.regrid(filled_order['regrid'])
+                    except (BinanceAPIException, ValueError) as e:
+                        self.log(f"Re-grid failed: {e}")
+                    continue
+                if 'catch_up' in filled_order:
+                    last_poll = time.time()
+                    for order in self.check_filled_orders():
+                        self.fill_queue.put(order)
+                    continue
+                with metrics.time(STAGE_LATENCY, 'handle_fill'):
+                    self.handle_filled_order(filled_order)
                 
         except Exception as e:
             self.log(f"An error occurred in the bot thread: {e}")
+            crashed = True
         finally:
             self.log("Bot loop finished. Cleaning up...")
-            self.cancel_all_orders()
+            self.release_grid(detach=crashed or self.detach)
+            self.stop_user_stream()
+
+    def restore_grid(self):
+        """
+        Rebuilds the grid from the journal and one open-orders query instead of placing it
+        again. Live orders still in the book are kept and untracked orders sitting exactly
+        on an empty level are adopted; other open orders of the pair are cancelled. Returns
+        the fills missed while the bot was down (to be handled as usual), or None when
+        there is nothing to restore and the grid has to be set up from scratch.
+        """
+        if self.journal is None:
+            return None
+        start = time.perf_counter()
+        state = self.journal.load(self.journal_key)
+        if state is None:
+            return None
+        metadata = symbol_cache.get(self.client, self.params['pair'])
+        # A grid that was re-gridded or re-centred since it was configured is still resumed
+        # when started with its original settings
+        requested = GridJournal.grid_params(self.params)
+        if requested not in (state['params'], state['base_params']) or state['tick_size'] != metadata['tick_size']:
+            self.log("Journaled grid has different settings. Starting a fresh grid.")
+            self.journal.clear(self.journal_key)
+            return None
+        self.params = dict(self.params, **state['params'])
+
+        self.book = GridBook(state['ticks'], state['tick_size'], state['price_precision'])
+        self.ladder = GridLadder(metadata)
+        for level, side, order_id, qty in state['orders']:
+            self.book.assign(level, side, order_id, qty)
+        self.quote_asset = metadata['quote_asset']
+        # Open lots are not journaled. The restored ledger carries the realized P&L forward
+        # and seeds a lot for every open sell, costed at the level below (where its buy was)
+        self.ledger = PositionLedger(metadata['base_asset'], metadata['quote_asset'], realized=state['total_pnl'])
+        for level, side, _, qty in state['orders']:
+            if side == 'SELL':
+                below = max(level - 1, 0)
+                self.ledger.seed(self.book.ticks[below], self.book.price(below), qty)
+        self.reconciler = OrderReconciler(self.client, self.params['pair'], self.book, log=self.log,
+                                          last_trade_id=state['last_trade_id'])
+
+        rate_limiter.acquire(weight=self.OPEN_ORDERS_WEIGHT)
+        live = self.client.get_open_orders(symbol=self.params['pair'])
+        live_ids = set()
+        kept, adopted, stale = 0, 0, []
+        for order in live:
+            order_id = int(order['orderId'])
+            live_ids.add(order_id)
+            if self.book.level_for_order(order_id) is not None:
+                kept += 1
+                continue
+            level = self.book.level_at(float(order['price']))
+            if level is not None and self.book.order_at(level) is None:
+                # Placed just before a crash, so it never made it into the journal
+                qty = float(order['origQty'])
+                self.book.assign(level, order['side'], order_id, qty)
+                self.journal.placed(self.journal_key, [(level, order['side'], order_id, qty)])
+                adopted += 1
+            else:
+                stale.append(order)
+
+        missed_fills, vanished = [], 0
+        missing = [order_id for order_id in self.book.open_orders() if order_id not in live_ids]
+        if missing:
+            missed_fills = self.check_filled_orders()
+            filled_ids = {int(order['orderId']) for order in missed_fills}
+            for order_id in missing:
+                if order_id not in filled_ids:
+                    # Cancelled outside the bot; its level stays empty
+                    self.book.release(order_id)
+                    self.journal.released(self.journal_key, order_id)
+                    vanished += 1
+        for order in stale:
+            self.cancel_order(order['orderId'])
+
+        self.log(f"Restored grid from journal in {(time.perf_counter() - start) * 1000:.0f} ms: "
+                 f"{kept} live order(s) kept, {adopted} adopted, {len(missed_fills)} missed fill(s), "
+                 f"{vanished} cancelled outside the bot, {len(stale)} stray order(s) cancelled.")
+        return missed_fills
+
+    def release_grid(self, detach=False):
+        """
+        Cleanup when the bot exits. A plain stop cancels the ladder and closes the grid in
+        the journal. With detach (an explicit detach stop, e.g. for a planned restart, or
+        after a crash) the orders are left in place for a warm restart if a journal is kept.
+        """
+        if detach and self.journal is not None and self.book is not None:
+            self.journal_snapshot()
+            self.log(f"Leaving {len(self.book.open_orders())} order(s) open for a warm restart from the journal.")
+            return
+        if detach:
+            self.log("No order journal to resume from. Cancelling the grid instead of detaching.")
+        self.cancel_all_orders()
+        if self.journal is not None:
+            self.journal.clear(self.journal_key)
+
+    def journal_snapshot(self):
+        last_trade_id = self.reconciler.last_trade_id if self.reconciler else -1
+        self.journal.snapshot(self.journal_key, self.book, self.total_pnl, last_trade_id)
+
+    def setup_grid(self, current_price=None):
+        """Calculates the grid and places the initial ladder around the current price."""
+        if current_price is None:
+            current_price = float(self.client.get_symbol_ticker(symbol=self.params['pair'])['price'])
+        self.log(f"Current price of {self.params['pair']} is {current_price}")
+
+        # --- Grid Calculation ---
+        # Every level's price and quantity in exchange units, already valid for the symbol's filters
+        metadata = symbol_cache.get(self.client, self.params['pair'])
+        self.ladder = GridLadder(metadata)
+        grid = self.ladder.build(
+            self.params['lower_bound'], self.params['upper_bound'], self.params['grids'],
+            self.params['investment'], self.params.get('spacing', GridLadder.ARITHMETIC)
+        )
+        if grid['levels'] < grid['requested']:
+            self.log(f"Grid reduced from {grid['requested']} to {grid['levels']} levels to meet the exchange's "
+                     f"tick, lot size and minimum order value ({grid['dropped']} dropped as invalid).")
+        self.book = GridBook(grid['ticks'].tolist(), self.ladder.tick_size, self.ladder.price_precision)
+        buy_orders = []
+        sell_orders = []
+        
+        self.quote_asset = metadata['quote_asset']
+        if self.ledger is None:
+            self.ledger = PositionLedger(metadata['base_asset'], metadata['quote_asset'])
+        self.ledger.mark(current_price)
+        # Taken before placing anything, so no fill of the new ladder is older than it
+        self.reconciler = OrderReconciler(self.client, self.params['pair'], self.book, log=self.log)
+        if self.journal is not None:
+            self.journal.start_grid(self.journal_key, self.params, self.book, self.reconciler.last_trade_id,
+                                    base_params=self.base_params)
+
+        # --- Place Initial Orders ---
+        # The level nearest the current price stays empty, so every counter-order lands on
+        # a free level. Build the whole ladder first, then hand it to the scheduler which
+        # places it concurrently, levels nearest the current price first.
+        skipped = self.book.nearest_level(current_price)
+        ladder = self.ladder.orders(grid['ticks'], grid['qty_steps'], skipped)
+
+        scheduler = OrderPlacementScheduler(self.submit_ladder_order, log=self.log, cancelled=lambda: not self._is_running)
+        results = scheduler.place_all(ladder, current_price)
+        placed = []
+        for result in results:
+            if result['response'] is None:
+                continue
+            self.book.assign(result['level'], result['side'], result['response']['orderId'], float(result['qty']))
+            placed.append((result['level'], result['side'], result['response']['orderId'], float(result['qty'])))
+            if result['side'] == 'BUY':
+                buy_orders.append(result['response'])
+            else:
+                sell_orders.append(result['response'])
+                # The base asset backing an initial sell is held from the start, at the opening price
+                self.ledger.seed(self.book.ticks[max(result['level'] - 1, 0)], current_price, float(result['qty']))
+        
+        if self.journal is not None:
+            self.journal.placed(self.journal_key, placed)
+        self.log(f"Placed {len(buy_orders)} initial buy orders and {len(sell_orders)} initial sell orders.")
+        self.log(scheduler.summarize(results))
+
+    def request_regrid(self, params):
+        """Asks the bot thread to move the running grid to `params` (thread-safe)."""
+        self.fill_queue.put({'regrid': params})
+
+    def regrid(self, params, current_price=None):
+        """
+        Moves the running grid to new bounds, density, spacing or investment in place.
+
+        The new ladder is diffed against the live orders: orders already on a surviving
+        level with the right side and size are kept, the rest are paired with new levels
+        and moved with one cancel-replace each, and only the leftovers are cancelled or
+        placed. Cancels go first to free their balance; moves and placements then run
+        concurrently, nearest the current price first. Returns a dict of action counts.
+        """
+        if params['pair'] != self.params['pair']:
+            raise ValueError(f"Cannot move a {self.params['pair']} grid to {params['pair']}.")
+        if self.book is None:
+            raise ValueError("The grid has not been set up yet.")
+        start = time.perf_counter()
+        if current_price is None:
+            rate_limiter.acquire(weight=2)
+            current_price = float(self.client.get_symbol_ticker(symbol=self.params['pair'])['price'])
+        metadata = symbol_cache.get(self.client, self.params['pair'])
+        ladder = GridLadder(metadata)
+        grid = ladder.build(params['lower_bound'], params['upper_bound'], params['grids'], params['investment'],
+                            params.get('spacing', GridLadder.ARITHMETIC))
+        book = GridBook(grid['ticks'].tolist(), ladder.tick_size, ladder.price_precision)
+        wanted = ladder.orders(grid['ticks'], grid['qty_steps'], book.nearest_level(current_price))
+        keep, amend, cancel, place = self.plan_regrid(book, wanted)
+
+        for order_id, level, side, qty in keep:
+            book.assign(level, side, order_id, qty)
+        # Orders on their way out stay tracked until the exchange confirms the cancel or move
+        old = self.book
+        book.retired.update(old.retired)
+        for order_id in [*cancel, *(order_id for order_id, _ in amend)]:
+            level = old.level_for_order(order_id)
+            book.retire(order_id, old.ticks[level], old.qty[level])
+        cancelled_levels = {order_id: old.price(level) for order_id, level in old.open_orders().items()}
+        self.ladder = ladder
+        self.book = book
+        if self.reconciler:
+            self.reconciler.book = book
+
+        scheduler = OrderPlacementScheduler(self.submit_regrid_action, log=self.log, cancelled=lambda: not self._is_running)
+        cancels = [{'action': 'cancel', 'order_id': order_id, 'price': cancelled_levels[order_id], 'side': 'CANCEL'}
+                   for order_id in cancel]
+        results = scheduler.place_all(cancels, current_price)
+        moves = [dict(entry, action='amend', order_id=order_id) for order_id, entry in amend]
+        moves += [dict(entry, action='place') for entry in place]
+        results += scheduler.place_all(moves, current_price)
+
+        placed, filled = [], []
+        for result in results:
+            response = result['response']
+            if response is None:
+                if result['action'] != 'place':
+                    order = self.resolve_retired(result['order_id'], result['error'])
+                    if order is not None:
+                        filled.append(order)
+                continue
+            if result['action'] != 'place':
+                book.release_retired(result['order_id'])
+            if result['action'] == 'cancel':
+                continue
+            if result['action'] == 'amend':
+                response = response['newOrderResponse']
+            book.assign(result['level'], result['side'], response['orderId'], float(result['qty']))
+            placed.append((result['level'], result['side'], response['orderId'], float(result['qty'])))
+        # Sells the new grid adds beyond the held lots are backed by base bought now
+        if self.ledger is not None:
+            selling = sum(book.qty[level] for level in book.open_orders().values() if book.side_at(level) == 'SELL')
+            shortfall = selling - self.ledger.inventory
+            if shortfall > PositionLedger.EPSILON:
+                self.ledger.seed(book.ticks[max(book.nearest_level(current_price) - 1, 0)], current_price, shortfall)
+
+        self.params = dict(params)
+        if self.journal is not None:
+            last_trade_id = self.reconciler.last_trade_id if self.reconciler else -1
+            self.journal.start_grid(self.journal_key, self.params, book, last_trade_id, base_params=self.base_params)
+            self.journal_snapshot()
+        # Orders that filled before their cancel or move landed are handled on the new grid
+        for order in filled:
+            self.handle_filled_order(order)
+        counts = {'kept': len(keep), 'moved': len(amend), 'cancelled': len(cancel), 'placed': len(place),
+                  'failed': sum(1 for r in results if r['response'] is None)}
+        self.log(f"Re-grid to {params['lower_bound']}-{params['upper_bound']} ({len(book)} levels) in "
+                 f"{(time.perf_counter() - start) * 1000:.0f} ms: {counts['kept']} kept, {counts['moved']} moved, "
+                 f"{counts['cancelled']} cancelled, {counts['placed']} placed, {counts['failed']} failed.")
+        return counts
+
+    def resolve_retired(self, order_id, error):
+        """
+        Looks up a retired order whose cancel or move failed. Returns it if it filled, to
+        be handled like any fill; otherwise it stays tracked until it fills or is gone.
+        """
+        try:
+            rate_limiter.acquire(weight=4)
+            order = self.client.get_order(symbol=self.params['pair'], orderId=order_id)
+        except BinanceAPIException as e:
+            self.log(f"Order {order_id} could not be cancelled or moved ({error}) and its status is unknown ({e}). "
+                     f"It stays tracked until it fills.")
+            return None
+        if order['status'] == 'FILLED':
+            self.log(f"Order {order_id} filled before it could be cancelled or moved.")
+            return order
+        if order['status'] in ('CANCELED', 'EXPIRED', 'REJECTED'):
+            self.book.release_retired(order_id)
+        else:
+            self.log(f"Order {order_id} could not be cancelled or moved ({error}). It stays tracked until it fills.")
+        return None
+
+    def plan_regrid(self, book, wanted):
+        """
+        Diffs the live orders against `wanted` ladder entries for the new `book`. Returns
+        (keep, amend, cancel, place): kept orders as (order_id, new_level, side, qty),
+        (order_id, entry) moves, order IDs to cancel and entries to place.
+        """
+        live = {}
+        for order_id, level in self.book.open_orders().items():
+            live[(self.book.ticks[level], self.book.side_at(level))] = (order_id, self.book.qty[level])
+        keep, place = [], []
+        for entry in wanted:
+            match = live.get((book.ticks[entry['level']], entry['side']))
+            target = float(entry['qty'])
+            if match and abs(match[1] - target) <= self.REGRID_QTY_TOLERANCE * target:
+                del live[(book.ticks[entry['level']], entry['side'])]
+                keep.append((match[0], entry['level'], entry['side'], match[1]))
+            else:
+                place.append(entry)
+        # Every remaining live order is either moved onto a new level or cancelled; pairing
+        # them in price order moves each order as little as possible
+        leftover = [order_id for _, (order_id, _) in sorted(live.items())]
+        moves = min(len(leftover), len(place)) if self.cancel_replace_allowed() else 0
+        amend = list(zip(leftover[:moves], place[:moves]))
+        return keep, amend, leftover[moves:], place[moves:]
+
+    def cancel_replace_allowed(self):
+        return symbol_cache.get(self.client, self.params['pair']).get('cancel_replace_allowed', False)
+
+    def submit_regrid_action(self, action, client_order_id=None):
+        """OrderPlacementScheduler callback for one re-grid action."""
+        if action['action'] == 'place':
+            return self.submit_order(action['side'], action['qty'], action['price_str'], client_order_id)
+        if action['action'] == 'cancel':
+            rate_limiter.acquire(weight=1)
+            try:
+                return self.client.cancel_order(symbol=self.params['pair'], orderId=action['order_id'])
+            finally:
+                rate_limiter.update_from_response(getattr(self.client, 'response', None))
+        rate_limiter.acquire(weight=1, orders=1)
+        try:
+            response = self.client.cancel_replace_order(
+                symbol=self.params['pair'],
+                side=action['side'],
+                type=Client.ORDER_TYPE_LIMIT,
+                timeInForce=Client.TIME_IN_FORCE_GTC,
+                quantity=action['qty'],
+                price=action['price_str'],
+                cancelReplaceMode='STOP_ON_FAILURE',
+                cancelOrderId=action['order_id'],
+                newClientOrderId=client_order_id
+            )
+        finally:
+            rate_limiter.update_from_response(getattr(self.client, 'response', None))
+        self.orders_placed += 1
+        return response
+
+    def trailing_params(self, price):
+        """
+        With params['trailing'] set and `price` outside the bounds, returns the params
+        shifted to centre the grid on `price`; otherwise None. The shift is a whole number
+        of level steps, so levels that stay in range keep their exact prices and orders.
+        """
+        if not self.params.get('trailing') or self.book is None or len(self.book) < 2:
+            return None
+        lower, upper = self.params['lower_bound'], self.params['upper_bound']
+        if lower <= price <= upper:
+            return None
+        steps = len(self.book) - 1
+        if self.params.get('spacing') == GridLadder.GEOMETRIC:
+            ratio = (upper / lower) ** (1 / steps)
+            shift = ratio ** round(math.log(price / math.sqrt(lower * upper)) / math.log(ratio))
+            return dict(self.params, lower_bound=lower * shift, upper_bound=upper * shift)
+        step = (upper - lower) / steps
+        shift = round((price - (lower + upper) / 2) / step) * step
+        return dict(self.params, lower_bound=lower + shift, upper_bound=upper + shift)
+
+    def mark_to_market(self):
+        """Revalues the position at the current price. Returns the price, or None if unavailable."""
+        try:
+            rate_limiter.acquire(weight=2)
+            price = float(self.client.get_symbol_ticker(symbol=self.params['pair'])['price'])
+        except BinanceAPIException as e:
+            self.log(f"Price check failed: {e}")
+            return None
+        if self.ledger:
+            self.ledger.mark(price)
+        return price
+
+    def check_trailing(self, price=None):
+        """Re-centres a trailing grid if price has left it. Returns True if it moved."""
+        try:
+            if price is None:
+                rate_limiter.acquire(weight=2)
+                price = float(self.client.get_symbol_ticker(symbol=self.params['pair'])['price'])
+            params = self.trailing_params(price)
+            if params is None:
+                return False
+            self.log(f"Price {price} left the grid range. Re-centring the grid.")
+            self.regrid(params, price)
+            return True
+        except BinanceAPIException as e:
+            self.log(f"Trailing check failed: {e}")
+            return False
+
+    def handle_filled_order(self, filled_order):
+        """Places the counter-order for a filled grid order."""
+        # Only open orders of this grid are in the book, so unknown or already handled
+        # fills are ignored here
+        if self.reconciler:
+            self.reconciler.observe(filled_order)
+        if self.book is None:
+            return
+        level = self.book.release(filled_order['orderId'])
+        if level is not None:
+            tick = self.book.ticks[level]
+        else:
+            # Filled before a re-grid could cancel or move it
+            tick = self.book.release_retired(filled_order['orderId'])
+            if tick is None:
+                return
+
+        filled_price = self.book.tick_price(tick)
+        filled_qty = float(filled_order['executedQty'])
+        # Average execution price when the report has it; a limit order never fills worse than its level
+        quote_qty = float(filled_order.get('cummulativeQuoteQty') or 0)
+        exec_price = quote_qty / filled_qty if quote_qty and filled_qty else filled_price
+        commission = float(filled_order.get('commission') or 0)
+        commission_asset = filled_order.get('commissionAsset')
+        pnl = 0.0
+
+        # The counter-order goes on the neighbouring level: one grid up for a buy, one down for a sell
+        if filled_order['side'] == 'BUY':
+            counter_level = self.book.level_above(tick)
+            self.log(f"BUY order filled at {filled_price}")
+            self.ledger.buy(tick, exec_price, filled_qty, commission, commission_asset)
+        
+        elif filled_order['side'] == 'SELL':
+            counter_level = self.book.level_below(tick)
+            self.log(f"SELL order filled at {filled_price}")
+            tick_below = self.book.ticks[counter_level] if counter_level is not None else None
+            pnl = self.ledger.sell(tick_below, exec_price, filled_qty, commission, commission_asset)
+            self.log(f"PROFIT from trade: {pnl:.4f} {self.quote_asset}. Total P&L: {self.total_pnl:.4f} {self.quote_asset}")
+
+        if self.journal is not None:
+            # Journaled before the counter-order, whose placement is journaled on its own
+            self.journal.filled(self.journal_key, filled_order['orderId'], pnl, filled_order.get('tradeId'))
+            if self.journal.snapshot_due(self.journal_key):
+                self.journal_snapshot()
+
+        counter_order = None
+        if counter_level is not None:
+            counter_side = 'SELL' if filled_order['side'] == 'BUY' else 'BUY'
+            counter_order = self.place_level_order(counter_level, counter_side, filled_qty)
+        self.record_fill_metrics(filled_order, counter_order)
+
+    def record_fill_metrics(self, filled_order, counter_order):
+        """Counts the fill and, if a counter-order went out, how long the reaction took."""
+        FILLS.inc(self.params['pair'], filled_order['side'])
+        if not counter_order:
+            return
+        now = time.time()
+        if filled_order.get('updateTime'):
+            # Includes clock offset to the exchange, which is small once the clock is synced
+            FILL_REACTION.observe(max(now - filled_order['updateTime'] / 1000, 0.0), 'exchange')
+        if filled_order.get('receivedAt'):
+            FILL_REACTION.observe(now - filled_order['receivedAt'], 'received')
+
+    def place_level_order(self, level, side, qty):
+        """Places an order at a grid level and records it in the book."""
+        if self.book.order_at(level) is not None:
+            self.log(f"Grid level {self.book.price_str(level)} already has an open order. Skipping {side}.")
+            return None
+        order = self.place_order(self.params['pair'], side, self.ladder.qty_str(qty), self.book.price_str(level))
+        if order:
+            self.book.assign(level, side, order['orderId'], qty)
+            if self.journal is not None:
+                self.journal.placed(self.journal_key, [(level, side, order['orderId'], qty)])
+        return order
+
+    def start_user_stream(self):
+        """Starts the user-data stream that feeds fills into fill_queue."""
+        self.user_stream = UserDataStream(
+            self.client,
+            on_fill=self.on_stream_fill,
+            on_connect=self.on_stream_connect,
+            log=self.log,
+            stream_url=self.stream_url
+        )
+        self.user_stream.start()
+        if not self.user_stream.wait_connected(timeout=10):
+            self.log("User-data stream not connected yet; falling back to REST polling until it is.")
+
+    def stop_user_stream(self):
+        if self.user_stream:
+            self.user_stream.stop()
+            self.user_stream = None
+
+    def stream_connected(self):
+        return self.user_stream is not None and self.user_stream.connected.is_set()
+
+    def on_stream_fill(self, order):
+        """Called from the stream thread for every fully filled order on the account."""
+        if order['symbol'] == self.params['pair']:
+            self.fill_queue.put(order)
+
+    def on_stream_connect(self, reconnected):
+        """
+        Queues a REST catch-up on anything that filled while the stream was down. It runs
+        on the bot thread, like fills and re-grids, since they share the book and reconciler.
+        """
+        if not reconnected:
+            return
+        self.log("User-data stream reconnected. Checking for fills missed while disconnected...")
+        self.fill_queue.put({'catch_up': True})
 
     def get_quote_asset(self):
         # e.g., for BTCUSDT, returns USDT
-        return self.client.get_symbol_info(self.params['pair'])['quoteAsset']
+        return symbol_cache.get(self.client, self.params['pair'])['quote_asset']
 
     def get_base_asset(self):
         # e.g., for BTCUSDT, returns BTC
-        return self.client.get_symbol_info(self.params['pair'])['baseAsset']
-        
-    def calculate_quantity(self, investment, price):
-        """Calculate trade quantity based on investment and price, respecting lot size rules."""
-        info = self.client.get_symbol_info(self.params['pair'])
-        lot_size_filter = next(f for f in info['filters'] if f['filterType'] == 'LOT_SIZE')
-        step_size = float(lot_size_filter['stepSize'])
+        return symbol_cache.get(self.client, self.params['pair'])['base_asset']
         
-        raw_qty = investment / price
-        # Adjust quantity to conform to step size
-        adjusted_qty = (raw_qty // step_size) * step_size
-        return f"{adjusted_qty:.8f}".rstrip('0')
-
     def place_order(self, symbol, side, qty, price):
         """Places a limit order on Binance."""
         try:
-            price_str = f"{price:.8f}".rstrip('0')
+            price_str = price if isinstance(price, str) else f"{price:.8f}".rstrip('0')
             self.log(f"Placing {side} order for {qty} {symbol} at {price_str}")
-            order = self.client.create_order(
-                symbol=symbol,
-                side=side,
-                type=Client.ORDER_TYPE_LIMIT,
-                timeInForce=Client.TIME_IN_FORCE_GTC,
-                quantity=qty,
-                price=price_str
-            )
-            return order
+            return self.submit_order(side, qty, price_str)
         except BinanceAPIException as e:
             self.log(f"Failed to place order: {e}")
+            if symbol_cache.invalidate_on_filter_error(self.client, e):
+                self.log("Order broke an exchange filter. Symbol filters will be reloaded.")
             return None
 
+    def submit_ladder_order(self, order, client_order_id=None):
+        """OrderPlacementScheduler callback for one ladder entry."""
+        return self.submit_order(order['side'], order['qty'], order['price_str'], client_order_id)
+
+    def submit_order(self, side, qty, price, client_order_id=None):
+        """Sends one limit order for this bot's pair under the shared rate limit. Raises on failure."""
+        rate_limiter.acquire(weight=1, orders=1)
+        params = dict(
+            symbol=self.params['pair'],
+            side=side,
+            type=Client.ORDER_TYPE_LIMIT,
+            timeInForce=Client.TIME_IN_FORCE_GTC,
+            quantity=qty,
+            price=price if isinstance(price, str) else f"{price:.8f}".rstrip('0')
+        )
+        if client_order_id:
+            params['newClientOrderId'] = client_order_id
+        try:
+            order = self.client.create_order(**params)
+        finally:
+            rate_limiter.update_from_response(getattr(self.client, 'response', None))
+        self.orders_placed += 1
+        return order
+
     def cancel_all_orders(self):
-        """Cancels all open orders for the current pair."""
+        """
+        Cancels all open orders for the current pair with one bulk request, falling back
+        to cancelling them one by one in parallel if the bulk request fails.
+        """
+        start = time.perf_counter()
         try:
-            open_orders = self.client.get_open_orders(symbol=self.params['pair'])
-            if open_orders:
-                self.log(f"Cancelling {len(open_orders)} open order(s)...")
-                for order in open_orders:
-                    self.client.cancel_order(symbol=self.params['pair'], orderId=order['orderId'])
+            rate_limiter.acquire(weight=1)
+            cancelled = self.client.cancel_all_open_orders(symbol=self.params['pair'])
+            count = len(cancelled)
+        except BinanceAPIException as e:
+            if e.code == self.NO_OPEN_ORDERS_CODE:
+                count = 0
             else:
-                self.log("No open orders to cancel.")
+                self.log(f"Bulk cancel failed ({e}). Cancelling orders individually...")
+                count = self.cancel_orders_individually()
+        if self.book:
+            for order_id in self.book.open_orders():
+                self.book.release(order_id)
+            self.book.retired.clear()
+        if count:
+            self.log(f"Cancelled {count} open order(s) in {(time.perf_counter() - start) * 1000:.0f} ms.")
+        else:
+            self.log("No open orders to cancel.")
+
+    def cancel_orders_individually(self):
+        """Fallback for cancel_all_orders: one cancel request per open order, sent in parallel."""
+        try:
+            open_orders = self.client.get_open_orders(symbol=self.params['pair'])
         except BinanceAPIException as e:
             self.log(f"Error cancelling orders: {e}")
+            return 0
+        if not open_orders:
+            return 0
+        self.log(f"Cancelling {len(open_orders)} open order(s)...")
+
+        with ThreadPoolExecutor(max_workers=OrderPlacementScheduler.MAX_WORKERS) as pool:
+            return sum(pool.map(lambda order: self.cancel_order(order['orderId']), open_orders))
+
+    def cancel_order(self, order_id):
+        """Cancels one order of this pair. Returns True on success."""
+        rate_limiter.acquire(weight=1)
+        try:
+            self.client.cancel_order(symbol=self.params['pair'], orderId=order_id)
+            return True
+        except BinanceAPIException as e:
+            self.log(f"Error cancelling order {order_id}: {e}")
+            return False
 
     def check_filled_orders(self):
-        """Checks for recently filled orders."""
-        # A more robust solution would use websockets for real-time updates.
-        # For simplicity, we poll recent trades.
+        """Checks over REST for filled grid orders that have not been processed yet."""
+        if self.reconciler is None:
+            return []
         try:
-            trades = self.client.get_my_trades(symbol=self.params['pair'], limit=50)
-            # This is a simplification. A real bot would need to track order IDs
-            # to avoid reprocessing the same filled order. We'll just return the
-            # most recent ones for this example.
-            # Here we just check the very last trade and assume it's new.
-            # In a real app, you must maintain a list of processed trade IDs.
-            
-            # This logic is simplified for the example. It checks the latest trades.
-            # A robust implementation would involve tracking order IDs and their status.
-            filled_orders = []
-            open_orders = self.client.get_open_orders(symbol=self.params['pair'])
-            open_order_ids = {str(o['orderId']) for o in open_orders}
-            
-            all_orders = self.client.get_all_orders(symbol=self.params['pair'], limit=50)
-            
-            # Placeholder for state: track processed orders to avoid duplication
-            if not hasattr(self, 'processed_order_ids'):
-                 self.processed_order_ids = set()
+            return self.reconciler.poll()
+        except BinanceAPIException as e:
+            self.log(f"Error checking filled orders: {e}")
+            return []
 
-            for order in all_orders:
-                 if order['status'] == 'FILLED' and str(order['orderId']) not in self.processed_order_ids:
-                      filled_orders.append(order)
-                      self.processed_order_ids.add(str(order['orderId']))
 
-            return filled_orders
+class OrderReconciler:
+    """
+    Incremental REST fill detection for one grid, used while the user-data stream is down.
+
+    Instead of re-reading the latest N orders, each poll asks for account trades newer
+    than the last trade ID already seen (a trade-ID watermark; an orderId watermark on
+    allOrders would never show fills of older resting orders). Pages are followed until
+    the exchange has nothing newer, so bursts of any size are picked up. Trades are summed
+    per order and an order is reported once its filled quantity reaches the size recorded
+    in the GridBook; partial fills are only kept for orders that are still open there.
+
+    The poll interval adapts to the grid's recent fill rate and stretches when the shared
+    weight budget is running low.
+    """
+    MIN_INTERVAL = 2
+    MAX_INTERVAL = 30
+    PAGE_LIMIT = 1000
+    REQUEST_WEIGHT = 20
+    # Smoothing of the fill-rate estimate (per poll)
+    RATE_SMOOTHING = 0.3
+
+    def __init__(self, client, symbol, book, log=None, last_trade_id=None):
+        self.client = client
+        self.symbol = symbol
+        self.book = book
+        self.log = log or logging.info
+        self.fill_rate = 0.0
+        self._partial = {}
+        self._last_poll = time.time()
+        if last_trade_id is None:
+            rate_limiter.acquire(weight=self.REQUEST_WEIGHT)
+            latest = self.client.get_my_trades(symbol=symbol, limit=1)
+            last_trade_id = latest[-1]['id'] if latest else -1
+        self.last_trade_id = last_trade_id
+
+    def observe(self, order):
+        """
+        Forgets partial-fill state of an order the stream has reported filled. The watermark
+        stays put: trades older than this one may have been missed while the stream was
+        down, and only poll() can vouch for those. Orders handled from the stream are left
+        out of the book, so poll() skips their trades later.
+        """
+        self._partial.pop(int(order['orderId']), None)
 
-        except BinanceAPIException as e:
-            self.log(f"Error checking filled orders: {e}")
+    def poll(self):
+        """Returns REST-style order dicts for grid orders that filled since the last poll."""
+        filled = []
+        while True:
+            rate_limiter.acquire(weight=self.REQUEST_WEIGHT)
+            try:
+                trades = self.client.get_my_trades(
+                    symbol=self.symbol, fromId=self.last_trade_id + 1, limit=self.PAGE_LIMIT
+                )
+            finally:
+                rate_limiter.update_from_response(getattr(self.client, 'response', None))
+            for trade in trades:
+                self.last_trade_id = max(self.last_trade_id, trade['id'])
+                order = self._apply(trade)
+                if order:
+                    filled.append(order)
+            if len(trades) < self.PAGE_LIMIT:
+                break
+
+        # Forget partial fills of orders that are no longer in the grid
+        open_orders = self.book.open_orders()
+        for order_id in [o for o in self._partial if o not in open_orders and o not in self.book.retired]:
+            del self._partial[order_id]
+
+        now = time.time()
+        rate = len(filled) / max(now - self._last_poll, 1e-3)
+        self.fill_rate += self.RATE_SMOOTHING * (rate - self.fill_rate)
+        self._last_poll = now
+        return filled
+
+    def next_interval(self):
+        """Seconds until the next poll: ~one expected fill per poll, within bounds."""
+        if self.fill_rate > 0:
+            interval = 1.0 / self.fill_rate
+        else:
+            interval = self.MAX_INTERVAL
+        if self._partial:
+            # Partially filled orders tend to complete soon
+            interval = min(interval, self.MIN_INTERVAL * 2)
+        budget = rate_limiter.remaining_fraction()
+        if budget < 0.5:
+            interval /= max(budget * 2, 0.1)
+        return min(max(interval, self.MIN_INTERVAL), self.MAX_INTERVAL)
+
+    def _apply(self, trade):
+        order_id = int(trade['orderId'])
+        order_qty = self.book.order_qty(order_id)
+        if order_qty is None:
+            return None
+        state = self._partial.setdefault(order_id, {'qty': 0.0, 'quote_qty': 0.0, 'commission': 0.0})
+        state['qty'] += float(trade['qty'])
+        state['quote_qty'] += float(trade.get('quoteQty', 0))
+        state['commission'] += float(trade.get('commission', 0))
+        state['commission_asset'] = trade.get('commissionAsset') or state.get('commission_asset')
+        # Compare with a little slack for float rounding of the summed quantities
+        if state['qty'] + 1e-12 < order_qty:
+            return None
+        del self._partial[order_id]
+        level = self.book.level_for_order(order_id)
+        return {
+            'symbol': self.symbol,
+            'orderId': order_id,
+            'side': 'BUY' if trade['isBuyer'] else 'SELL',
+            'status': 'FILLED',
+            'price': self.book.price_str(level) if level is not None else trade['price'],
+            'executedQty': str(state['qty']),
+            'cummulativeQuoteQty': str(state['quote_qty']),
+            'commission': str(state['commission']),
+            'commissionAsset': state['commission_asset'],
+            'tradeId': trade['id'],
+            'updateTime': trade.get('time'),
+        }
+
+
+class GridBook:
+    """
+    Compact, array-backed state of one grid.
+
+    Level prices are stored as sorted integer multiples of the symbol's tick size, so
+    prices never drift and always format to exchange-valid strings. Each level has one
+    order slot (side, order ID, quantity, status) in parallel fixed-size arrays. Order IDs
+    map to their level through a dict that only holds open orders, and prices map to a
+    level with a binary search, so every fill resolves to its exact level in O(log n).
+    """
+    EMPTY, OPEN = 0, 1
+    SIDES = {'BUY': 1, 'SELL': -1}
+    SIDE_NAMES = {1: 'BUY', -1: 'SELL', 0: None}
+    DEFAULT_TICK_SIZE = 1e-8
+
+    def __init__(self, level_ticks, tick_size, price_precision):
+        self.tick_size = tick_size
+        self.price_precision = price_precision
+        # Tick size in units of the last price decimal, for exact string formatting
+        self.tick_units = round(tick_size * 10 ** price_precision)
+        self.ticks = array('q', sorted(set(level_ticks)))
+        n = len(self.ticks)
+        self.side = array('b', bytes(n))
+        self.order_id = array('q', [0]) * n
+        self.qty = array('d', [0.0]) * n
+        self.status = array('b', bytes(n))
+        self._levels_by_order = {}
+        # Orders of a previous ladder whose cancel or move the exchange has not confirmed
+        # yet, {order_id: (tick, qty)}; they can still fill and must not be lost
+        self.retired = {}
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def price(self, level):
+        return self.tick_price(self.ticks[level])
+
+    def tick_price(self, tick):
+        return tick * self.tick_units / 10 ** self.price_precision
+
+    def price_str(self, level):
+        """Exact decimal string of a level's price."""
+        return _format_units(self.ticks[level] * self.tick_units, self.price_precision)
+
+    def level_at(self, price):
+        """Level whose price is exactly `price`, or None."""
+        tick = round(price / self.tick_size)
+        i = bisect.bisect_left(self.ticks, tick)
+        return i if i < len(self.ticks) and self.ticks[i] == tick else None
+
+    def nearest_level(self, price):
+        """Level closest to `price`."""
+        tick = price / self.tick_size
+        i = bisect.bisect_left(self.ticks, tick)
+        if i == 0:
+            return 0
+        if i == len(self.ticks):
+            return i - 1
+        return i if self.ticks[i] - tick < tick - self.ticks[i - 1] else i - 1
+
+    def level_for_order(self, order_id):
+        return self._levels_by_order.get(int(order_id))
+
+    def order_at(self, level):
+        """Open order ID at a level, or None."""
+        return self.order_id[level] if self.status[level] == self.OPEN else None
+
+    def side_at(self, level):
+        return self.SIDE_NAMES[self.side[level]] if self.status[level] == self.OPEN else None
+
+    def assign(self, level, side, order_id, qty):
+        """Records an open order in a level's slot."""
+        order_id = int(order_id)
+        previous = self.order_at(level)
+        if previous is not None:
+            self._levels_by_order.pop(previous, None)
+        self.side[level] = self.SIDES[side]
+        self.order_id[level] = order_id
+        self.qty[level] = qty
+        self.status[level] = self.OPEN
+        self._levels_by_order[order_id] = level
+
+    def release(self, order_id):
+        """Frees the slot of a filled or cancelled order. Returns its level, or None if unknown."""
+        level = self._levels_by_order.pop(int(order_id), None)
+        if level is not None:
+            self.status[level] = self.EMPTY
+            self.side[level] = 0
+        return level
+
+    def open_orders(self):
+        """{order_id: level} for every open order."""
+        return dict(self._levels_by_order)
+
+    def retire(self, order_id, tick, qty):
+        """Keeps tracking an order that is being cancelled or moved off the ladder."""
+        self.retired[int(order_id)] = (tick, qty)
+
+    def release_retired(self, order_id):
+        """Stops tracking a retired order. Returns its tick, or None if unknown."""
+        entry = self.retired.pop(int(order_id), None)
+        return entry[0] if entry else None
+
+    def order_qty(self, order_id):
+        """Size of a tracked order, on a level or retired, or None."""
+        level = self.level_for_order(order_id)
+        if level is not None:
+            return self.qty[level]
+        entry = self.retired.get(int(order_id))
+        return entry[1] if entry else None
+
+    def level_above(self, tick):
+        """First level priced strictly above `tick`, or None."""
+        i = bisect.bisect_right(self.ticks, tick)
+        return i if i < len(self.ticks) else None
+
+    def level_below(self, tick):
+        """First level priced strictly below `tick`, or None."""
+        i = bisect.bisect_left(self.ticks, tick)
+        return i - 1 if i > 0 else None
+
+
+class GridLadder:
+    """
+    Builds a grid's initial orders in one vectorized pass, in exchange units.
+
+    Prices are whole multiples of the PRICE_FILTER tickSize and quantities whole
+    multiples of the LOT_SIZE stepSize, so every order is on the tick and the lot step
+    by construction and formats to an exact string. Levels are spaced arithmetically
+    (equal price steps) or geometrically (equal ratios). Levels that round to the same
+    tick are merged, a grid whose investment cannot fund every level at minQty and
+    MIN_NOTIONAL is coarsened to the number of levels it can fund, and any level still
+    outside the filters is dropped before anything is sent.
+    """
+    ARITHMETIC, GEOMETRIC = 'arithmetic', 'geometric'
+    SPACINGS = (ARITHMETIC, GEOMETRIC)
+    DEFAULT_STEP_SIZE = 1e-8
+    # Absorbs float error when flooring to whole steps (e.g. 0.3 / 0.1 = 2.9999999999999996)
+    EPSILON = 1e-9
+
+    def __init__(self, metadata):
+        self.tick_size = metadata.get('tick_size') or GridBook.DEFAULT_TICK_SIZE
+        self.price_precision = metadata['price_precision'] if metadata.get('tick_size') else 8
+        self.step_size = metadata.get('step_size') or self.DEFAULT_STEP_SIZE
+        self.qty_precision = metadata['qty_precision'] if metadata.get('step_size') else 8
+        # Tick and step in units of their last decimal, for exact string formatting
+        self.tick_units = round(self.tick_size * 10 ** self.price_precision)
+        self.step_units = round(self.step_size * 10 ** self.qty_precision)
+        self.min_steps = max(math.ceil(metadata.get('min_qty', 0) / self.step_size - self.EPSILON), 1)
+        max_qty = metadata.get('max_qty')
+        self.max_steps = math.floor(max_qty / self.step_size + self.EPSILON) if max_qty else None
+        self.min_notional = metadata.get('min_notional', 0.0)
+        min_price, max_price = metadata.get('min_price'), metadata.get('max_price')
+        self.min_tick = max(math.ceil(min_price / self.tick_size - self.EPSILON), 1) if min_price else 1
+        self.max_tick = math.floor(max_price / self.tick_size + self.EPSILON) if max_price else None
+
+    def level_ticks(self, lower_bound, upper_bound, grids, spacing=ARITHMETIC):
+        """Sorted, distinct level prices in ticks, inside the symbol's price limits."""
+        if spacing == self.ARITHMETIC:
+            prices = np.linspace(lower_bound, upper_bound, grids)
+        elif spacing == self.GEOMETRIC:
+            prices = np.geomspace(lower_bound, upper_bound, grids)
+        else:
+            raise ValueError(f"Unknown grid spacing '{spacing}'. Use one of: {', '.join(self.SPACINGS)}.")
+        ticks = np.unique(np.rint(prices / self.tick_size).astype(np.int64))
+        ticks = ticks[ticks >= self.min_tick]
+        if self.max_tick is not None:
+            ticks = ticks[ticks <= self.max_tick]
+        return ticks
+
+    def quantities(self, ticks, budget):
+        """Whole lot steps that `budget` quote buys at each level, rounded down."""
+        steps = np.floor(budget / (ticks * self.tick_size * self.step_size) + self.EPSILON).astype(np.int64)
+        if self.max_steps is not None:
+            steps = np.minimum(steps, self.max_steps)
+        return steps
+
+    def valid(self, ticks, steps):
+        """Mask of levels whose order passes LOT_SIZE and MIN_NOTIONAL."""
+        notional = ticks * self.tick_size * (steps * self.step_size)
+        return (steps >= self.min_steps) & (notional >= self.min_notional * (1 - self.EPSILON))
+
+    def min_budget(self, ticks):
+        """Quote amount per level that funds a valid order at every level."""
+        prices = ticks * self.tick_size
+        steps = np.maximum(np.ceil(self.min_notional / (prices * self.step_size) - self.EPSILON), self.min_steps)
+        return float((steps * self.step_size * prices).max())
+
+    def build(self, lower_bound, upper_bound, grids, investment, spacing=ARITHMETIC):
+        """
+        Returns a dict with the final level `ticks`, their `qty_steps`, `requested` and
+        final level counts and how many levels were `dropped` as invalid.
+        """
+        ticks = self.level_ticks(lower_bound, upper_bound, grids, spacing)
+        if len(ticks) < 2:
+            raise ValueError("The grid bounds are less than two price ticks apart.")
+        # One level always stays empty, so n levels share the investment n - 1 ways
+        required = self.min_budget(ticks)
+        affordable = int(investment / required) + 1 if required else len(ticks)
+        if affordable < 2:
+            raise ValueError(f"An investment of {investment} cannot fund a grid: each order needs at least {required:.8g}.")
+        if affordable < len(ticks):
+            ticks = self.level_ticks(lower_bound, upper_bound, affordable, spacing)
+        steps = self.quantities(ticks, investment / (len(ticks) - 1))
+        valid = self.valid(ticks, steps)
+        return {
+            'ticks': ticks[valid],
+            'qty_steps': steps[valid],
+            'requested': grids,
+            'levels': int(valid.sum()),
+            'dropped': int(len(valid) - valid.sum()),
+        }
+
+    def orders(self, ticks, qty_steps, skipped):
+        """Ladder entries for every level but `skipped`: buys below it, sells above it."""
+        prices = (ticks * self.tick_size).tolist()
+        price_strs = self.format_many(ticks * self.tick_units, self.price_precision)
+        qty_strs = self.format_many(qty_steps * self.step_units, self.qty_precision)
+        return [
+            {'side': 'BUY' if level < skipped else 'SELL', 'level': level, 'price': price,
+             'price_str': price_str, 'qty': qty_str}
+            for level, (price, price_str, qty_str) in enumerate(zip(prices, price_strs, qty_strs))
+            if level != skipped
+        ]
+
+    @staticmethod
+    def format_many(units, precision):
+        """_format_units over an integer array, with the division done by NumPy."""
+        if not precision:
+            return list(map(str, units.tolist()))
+        # One %-format over the whole ladder is about twice as fast as formatting per value
+        pairs = np.empty(2 * len(units), dtype=np.int64)
+        pairs[0::2], pairs[1::2] = np.divmod(units, 10 ** precision)
+        return ((f"%d.%0{precision}d\n" * len(units)) % tuple(pairs.tolist())).split()
+
+    def qty_str(self, qty):
+        """`qty` rounded down to the lot step, as an exact string."""
+        steps = math.floor(qty / self.step_size + self.EPSILON)
+        return _format_units(steps * self.step_units, self.qty_precision)
+
+
+class PositionLedger:
+    """
+    Running position and P&L of one grid, updated in O(1) per fill and price tick.
+
+    Each buy opens a lot on its level, and the base asset a grid starts with (backing
+    its initial sells) is seeded as lots at the opening price. A sell closes lots FIFO,
+    starting with the level below it (the buy it is the counter-order of), then the
+    oldest other levels. Commissions come
+    from the fill reports: base-asset fees shrink the lot, quote-asset fees add to its
+    cost or cut the sale's proceeds, and fees in other assets (e.g. BNB) are tallied
+    separately. Lots live in parallel arrays whose slots are reused, and inventory, cost
+    basis, realized and unrealized P&L and the drawdown of realized plus unrealized P&L
+    are kept as running totals, so `snapshot()` never walks the trade history.
+    """
+    # Quantities below this are float residue of closed lots
+    EPSILON = 1e-12
+
+    def __init__(self, base_asset, quote_asset, realized=0.0):
+        self.base_asset = base_asset
+        self.quote_asset = quote_asset
+        self.mark_price = None
+        self.lot_qty = array('d')
+        self.lot_cost = array('d')  # Per unit, fees included
+        self._free = []
+        self._lots = {}  # level tick -> deque of lot slots, oldest first
+        self.inventory = 0.0
+        self.cost_basis = 0.0
+        self.realized = realized
+        self.fees = 0.0  # In the quote asset
+        self.other_fees = {}
+        self.unmatched_qty = 0.0  # Sold without any lot to close, e.g. base added outside the grid
+        self.fills = 0
+        self.peak_equity = realized
+        self.max_drawdown = 0.0
+        self._lock = threading.Lock()
+
+    def seed(self, tick, price, qty):
+        """Opens a lot on level `tick` for base the grid starts with; not counted as a fill."""
+        with self._lock:
+            self._open(tick, qty, price * qty)
+            self._mark(price)
+
+    def buy(self, tick, price, qty, commission=0.0, commission_asset=None):
+        """Opens a lot on level `tick`."""
+        with self._lock:
+            cost, received = price * qty, qty
+            if commission_asset == self.base_asset:
+                received -= commission
+                self.fees += commission * price
+            else:
+                cost += self._fee(commission, commission_asset)
+            self._open(tick, received, cost)
+            self.fills += 1
+            self._mark(price)
+
+    def sell(self, tick_below, price, qty, commission=0.0, commission_asset=None):
+        """Closes lots for a sell, the level below first. Returns the realized P&L."""
+        with self._lock:
+            proceeds, sold = price * qty, qty
+            if commission_asset == self.base_asset:
+                sold += commission
+                self.fees += commission * price
+            else:
+                proceeds -= self._fee(commission, commission_asset)
+            remaining, cost = self._close(self._lots.get(tick_below), sold)
+            # Rare: the level's lots are gone (e.g. after a re-grid), so take the oldest levels' lots
+            for tick in list(self._lots):
+                if remaining <= self.EPSILON:
+                    break
+                remaining, more = self._close(self._lots[tick], remaining)
+                cost += more
+            for tick in [t for t, lots in self._lots.items() if not lots]:
+                del self._lots[tick]
+            if remaining > self.EPSILON:
+                # Nothing left to close; the unmatched part books no P&L
+                self.unmatched_qty += remaining
+                cost += remaining * price
+            if self.inventory <= self.EPSILON:
+                self.inventory = self.cost_basis = 0.0
+            pnl = proceeds - cost
+            self.realized += pnl
+            self.fills += 1
+            self._mark(price)
+            return pnl
+
+    def mark(self, price):
+        """Revalues the open lots at `price`."""
+        with self._lock:
+            self._mark(price)
+
+    def snapshot(self):
+        """Current position and P&L as a plain dict."""
+        with self._lock:
+            unrealized = self.inventory * self.mark_price - self.cost_basis if self.mark_price else 0.0
+            return {
+                'inventory': self.inventory,
+                'avg_cost': self.cost_basis / self.inventory if self.inventory > self.EPSILON else 0.0,
+                'realized_pnl': self.realized,
+                'unrealized_pnl': unrealized,
+                'total_pnl': self.realized + unrealized,
+                'fees': self.fees,
+                'other_fees': dict(self.other_fees),
+                'max_drawdown': self.max_drawdown,
+                'mark_price': self.mark_price,
+                'open_lots': len(self.lot_qty) - len(self._free),
+                'unmatched_qty': self.unmatched_qty,
+                'fills': self.fills,
+            }
+
+    def _open(self, tick, qty, cost):
+        if qty <= self.EPSILON:
+            return
+        slot = self._free.pop() if self._free else len(self.lot_qty)
+        if slot == len(self.lot_qty):
+            self.lot_qty.append(0.0)
+            self.lot_cost.append(0.0)
+        self.lot_qty[slot] = qty
+        self.lot_cost[slot] = cost / qty
+        self._lots.setdefault(tick, deque()).append(slot)
+        self.inventory += qty
+        self.cost_basis += cost
+
+    def _close(self, lots, qty):
+        """Takes up to `qty` from `lots` FIFO. Returns the uncovered quantity and the cost taken."""
+        cost = 0.0
+        while lots and qty > self.EPSILON:
+            slot = lots[0]
+            take = min(self.lot_qty[slot], qty)
+            cost += take * self.lot_cost[slot]
+            self.lot_qty[slot] -= take
+            qty -= take
+            self.inventory -= take
+            self.cost_basis -= take * self.lot_cost[slot]
+            if self.lot_qty[slot] <= self.EPSILON:
+                lots.popleft()
+                self._free.append(slot)
+        return qty, cost
+
+    def _fee(self, commission, asset):
+        """Books a fee. Returns the part payable in the quote asset."""
+        if asset == self.quote_asset:
+            self.fees += commission
+            return commission
+        if commission:
+            self.other_fees[asset] = self.other_fees.get(asset, 0.0) + commission
+        return 0.0
+
+    def _mark(self, price):
+        self.mark_price = price
+        equity = self.realized + self.inventory * price - self.cost_basis
+        if equity > self.peak_equity:
+            self.peak_equity = equity
+        elif self.peak_equity - equity > self.max_drawdown:
+            self.max_drawdown = self.peak_equity - equity
+
+
+class GridJournal:
+    """
+    Crash-safe, append-only journal of running grids in a SQLite database (WAL mode).
+
+    Each grid (keyed by environment, account and pair) records its configuration and level prices
+    when it is set up, then one row per order placement, fill (with its P&L) or release.
+    Every SNAPSHOT_EVERY events the open orders are snapshotted and older events dropped,
+    so loading a grid reads one snapshot plus a short tail of events. The journal can be
+    shared by several bots.
+    """
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".crypto_trader", "journal.sqlite")
+    SNAPSHOT_EVERY = 200
+    GRID_PARAMS = ('lower_bound', 'upper_bound', 'grids', 'investment')
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS grids (
+            key TEXT PRIMARY KEY, params TEXT NOT NULL, ticks TEXT NOT NULL,
+            tick_size REAL NOT NULL, price_precision INTEGER NOT NULL, created REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, ts REAL NOT NULL,
+            kind TEXT NOT NULL, level INTEGER, side TEXT, order_id INTEGER, qty REAL,
+            pnl REAL, trade_id INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS events_by_key ON events (key, seq);
+        CREATE TABLE IF NOT EXISTS snapshots (
+            key TEXT PRIMARY KEY, seq INTEGER NOT NULL, ts REAL NOT NULL, orders TEXT NOT NULL,
+            total_pnl REAL NOT NULL, last_trade_id INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path=DEFAULT_PATH, snapshot_every=SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL with synchronous=NORMAL survives process crashes; only a power loss can drop the last commits
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self._since_snapshot = {}
+
+    @staticmethod
+    def key_for(client, pair):
+        """Environment, a fingerprint of the account's API key (never the key itself) and pair."""
+        api_key = getattr(client, 'API_KEY', None) or ''
+        account = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        return f"{'testnet' if getattr(client, 'testnet', False) else 'mainnet'}:{account}:{pair}"
+
+    @classmethod
+    def grid_params(cls, params):
+        """The settings that must match for a journaled grid to be restored."""
+        grid = {name: params[name] for name in cls.GRID_PARAMS}
+        # Only stored when set, so journals of arithmetic grids from before spacing existed still match
+        if params.get('spacing', GridLadder.ARITHMETIC) != GridLadder.ARITHMETIC:
+            grid['spacing'] = params['spacing']
+        return grid
+
+    def start_grid(self, key, params, book, last_trade_id, base_params=None):
+        """
+        Replaces any journaled state for `key` with a new, empty grid. `base_params` are the
+        settings the bot was configured with, if `params` moved away from them.
+        """
+        stored = self.grid_params(params)
+        if base_params is not None and self.grid_params(base_params) != stored:
+            stored['base'] = self.grid_params(base_params)
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._clear(key)
+            self._db.execute(
+                "INSERT INTO grids (key, params, ticks, tick_size, price_precision, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(stored), json.dumps(list(book.ticks)),
+                 book.tick_size, book.price_precision, time.time())
+            )
+            self._db.execute(
+                "INSERT INTO snapshots (key, seq, ts, orders, total_pnl, last_trade_id) VALUES (?, 0, ?, '[]', 0, ?)",
+                (key, time.time(), last_trade_id)
+            )
+            self._since_snapshot[key] = 0
+
+    def placed(self, key, orders):
+        """Records placed orders, given as (level, side, order_id, qty) tuples."""
+        now = time.time()
+        self._append(key, [(key, now, 'place', level, side, int(order_id), qty, None, None)
+                           for level, side, order_id, qty in orders])
+
+    def filled(self, key, order_id, pnl, trade_id=None):
+        self._append(key, [(key, time.time(), 'fill', None, None, int(order_id), None, pnl, trade_id)])
+
+    def released(self, key, order_id):
+        """Records an order that left the grid without filling (e.g. cancelled)."""
+        self._append(key, [(key, time.time(), 'release', None, None, int(order_id), None, None, None)])
+
+    def _append(self, key, rows):
+        if not rows:
+            return
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT INTO events (key, ts, kind, level, side, order_id, qty, pnl, trade_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._since_snapshot[key] = self._since_snapshot.get(key, 0) + len(rows)
+
+    def snapshot_due(self, key):
+        return self._since_snapshot.get(key, 0) >= self.snapshot_every
+
+    def snapshot(self, key, book, total_pnl, last_trade_id):
+        """Stores the open orders of `book` and drops the events they summarize."""
+        orders = [(level, book.side_at(level), order_id, book.qty[level])
+                  for order_id, level in book.open_orders().items()]
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            seq = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO snapshots (key, seq, ts, orders, total_pnl, last_trade_id) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, seq, time.time(), json.dumps(orders), total_pnl, last_trade_id)
+            )
+            self._db.execute("DELETE FROM events WHERE key = ? AND seq <= ?", (key, seq))
+            self._since_snapshot[key] = 0
+
+    def load(self, key):
+        """
+        Returns the journaled state of a grid (latest snapshot plus later events), or None.
+        'params' are the grid's current settings and 'base_params' the configured ones.
+        """
+        with self._lock:
+            grid = self._db.execute(
+                "SELECT params, ticks, tick_size, price_precision FROM grids WHERE key = ?", (key,)
+            ).fetchone()
+            snapshot = self._db.execute(
+                "SELECT seq, orders, total_pnl, last_trade_id FROM snapshots WHERE key = ?", (key,)
+            ).fetchone()
+            if grid is None or snapshot is None:
+                return None
+            seq, orders_json, total_pnl, last_trade_id = snapshot
+            events = self._db.execute(
+                "SELECT kind, level, side, order_id, qty, pnl, trade_id FROM events "
+                "WHERE key = ? AND seq > ? ORDER BY seq", (key, seq)
+            ).fetchall()
+
+        orders = {order_id: (level, side, qty) for level, side, order_id, qty in json.loads(orders_json)}
+        # Fills carry the stream's trade IDs, which are no watermark: trades before them may
+        # have been missed while the stream was down. The snapshot's REST watermark is kept.
+        for kind, level, side, order_id, qty, pnl, _ in events:
+            if kind == 'place':
+                orders[order_id] = (level, side, qty)
+            else:
+                orders.pop(order_id, None)
+            if pnl:
+                total_pnl += pnl
+        self._since_snapshot[key] = len(events)
+        params = json.loads(grid[0])
+        base_params = params.pop('base', params)
+        return {
+            'params': params,
+            'base_params': base_params,
+            'ticks': json.loads(grid[1]),
+            'tick_size': grid[2],
+            'price_precision': grid[3],
+            'orders': [(level, side, order_id, qty) for order_id, (level, side, qty) in orders.items()],
+            'total_pnl': total_pnl,
+            'last_trade_id': last_trade_id,
+        }
+
+    def clear(self, key):
+        """Forgets a grid, e.g. after it was stopped and its orders cancelled."""
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._clear(key)
+        self._since_snapshot.pop(key, None)
+
+    def _clear(self, key):
+        for table in ('grids', 'events', 'snapshots'):
+            self._db.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class BotSupervisor:
+    """
+    Runs many grid bots as tasks on a single asyncio event loop.
+
+    All bots share one exchange client, one user-data stream (fills are routed to the
+    bot trading that symbol), one all-symbol price feed and the process-wide rate
+    limiter. Blocking exchange calls run on a small shared worker pool instead of one
+    thread per bot. The public methods are thread-safe and can be called from the GUI
+    or a daemon's main thread.
+    """
+    IO_WORKERS = 8
+    PRICE_INTERVAL = 5
+
+    def __init__(self, client, gui_queue=None, stream_url=None, io_workers=IO_WORKERS, journal=None):
+        self.client = client
+        self.gui_queue = gui_queue
+        self.stream_url = stream_url
+        self.journal = journal
+        self.prices = {}
+        self._bots = {}
+        self._executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="supervisor-io")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._background = []
+        self.user_stream = None
+
+    def log(self, message):
+        logging.info(message)
+        if self.gui_queue is not None:
+            self.gui_queue.put(f"[Supervisor] {message}")
+
+    def start(self):
+        """Starts the event loop, the shared user-data stream and the price feed."""
+        self._thread.start()
+        self.user_stream = UserDataStream(
+            self.client,
+            on_fill=self._on_stream_fill,
+            on_connect=self._on_stream_connect,
+            log=self.log,
+            stream_url=self.stream_url
+        )
+        self.user_stream.start()
+        self._call(self._start_background_tasks)
+        return self
+
+    def add_bot(self, params):
+        """Starts a grid bot for params['pair']. Only one bot per pair can run."""
+        pair = params['pair']
+        if pair in self._bots and self._bots[pair]['state'] not in ('stopped', 'error'):
+            raise ValueError(f"A bot for {pair} is already running.")
+        bot = GridBot(self.client, params, self.gui_queue, stream_url=self.stream_url, journal=self.journal)
+        entry = {'bot': bot, 'state': 'starting', 'fills': None, 'task': None, 'fill_count': 0}
+        self._bots[pair] = entry
+        self._call(self._launch, entry)
+        return pair
+
+    def stop_bot(self, pair, timeout=None, detach=False):
+        """
+        Stops one bot and cancels its orders, or with detach leaves them open and journaled
+        for a warm restart. Waits up to `timeout` seconds if given.
+        """
+        entry = self._bots.get(pair)
+        if not entry:
+            raise ValueError(f"No bot is running for {pair}.")
+        future = asyncio.run_coroutine_threadsafe(self._stop(entry, detach), self._loop)
+        if timeout is not None:
+            future.result(timeout)
+
+    def regrid(self, pair, params):
+        """Moves a running bot's grid to `params` in place (see GridBot.regrid)."""
+        entry = self._bots.get(pair)
+        if not entry or entry['state'] != 'running':
+            raise ValueError(f"No bot is running for {pair}.")
+        self._loop.call_soon_threadsafe(entry['fills'].put_nowait, {'regrid': params})
+
+    def bot(self, pair):
+        """The GridBot trading `pair`, or None."""
+        entry = self._bots.get(pair)
+        return entry['bot'] if entry else None
+
+    def state(self, pair):
+        """Lifecycle state of the bot for `pair` ('starting', 'running', 'stopping', 'stopped' or 'error'), or None."""
+        entry = self._bots.get(pair)
+        return entry['state'] if entry else None
+
+    def status(self):
+        """Returns {pair: status dict} for every bot."""
+        status = {}
+        for pair, entry in list(self._bots.items()):
+            ledger = entry['bot'].ledger
+            position = ledger.snapshot() if ledger else {}
+            status[pair] = {
+                'state': entry['state'],
+                'total_pnl': entry['bot'].total_pnl,
+                'unrealized_pnl': position.get('unrealized_pnl', 0.0),
+                'inventory': position.get('inventory', 0.0),
+                'max_drawdown': position.get('max_drawdown', 0.0),
+                'fills': entry['fill_count'],
+                'orders_placed': entry['bot'].orders_placed,
+                'last_price': self.prices.get(pair),
+            }
+        return status
+
+    def shutdown(self, timeout=30, detach=False):
+        """Stops every bot (detaching them if asked, see stop_bot), the shared stream and the event loop."""
+        futures = [asyncio.run_coroutine_threadsafe(self._stop(e, detach), self._loop) for e in self._bots.values()]
+        for future in futures:
+            future.result(timeout)
+        if self.user_stream:
+            self.user_stream.stop()
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop)
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+
+    # --- Event loop side ---
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _call(self, fn, *args):
+        self._loop.call_soon_threadsafe(fn, *args)
+
+    async def _io(self, fn, *args):
+        return await self._loop.run_in_executor(self._executor, fn, *args)
+
+    def _start_background_tasks(self):
+        self._background = [
+            self._loop.create_task(self._price_feed()),
+            self._loop.create_task(self._poll_fallback()),
+        ]
+
+    async def _close(self):
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        self._loop.stop()
+
+    def _launch(self, entry):
+        entry['fills'] = asyncio.Queue()
+        entry['task'] = self._loop.create_task(self._run_bot(entry))
+
+    async def _run_bot(self, entry):
+        bot = entry['bot']
+        pair = bot.params['pair']
+        try:
+            bot.log("Initializing bot...")
+            missed_fills = await self._io(bot.restore_grid)
+            if missed_fills is None:
+                await self._io(bot.cancel_all_orders)
+                if pair not in self.prices:
+                    await self._refresh_prices()
+                await self._io(bot.setup_grid, self.prices.get(pair))
+            else:
+                for order in missed_fills:
+                    entry['fills'].put_nowait(order)
+            entry['state'] = 'running'
+            while True:
+                order = await entry['fills'].get()
+                if order is None:
+                    break
+                if 'regrid' in order:
+                    try:
+                        with metrics.time(STAGE_LATENCY, 'regrid'):
+                            await self._io(bot.regrid, order['regrid'], order.get('price'))
+                    except (BinanceAPIException, ValueError) as e:
+                        bot.log(f"Re-grid failed: {e}")
+                    entry['regrid_pending'] = False
+                    continue
+                if 'catch_up' in order:
+                    for missed in await self._io(bot.check_filled_orders):
+                        entry['fills'].put_nowait(missed)
+                    entry['catch_up_pending'] = False
+                    continue
+                entry['fill_count'] += 1
+                await self._io(bot.handle_filled_order, order)
+            entry['state'] = 'stopping'
+        except Exception as e:
+            bot.log(f"An error occurred in the bot task: {e}")
+            entry['state'] = 'error'
+        finally:
+            bot.log("Bot loop finished. Cleaning up...")
+            await self._io(bot.release_grid, entry['state'] == 'error' or entry.get('detach', False))
+            if entry['state'] != 'error':
+                entry['state'] = 'stopped'
+
+    async def _stop(self, entry, detach=False):
+        if entry['task'] is None or entry['task'].done():
+            return
+        entry['state'] = 'stopping'
+        entry['detach'] = detach
+        entry['fills'].put_nowait(None)
+        await entry['task']
+
+    async def _price_feed(self):
+        """One request refreshes prices for every bot."""
+        while True:
+            try:
+                await self._refresh_prices()
+            except Exception as e:
+                self.log(f"Price feed error: {e}")
+            await asyncio.sleep(self.PRICE_INTERVAL)
+
+    async def _refresh_prices(self):
+        tickers = await self._io(self._fetch_prices)
+        self.prices = {t['symbol']: float(t['price']) for t in tickers}
+        # Trailing grids are re-centred from the shared feed instead of polling on their own
+        for pair, entry in list(self._bots.items()):
+            price = self.prices.get(pair)
+            if entry['state'] == 'running' and price is not None:
+                if entry['bot'].ledger:
+                    entry['bot'].ledger.mark(price)
+                params = entry['bot'].trailing_params(price)
+                if params is not None and not entry.get('regrid_pending'):
+                    entry['bot'].log(f"Price {price} left the grid range. Re-centring the grid.")
+                    entry['regrid_pending'] = True
+                    entry['fills'].put_nowait({'regrid': params, 'price': price})
+
+    def _fetch_prices(self):
+        rate_limiter.acquire(weight=4)
+        return self.client.get_symbol_ticker()
+
+    async def _poll_fallback(self):
+        """REST fill checks for all bots, only while the shared stream is down."""
+        while True:
+            intervals = [e['bot'].reconciler.next_interval() for e in list(self._bots.values())
+                         if e['state'] == 'running' and e['bot'].reconciler]
+            await asyncio.sleep(min(intervals, default=OrderReconciler.MAX_INTERVAL))
+            if self.user_stream and not self.user_stream.connected.is_set():
+                await self._catch_up()
+
+    async def _catch_up(self):
+        """
+        Queues a REST check for missed fills on every running bot. Each runs in the bot's
+        own task, between its fills and re-grids, since they share its book and reconciler.
+        """
+        for entry in list(self._bots.values()):
+            if entry['state'] == 'running' and not entry.get('catch_up_pending'):
+                entry['catch_up_pending'] = True
+                entry['fills'].put_nowait({'catch_up': True})
+
+    def _on_stream_fill(self, order):
+        """Called from the stream thread; routes the fill to the bot trading its symbol."""
+        entry = self._bots.get(order['symbol'])
+        if entry and entry['fills'] is not None:
+            self._loop.call_soon_threadsafe(entry['fills'].put_nowait, order)
+
+    def _on_stream_connect(self, reconnected):
+        if reconnected:
+            self.log("User-data stream reconnected. Checking all bots for missed fills...")
+            asyncio.run_coroutine_threadsafe(self._catch_up(), self._loop)
+
+
+class UserDataStream(threading.Thread):
+    """
+    Listens to the Binance user-data WebSocket stream and reports filled orders.
+
+    Fills are delivered to `on_fill` as soon as the executionReport arrives, in the same
+    shape as the REST order objects. The listen key is kept alive in the background and
+    the connection is re-established with backoff whenever it drops; `on_connect` is
+    called with reconnected=True after each reconnect so the owner can catch up over REST.
+    """
+    MAINNET_URL = "wss://stream.binance.com:9443/ws/"
+    TESTNET_URL = "wss://testnet.binance.vision/ws/"
+    KEEPALIVE_INTERVAL = 30 * 60  # Listen keys expire after 60 minutes without a keepalive
+    MAX_BACKOFF = 30
+
+    def __init__(self, client, on_fill, on_connect=None, log=None, stream_url=None):
+        super().__init__(daemon=True)
+        self.client = client
+        self.on_fill = on_fill
+        self.on_connect = on_connect
+        self.log = log or logging.info
+        if stream_url is None:
+            stream_url = self.TESTNET_URL if getattr(client, 'testnet', False) else self.MAINNET_URL
+        self.stream_url = stream_url
+        self.connected = threading.Event()
+        self._stopped = threading.Event()
+        self._loop = None
+        self._stop_event = None
+        self._listen_key = None
+        # Commissions of partially filled orders; 'n' in each report covers only that trade
+        self._commissions = {}
+
+    def wait_connected(self, timeout=None):
+        return self.connected.wait(timeout)
+
+    def stop(self):
+        """Closes the stream and waits for the thread to exit."""
+        self._stopped.set()
+        if self._loop and self._stop_event:
+            try:
+                self._loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                pass  # Loop already closed
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout=5)
+
+    def run(self):
+        asyncio.run(self._run())
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        if self._stopped.is_set():
+            return
+
+        backoff = 1
+        has_connected = False
+        while not self._stop_event.is_set():
+            try:
+                self._listen_key = await asyncio.to_thread(self.client.stream_get_listen_key)
+                async with websockets.connect(self.stream_url + self._listen_key, ping_interval=20) as ws:
+                    self.connected.set()
+                    backoff = 1
+                    if self.on_connect:
+                        # Run the catch-up in a worker so events keep flowing meanwhile
+                        self._loop.run_in_executor(None, self.on_connect, has_connected)
+                    has_connected = True
+                    await self._consume(ws)
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    self.log(f"User-data stream error: {e}")
+            finally:
+                self.connected.clear()
+
+            if self._stop_event.is_set():
+                break
+            self.log(f"User-data stream disconnected. Reconnecting in {backoff}s...")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+        if self._listen_key:
+            try:
+                await asyncio.to_thread(self.client.stream_close, listenKey=self._listen_key)
+            except Exception:
+                pass  # The key expires on its own
+
+    async def _consume(self, ws):
+        """Reads events until the socket closes, the key expires or stop() is called."""
+        receiver = asyncio.ensure_future(self._receive(ws))
+        keepalive = asyncio.ensure_future(self._keepalive())
+        stopper = asyncio.ensure_future(self._stop_event.wait())
+        try:
+            done, _ = await asyncio.wait({receiver, keepalive, stopper}, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not stopper and task.exception():
+                    raise task.exception()
+        finally:
+            for task in (receiver, keepalive, stopper):
+                task.cancel()
+
+    async def _receive(self, ws):
+        async for raw in ws:
+            event = json.loads(raw)
+            if event.get('e') == 'executionReport' and event.get('X') == 'PARTIALLY_FILLED':
+                self._commissions[event['i']] = self._commissions.get(event['i'], 0.0) + float(event.get('n') or 0)
+            elif event.get('e') == 'executionReport' and event.get('X') == 'FILLED':
+                order = self.execution_report_to_order(event)
+                earlier = self._commissions.pop(event['i'], 0.0)
+                if earlier:
+                    order['commission'] = str(earlier + float(event.get('n') or 0))
+                order['receivedAt'] = time.time()
+                self.on_fill(order)
+            elif event.get('e') == 'executionReport' and event.get('X') in ('CANCELED', 'EXPIRED', 'REJECTED'):
+                self._commissions.pop(event['i'], None)
+            elif event.get('e') == 'listenKeyExpired':
+                self.log("User-data listen key expired. Requesting a new one...")
+                return
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(self.KEEPALIVE_INTERVAL)
+            await asyncio.to_thread(self.client.stream_keepalive, listenKey=self._listen_key)
+
+    @staticmethod
+    def execution_report_to_order(event):
+        """Converts an executionReport event into a REST-style order dict."""
+        return {
+            'symbol': event['s'],
+            'orderId': event['i'],
+            'clientOrderId': event.get('c'),
+            'side': event['S'],
+            'type': event.get('o'),
+            'status': event['X'],
+            'price': event['p'],
+            'origQty': event.get('q'),
+            'executedQty': event['z'],
+            'cummulativeQuoteQty': event.get('Z'),
+            'lastExecutedPrice': event.get('L'),
+            'commission': event.get('n'),
+            'commissionAsset': event.get('N'),
+            'tradeId': event.get('t'),
+            'updateTime': event.get('T'),
+            'eventTime': event.get('E'),
+        }
+
+
+class MarketScanner(threading.Thread):
+    """
+    Keeps live statistics for every symbol from the all-market mini-ticker stream.
+
+    Each `!miniTicker@arr` message updates preallocated per-symbol arrays in one vectorized
+    step: last price, 24h quote volume, 24h range and an EWMA of tick-to-tick log returns
+    (short-term volatility). `top()` ranks the eligible symbols straight from memory.
+    Messages can be recorded to a JSON-lines file and replayed later instead of
+    connecting, for offline runs.
+    """
+    MAINNET_URL = "wss://stream.binance.com:9443/ws/!miniTicker@arr"
+    TESTNET_URL = "wss://testnet.binance.vision/ws/!miniTicker@arr"
+    MAX_BACKOFF = 30
+    INITIAL_CAPACITY = 4096
+    VOLATILITY_ALPHA = 0.05  # EWMA weight of each new squared log return
+    STALE_AFTER = 10  # Seconds without a message before the scanner counts as cold
+    METRICS = ('quote_volume', 'range_pct', 'volatility')
+
+    def __init__(self, testnet=False, quote_asset='USDT', universe=None, log=None, stream_url=None,
+                 record_path=None, replay_path=None, replay_speed=None, capacity=INITIAL_CAPACITY):
+        super().__init__(daemon=True)
+        self.testnet = testnet
+        self.quote_asset = quote_asset
+        self.log = log or logging.info
+        self.stream_url = stream_url or (self.TESTNET_URL if testnet else self.MAINNET_URL)
+        self.record_path = record_path
+        self.replay_path = replay_path
+        self.replay_speed = replay_speed
+        self.connected = threading.Event()
+        self.messages = 0
+        self.last_message_at = None
+        self._universe = set(universe) if universe is not None else None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._loop = None
+        self._stop_event = None
+        self._record_file = None
+
+        self._index = {}
+        self._symbols = []
+        self.price = np.zeros(capacity)
+        self.high = np.zeros(capacity)
+        self.low = np.zeros(capacity)
+        self.quote_volume = np.zeros(capacity)
+        self.variance = np.zeros(capacity)
+        self.event_time = np.zeros(capacity, dtype=np.int64)
+        self.eligible = np.zeros(capacity, dtype=bool)
+
+    # --- Queries ---
+
+    def is_warm(self, max_age=STALE_AFTER):
+        """True once the scanner has fresh data for the market."""
+        return self.last_message_at is not None and time.monotonic() - self.last_message_at <= max_age
+
+    def top(self, n=10, by='quote_volume'):
+        """Returns up to n eligible symbols ranked by a metric, highest first."""
+        if by not in self.METRICS:
+            raise ValueError(f"Unknown metric {by!r}; expected one of {self.METRICS}")
+        with self._lock:
+            count = len(self._symbols)
+            eligible = np.flatnonzero(self.eligible[:count])
+            if not len(eligible) or n <= 0:
+                return []
+            values = self._metric(by, eligible)
+            k = min(n, len(values))
+            best = np.argpartition(-values, k - 1)[:k]
+            best = best[np.argsort(-values[best], kind='stable')]
+            return [self._symbols[i] for i in eligible[best]]
+
+    def stats(self, symbol):
+        """Returns the current statistics for one symbol, or None if it has not been seen."""
+        with self._lock:
+            i = self._index.get(symbol)
+            if i is None:
+                return None
+            rows = np.array([i])
+            return {
+                'symbol': symbol,
+                'price': float(self.price[i]),
+                'quote_volume': float(self.quote_volume[i]),
+                'range_pct': float(self._metric('range_pct', rows)[0]),
+                'volatility': float(self._metric('volatility', rows)[0]),
+                'event_time': int(self.event_time[i]),
+            }
+
+    def _metric(self, by, rows):
+        if by == 'quote_volume':
+            return self.quote_volume[rows]
+        if by == 'range_pct':
+            price = self.price[rows]
+            spread = self.high[rows] - self.low[rows]
+            return np.divide(spread * 100, price, out=np.zeros_like(price), where=price > 0)
+        return np.sqrt(self.variance[rows]) * 100
+
+    def set_universe(self, symbols):
+        """Restricts ranking to `symbols` (None allows every symbol quoted in quote_asset)."""
+        with self._lock:
+            self._universe = set(symbols) if symbols is not None else None
+            for symbol, i in self._index.items():
+                self.eligible[i] = self._is_eligible(symbol)
+
+    def _is_eligible(self, symbol):
+        if self._universe is not None:
+            return symbol in self._universe
+        return symbol.endswith(self.quote_asset)
+
+    # --- Updates ---
+
+    def process(self, tickers):
+        """Applies one `!miniTicker@arr` payload (a list of mini-ticker events)."""
+        if not tickers:
+            return
+        with self._lock:
+            rows = np.fromiter((self._row(t['s']) for t in tickers), dtype=np.int64, count=len(tickers))
+            close = np.array([t['c'] for t in tickers], dtype=float)
+            previous = self.price[rows]
+            seen = previous > 0
+            valid = seen & (close > 0)
+            ratio = np.divide(close, previous, out=np.ones(len(rows)), where=valid)
+            returns = np.log(ratio, out=np.zeros(len(rows)), where=valid)
+            alpha = self.VOLATILITY_ALPHA
+            self.variance[rows] = np.where(seen, (1 - alpha) * self.variance[rows] + alpha * returns ** 2, 0.0)
+            self.price[rows] = close
+            self.high[rows] = np.array([t['h'] for t in tickers], dtype=float)
+            self.low[rows] = np.array([t['l'] for t in tickers], dtype=float)
+            self.quote_volume[rows] = np.array([t['q'] for t in tickers], dtype=float)
+            self.event_time[rows] = np.array([t['E'] for t in tickers], dtype=np.int64)
+        self.messages += 1
+        self.last_message_at = time.monotonic()
+
+    def _row(self, symbol):
+        """Index of a symbol's row, appending (and growing the arrays) for new symbols."""
+        i = self._index.get(symbol)
+        if i is None:
+            i = len(self._symbols)
+            if i == len(self.price):
+                self._grow()
+            self._index[symbol] = i
+            self._symbols.append(symbol)
+            self.eligible[i] = self._is_eligible(symbol)
+        return i
+
+    def _grow(self):
+        for name in ('price', 'high', 'low', 'quote_volume', 'variance', 'event_time', 'eligible'):
+            old = getattr(self, name)
+            grown = np.zeros(len(old) * 2, dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    # --- Stream / replay ---
+
+    def stop(self):
+        """Closes the stream (or ends the replay) and waits for the thread to exit."""
+        self._stopped.set()
+        if self._loop and self._stop_event:
+            try:
+                self._loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                pass  # Loop already closed
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout=5)
+
+    def run(self):
+        if self.replay_path:
+            self.replay(self.replay_path, speed=self.replay_speed)
+            return
+        if self.record_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.record_path)), exist_ok=True)
+            self._record_file = open(self.record_path, 'a', encoding='utf-8')
+        try:
+            asyncio.run(self._run())
+        finally:
+            if self._record_file:
+                self._record_file.close()
+
+    def replay(self, path, speed=None):
+        """
+        Feeds recorded messages through `process`. With a speed the original spacing is
+        kept (speed=2 plays twice as fast); without one the file is applied as fast as possible.
+        """
+        previous_ts = None
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if self._stopped.is_set():
+                    break
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if speed and previous_ts is not None:
+                    self._stopped.wait(max(0.0, (record['ts'] - previous_ts) / speed))
+                previous_ts = record['ts']
+                self.process(record['data'])
+        self.log(f"Market scanner replayed {self.messages} messages from {path}.")
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        if self._stopped.is_set():
+            return
+
+        backoff = 1
+        while not self._stop_event.is_set():
+            try:
+                async with websockets.connect(self.stream_url, ping_interval=20, max_size=None) as ws:
+                    self.connected.set()
+                    backoff = 1
+                    receiver = asyncio.ensure_future(self._receive(ws))
+                    stopper = asyncio.ensure_future(self._stop_event.wait())
+                    try:
+                        done, _ = await asyncio.wait({receiver, stopper}, return_when=asyncio.FIRST_COMPLETED)
+                        if receiver in done and receiver.exception():
+                            raise receiver.exception()
+                    finally:
+                        receiver.cancel()
+                        stopper.cancel()
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    self.log(f"Market scanner stream error: {e}")
+            finally:
+                self.connected.clear()
+
+            if self._stop_event.is_set():
+                break
+            self.log(f"Market scanner disconnected. Reconnecting in {backoff}s...")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+    async def _receive(self, ws):
+        async for raw in ws:
+            if self._record_file:
+                self._record_file.write(f'{{"ts":{time.time():.3f},"data":{raw}}}\n')
+            self.process(json.loads(raw))
+
+
+class RateLimiter:
+    """
+    Token buckets that keep us under Binance's request-weight and order-count limits.
+
+    Callers `acquire()` the weight and order count a request costs before sending it;
+    the call blocks until enough budget has refilled. After each response the
+    X-MBX-USED-WEIGHT / X-MBX-ORDER-COUNT headers are fed back through
+    `update_from_response()` so usage from other processes on the same account (or
+    our own estimate drifting) is accounted for. `penalize()` pauses everything after
+    a 429/418 until the server's Retry-After has passed.
+    """
+    WEIGHT_PER_MINUTE = 6000
+    ORDERS_PER_10S = 100
+    # Only use part of the published limits to leave headroom for other clients
+    SAFETY = 0.8
+
+    def __init__(self, weight_per_minute=WEIGHT_PER_MINUTE, orders_per_10s=ORDERS_PER_10S, safety=SAFETY):
+        self.weight_capacity = weight_per_minute * safety
+        self.order_capacity = orders_per_10s * safety
+        self.weight_rate = self.weight_capacity / 60.0
+        self.order_rate = self.order_capacity / 10.0
+        self.weight_tokens = self.weight_capacity
+        self.order_tokens = self.order_capacity
+        self.blocked_until = 0.0
+        self.used_weight = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, weight=1, orders=0):
+        """Blocks until `weight` request weight and `orders` order slots are available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.weight_tokens >= weight and self.order_tokens >= orders:
+                        self.weight_tokens -= weight
+                        self.order_tokens -= orders
+                        return
+                    wait = max(
+                        (weight - self.weight_tokens) / self.weight_rate,
+                        (orders - self.order_tokens) / self.order_rate
+                    )
+            time.sleep(min(max(wait, 0.001), 1.0))
+
+    def remaining_fraction(self):
+        """Share of the weight budget currently available, from 0.0 to 1.0."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(self.weight_tokens, 0.0) / self.weight_capacity
+
+    def update_from_response(self, response):
+        """Syncs the buckets with the usage headers of a python-binance/requests response."""
+        headers = getattr(response, 'headers', None)
+        if not headers:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            used_weight = headers.get('x-mbx-used-weight-1m')
+            if used_weight is not None:
+                self.used_weight = int(used_weight)
+                self.weight_tokens = min(self.weight_tokens, self.weight_capacity - self.used_weight)
+            used_orders = headers.get('x-mbx-order-count-10s')
+            if used_orders is not None:
+                self.order_tokens = min(self.order_tokens, self.order_capacity - int(used_orders))
+
+    def penalize(self, retry_after):
+        """Stops all requests for `retry_after` seconds (after a 429 or 418 response)."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self.weight_tokens = min(self.weight_capacity, self.weight_tokens + elapsed * self.weight_rate)
+        self.order_tokens = min(self.order_capacity, self.order_tokens + elapsed * self.order_rate)
+
+
+def retry_delay(error, attempt, base=0.5, cap=30):
+    """
+    Seconds to wait before retrying a request that failed with `error`, or None if it
+    should not be retried. Throttling and ban responses also pause the shared limiter.
+    """
+    status = getattr(error, 'status_code', None)
+    code = getattr(error, 'code', None)
+    if status in (429, 418) or code in (-1003, -1015):
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None) or {}
+        retry_after = float(headers.get('Retry-After', base * 2 ** attempt))
+        rate_limiter.penalize(retry_after)
+        return retry_after
+    # Server-side errors and network failures (requests exceptions are OSErrors)
+    if isinstance(error, (BinanceRequestException, OSError)) or (status or 0) >= 500:
+        return min(base * 2 ** attempt, cap)
+    return None
+
+
+class OrderPlacementScheduler:
+    """
+    Places a ladder of limit orders concurrently on a bounded worker pool.
+
+    `submit(order, client_order_id)` sends one ladder entry (a dict with at least side,
+    qty and price) and raises on failure.
+
+    Orders are submitted nearest-to-price first, every request goes through the shared
+    RateLimiter, and throttled or transiently failed placements are retried with the
+    same client order ID so a retry can never double an order. Each result records its
+    placement latency.
+    """
+    MAX_WORKERS = 8
+    MAX_RETRIES = 4
+
+    def __init__(self, submit, log=None, max_workers=MAX_WORKERS, max_retries=MAX_RETRIES, cancelled=None):
+        self.submit = submit
+        self.log = log or logging.info
+        self.cancelled = cancelled or (lambda: False)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+
+    def place_all(self, orders, current_price):
+        """
+        Places `orders` (dicts with side, qty and price) and returns one result per order,
+        in placement-priority order, with the exchange response (or None) and latency.
+        """
+        ordered = sorted(orders, key=lambda o: abs(o['price'] - current_price))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._place, order, start) for order in ordered]
+            return [future.result() for future in futures]
+
+    def _place(self, order, batch_start):
+        client_order_id = f"grid-{uuid.uuid4().hex[:20]}"
+        attempt = 0
+        while True:
+            attempt_start = time.perf_counter()
+            if self.cancelled():
+                # The owner is shutting down; leave the rest of the ladder unplaced
+                response, error = None, RuntimeError("placement cancelled")
+                break
+            try:
+                response = self.submit(order, client_order_id=client_order_id)
+                error = None
+            except Exception as e:
+                response, error = None, e
+
+            if error is None or attempt >= self.max_retries:
+                break
+            delay = retry_delay(error, attempt)
+            if delay is None:
+                break
+            attempt += 1
+            self.log(f"Placement of {order['side']} @ {order['price']:.8f} throttled or failed ({error}). Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+        now = time.perf_counter()
+        if error is not None and not self.cancelled():
+            self.log(f"Failed to place {order['side']} order at {order['price']:.8f}: {error}")
+            if getattr(error, 'code', None) in SymbolMetadataCache.FILTER_ERROR_CODES:
+                symbol_cache.invalidate()
+        return dict(
+            order,
+            response=response,
+            error=str(error) if error else None,
+            attempts=attempt + 1,
+            latency=now - attempt_start,
+            completed_after=now - batch_start
+        )
+
+    @staticmethod
+    def summarize(results):
+        """One-line summary of how long the ladder took to build."""
+        latencies = sorted(r['latency'] for r in results if r['response'] is not None)
+        if not latencies:
+            return "No orders were placed."
+        total = max(r['completed_after'] for r in results)
+        p50 = latencies[len(latencies) // 2]
+        return (f"Grid built in {total * 1000:.0f} ms: {len(latencies)}/{len(results)} orders placed, "
+                f"placement latency p50 {p50 * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms.")
+
+
+# Shared request budget for every component talking to the exchange
+rate_limiter = RateLimiter()
+
+
+class KlineFetcher:
+    """
+    Downloads klines for many symbols concurrently.
+
+    Pages through /klines directly (1000 candles per request) on a thread pool. Every
+    request draws from the shared RateLimiter, so the pool slows down on its own as
+    the weight budget runs low instead of sleeping a fixed time, and 429/418 responses
+    back off for the server's Retry-After. Has no GUI dependencies, so it works from
+    the analysis thread and from headless callers alike.
+    """
+    MAX_WORKERS = 8
+    MAX_RETRIES = 5
+    PAGE_LIMIT = 1000
+    REQUEST_WEIGHT = 2
+
+    def __init__(self, client, max_workers=MAX_WORKERS, max_retries=MAX_RETRIES, log=None):
+        self.client = client
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.log = log or logging.info
+
+    def fetch_many(self, symbols, interval, start_ms, end_ms=None, on_result=None):
+        """
+        Fetches klines for every symbol. Returns {symbol: klines}, where a symbol that
+        could not be fetched maps to the exception instead. `on_result(symbol, result)`
+        is called as each symbol completes.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.fetch, symbol, interval, start_ms, end_ms): symbol for symbol in symbols}
+            for future, symbol in futures.items():
+                try:
+                    results[symbol] = future.result()
+                except Exception as e:
+                    results[symbol] = e
+                if on_result:
+                    on_result(symbol, results[symbol])
+        return results
+
+    def fetch(self, symbol, interval, start_ms, end_ms=None):
+        """Fetches all klines of one symbol between start_ms and end_ms (default: now)."""
+        step = interval_to_milliseconds(interval)
+        klines = []
+        while True:
+            params = dict(symbol=symbol, interval=interval, startTime=start_ms, limit=self.PAGE_LIMIT)
+            if end_ms is not None:
+                params['endTime'] = end_ms
+            page = self._request(params)
+            klines.extend(page)
+            if len(page) < self.PAGE_LIMIT:
+                return klines
+            start_ms = page[-1][0] + step
+            if end_ms is not None and start_ms > end_ms:
+                return klines
+
+    def _request(self, params):
+        attempt = 0
+        while True:
+            rate_limiter.acquire(weight=self.REQUEST_WEIGHT)
+            try:
+                return self.client.get_klines(**params)
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.log(f"Kline request for {params['symbol']} throttled or failed ({e}). Retrying in {delay:.1f}s...")
+                time.sleep(delay)
+            finally:
+                rate_limiter.update_from_response(getattr(self.client, 'response', None))
+
+
+# One record per candle in the on-disk store
+CANDLE_FIELDS = (
+    ('open_time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+    ('quote_volume', '<f8'),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def candle_dtype():
+    """Record dtype of one candle in the on-disk store (CANDLE_DTYPE)."""
+    return np.dtype(list(CANDLE_FIELDS))
+
+
+class CandleStore:
+    """
+    Local, incremental store of closed klines.
+
+    Each (symbol, interval) series lives in its own flat binary file of CANDLE_DTYPE
+    records, read back as a memory-mapped NumPy array. `sync()` only downloads candles
+    newer than the last stored one, plus any holes inside the stored range; new data is
+    appended in place. Higher timeframes are built from the base interval (1m by
+    default) with `resample()` once the base series reaches back far enough; until then
+    they are downloaded and stored at their own interval, so a cold scan of 30 days of
+    4h candles costs one request per symbol instead of a month of 1m pages. The base
+    series is only filled when it is asked for. Either way, once a symbol is stored a
+    repeat scan costs one small request per symbol.
+    """
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".crypto_trader", "candles")
+    BASE_INTERVAL = '1m'
+
+    def __init__(self, path=DEFAULT_PATH, base_interval=BASE_INTERVAL):
+        self.path = path
+        self.base_interval = base_interval
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def candles(self, fetcher, symbol, interval, start_ms):
+        """Syncs `symbol` and returns its candles since start_ms at `interval`."""
+        if interval != self.base_interval and not self.covers(symbol, self.base_interval, start_ms):
+            self.sync(fetcher, symbol, interval, start_ms)
+            candles = self.load(symbol, interval, mmap=False)
+            return candles[candles['open_time'] >= start_ms]
+        self.sync(fetcher, symbol, self.base_interval, start_ms)
+        base = self.load(symbol, self.base_interval, mmap=False)
+        base = base[base['open_time'] >= start_ms]
+        if interval == self.base_interval:
+            return base
+        return self.resample(base, interval_to_milliseconds(interval))
+
+    def covers(self, symbol, interval, start_ms):
+        """Whether the stored series of `interval` already reaches back to start_ms."""
+        step = interval_to_milliseconds(interval)
+        with self._lock(symbol, interval):
+            stored = self.load(symbol, interval)
+            return len(stored) > 0 and int(stored['open_time'][0]) <= -(-start_ms // step) * step
+
+    def candles_many(self, fetcher, symbols, interval, start_ms):
+        """Like candles() for many symbols at once. Failed symbols map to the exception."""
+        def load_one(symbol):
+            try:
+                return self.candles(fetcher, symbol, interval, start_ms)
+            except Exception as e:
+                return e
+        with ThreadPoolExecutor(max_workers=fetcher.max_workers) as pool:
+            return dict(zip(symbols, pool.map(load_one, symbols)))
+
+    def load(self, symbol, interval, mmap=True):
+        """Returns the stored candles of a series (empty if there are none)."""
+        path = self._file(symbol, interval)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=candle_dtype())
+        if mmap:
+            return np.memmap(path, dtype=candle_dtype(), mode='r')
+        return np.fromfile(path, dtype=candle_dtype())
+
+    def sync(self, fetcher, symbol, interval, start_ms):
+        """
+        Brings the stored series up to date from start_ms to the last closed candle.
+        Returns the number of candles added.
+        """
+        step = interval_to_milliseconds(interval)
+        with self._lock(symbol, interval):
+            stored = self.load(symbol, interval, mmap=False)
+            known_holes = self._load_holes(symbol, interval)
+            added = []
+            # Only closed candles are stored, so they never need to be rewritten
+            end_ms = (int(time.time() * 1000) // step) * step - 1
+
+            if len(stored) == 0:
+                added.append(self.to_records(fetcher.fetch(symbol, interval, start_ms, end_ms)))
+                self._write(symbol, interval, added[0], append=False)
+                return len(added[0])
+
+            # Missing ranges: before the first stored candle, holes inside, and after the last
+            ranges = []
+            first_wanted = -(-start_ms // step) * step
+            first_stored = int(stored['open_time'][0])
+            if first_wanted < first_stored and not self._is_known_hole(known_holes, first_wanted):
+                ranges.append((first_wanted, first_stored - 1))
+            gaps = np.nonzero(np.diff(stored['open_time']) > step)[0]
+            for i in gaps:
+                gap = (int(stored['open_time'][i]) + step, int(stored['open_time'][i + 1]) - 1)
+                if not self._is_known_hole(known_holes, gap[0]):
+                    ranges.append(gap)
+
+            inserted = 0
+            for gap_start, gap_end in ranges:
+                records = self.to_records(fetcher.fetch(symbol, interval, gap_start, gap_end))
+                if len(records) == 0:
+                    # Nothing traded (e.g. exchange maintenance); remember so we don't ask again
+                    known_holes.append([gap_start, gap_end])
+                inserted += len(records)
+                added.append(records)
+
+            tail_start = int(stored['open_time'][-1]) + step
+            tail = np.empty(0, dtype=candle_dtype())
+            if tail_start <= end_ms:
+                tail = self.to_records(fetcher.fetch(symbol, interval, tail_start, end_ms))
+
+            if inserted:
+                merged = np.concatenate([stored] + added + [tail])
+                merged = merged[np.unique(merged['open_time'], return_index=True)[1]]
+                self._write(symbol, interval, merged, append=False)
+            elif len(tail):
+                self._write(symbol, interval, tail, append=True)
+            self._save_holes(symbol, interval, known_holes)
+            return inserted + len(tail)
+
+    @staticmethod
+    def to_records(klines):
+        """Converts REST kline rows into CANDLE_DTYPE records."""
+        records = np.empty(len(klines), dtype=candle_dtype())
+        if not klines:
+            return records
+        rows = np.array([k[:6] + [k[7]] for k in klines], dtype=np.float64)
+        records['open_time'] = rows[:, 0].astype(np.int64)
+        for column, name in enumerate(candle_dtype().names[1:], start=1):
+            records[name] = rows[:, column]
+        return records
+
+    @staticmethod
+    def resample(candles, interval_ms):
+        """Aggregates candles into UTC-aligned buckets of interval_ms."""
+        if len(candles) == 0:
+            return np.empty(0, dtype=candle_dtype())
+        buckets = (candles['open_time'] // interval_ms) * interval_ms
+        starts = np.nonzero(np.r_[True, buckets[1:] != buckets[:-1]])[0]
+        ends = np.r_[starts[1:], len(candles)] - 1
+        out = np.empty(len(starts), dtype=candle_dtype())
+        out['open_time'] = buckets[starts]
+        out['open'] = candles['open'][starts]
+        out['high'] = np.maximum.reduceat(candles['high'], starts)
+        out['low'] = np.minimum.reduceat(candles['low'], starts)
+        out['close'] = candles['close'][ends]
+        out['volume'] = np.add.reduceat(candles['volume'], starts)
+        out['quote_volume'] = np.add.reduceat(candles['quote_volume'], starts)
+        return out
+
+    def _file(self, symbol, interval):
+        return os.path.join(self.path, symbol, f"{interval}.bin")
+
+    def _write(self, symbol, interval, records, append):
+        path = self._file(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if append:
+            with open(path, 'ab') as f:
+                f.write(np.ascontiguousarray(records).tobytes())
+        else:
+            # Write-then-rename so a crash never leaves a half-written series behind
+            tmp = path + ".tmp"
+            np.ascontiguousarray(records).tofile(tmp)
+            os.replace(tmp, path)
+
+    def _load_holes(self, symbol, interval):
+        path = self._file(symbol, interval) + ".holes.json"
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_holes(self, symbol, interval, holes):
+        if holes:
+            with open(self._file(symbol, interval) + ".holes.json", 'w') as f:
+                json.dump(holes, f)
+
+    @staticmethod
+    def _is_known_hole(holes, start_ms):
+        return any(start <= start_ms <= end for start, end in holes)
+
+    def _lock(self, symbol, interval):
+        with self._locks_guard:
+            return self._locks.setdefault((symbol, interval), threading.Lock())
+
+
+# One row per symbol produced by IndicatorEngine.compute()
+RANGE_METRICS_FIELDS = (
+    ('pair', 'U20'),
+    ('current_price', '<f8'),
+    ('support', '<f8'),
+    ('resistance', '<f8'),
+    ('atr', '<f8'),
+    ('atr_percentage', '<f8'),
+    ('is_ranging', '?'),
+    ('band_crossings', '<i4'),
+    ('realized_volatility', '<f8'),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def range_metrics_dtype():
+    """Record dtype of IndicatorEngine results (RANGE_METRICS_DTYPE)."""
+    return np.dtype(list(RANGE_METRICS_FIELDS))
+
+
+class IndicatorEngine:
+    """
+    Computes range and volatility metrics for many symbols in one batched pass.
+
+    Candle series are stacked into (symbols x candles) arrays, right-aligned on the
+    latest candle and NaN-padded on the left, so every metric is a handful of array
+    operations over all symbols at once:
+
+    - support/resistance: lowest low / highest high of the window
+    - ATR / ATR%: EWM (span 14, like pandas adjust=False) of the true range
+    - is_ranging: price sits inside the middle 70% of the support-resistance range
+    - band_crossings: how often the close crossed the middle of that range
+    - realized_volatility: annualized standard deviation of close-to-close log returns
+    """
+    ATR_SPAN = 14
+    RANGING_MARGIN = 0.15
+    YEAR_MS = 365 * 24 * 60 * 60 * 1000
+
+    def __init__(self, atr_span=ATR_SPAN, ranging_margin=RANGING_MARGIN):
+        self.atr_span = atr_span
+        self.ranging_margin = ranging_margin
+
+    @staticmethod
+    def stack(candle_series, field):
+        """Stacks one field of several candle arrays into a right-aligned, NaN-padded matrix."""
+        length = max((len(c) for c in candle_series), default=0)
+        out = np.full((len(candle_series), length), np.nan)
+        for row, candles in enumerate(candle_series):
+            if len(candles):
+                out[row, length - len(candles):] = candles[field]
+        return out
+
+    def compute(self, symbols, candle_series, interval_ms):
+        """Returns a RANGE_METRICS_DTYPE array with one row per symbol."""
+        out = np.zeros(len(symbols), dtype=range_metrics_dtype())
+        if not len(symbols):
+            return out
+        highs = self.stack(candle_series, 'high')
+        lows = self.stack(candle_series, 'low')
+        closes = self.stack(candle_series, 'close')
+
+        current = closes[:, -1]
+        support = np.nanmin(lows, axis=1)
+        resistance = np.nanmax(highs, axis=1)
+
+        # True range; the first candle of each series has no previous close, and fmax
+        # ignores the NaN so it falls back to high - low just like pandas' max(axis=1)
+        prev_close = np.empty_like(closes)
+        prev_close[:, 0] = np.nan
+        prev_close[:, 1:] = closes[:, :-1]
+        true_range = np.fmax(highs - lows, np.fmax(np.abs(highs - prev_close), np.abs(lows - prev_close)))
+        atr = self._ewm(true_range, self.atr_span)
+
+        price_range = resistance - support
+        is_ranging = ((current > support + self.ranging_margin * price_range) &
+                      (current < resistance - self.ranging_margin * price_range))
+
+        # Sign changes of (close - mid) count crossings of the range's middle band
+        side = np.sign(closes - ((support + resistance) / 2)[:, None])
+        crossings = np.sum((side[:, 1:] * side[:, :-1]) < 0, axis=1)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = np.diff(np.log(closes), axis=1)
+        realized_vol = np.nanstd(returns, axis=1) * np.sqrt(self.YEAR_MS / interval_ms) * 100
+
+        out['pair'] = symbols
+        out['current_price'] = current
+        out['support'] = support
+        out['resistance'] = resistance
+        out['atr'] = atr
+        out['atr_percentage'] = atr / current * 100
+        out['is_ranging'] = is_ranging
+        out['band_crossings'] = crossings
+        out['realized_volatility'] = realized_vol
+        return out
+
+    @staticmethod
+    def _ewm(values, span):
+        """Row-wise EWM (adjust=False) of the last column, skipping leading NaN padding."""
+        alpha = 2.0 / (span + 1)
+        ewm = values[:, 0].copy()
+        for column in range(1, values.shape[1]):
+            x = values[:, column]
+            updated = ewm + alpha * (x - ewm)
+            ewm = np.where(np.isnan(ewm), x, np.where(np.isnan(x), ewm, updated))
+        return ewm
+
+
+class GridBacktester:
+    """
+    Replays historical prices through GridBot's fill and counter-order rules.
+
+    Levels, quantities and initial sides are set up the way GridBot.setup_grid does it:
+    the level nearest the start price stays empty, levels below it get a buy and levels
+    above it a sell. A filled buy re-lists one grid step higher and a filled sell one step
+    lower, as long as the new level is inside the grid.
+
+    Instead of simulating polling, each candle is turned into the path open -> low ->
+    high -> close (open -> high -> low -> close on down candles), and the level crossings
+    of the whole path are extracted with NumPy in one pass. Only those crossings are
+    walked in order, so a year of 1m candles replays in a few seconds.
+    """
+    DEFAULT_FEE_RATE = 0.001
+
+    def __init__(self, lower_bound, upper_bound, grids, investment, fee_rate=DEFAULT_FEE_RATE, step_size=0.0):
+        if lower_bound >= upper_bound or grids < 2:
+            raise ValueError("Invalid grid parameters.")
+        self.lower_bound = lower_bound
+        self.upper_bound = upper_bound
+        self.grids = grids
+        self.investment = investment
+        self.fee_rate = fee_rate
+        self.step_size = step_size
+        self.levels = np.linspace(lower_bound, upper_bound, grids)
+        self.grid_step = (upper_bound - lower_bound) / (grids - 1)
+
+    def run(self, candles):
+        """Backtests over a CANDLE_DTYPE array (e.g. from CandleStore). Returns a result dict."""
+        opens, highs, lows, closes = (np.asarray(candles[f], dtype=np.float64) for f in ('open', 'high', 'low', 'close'))
+        up = closes >= opens
+        path = np.empty((len(candles), 4))
+        path[:, 0] = opens
+        path[:, 1] = np.where(up, lows, highs)
+        path[:, 2] = np.where(up, highs, lows)
+        path[:, 3] = closes
+        bars = np.repeat(np.arange(len(candles)), 4)
+        return self._replay(path.ravel(), bars, closes)
+
+    def run_prices(self, prices):
+        """Backtests over a plain price series, such as trade prices. Returns a result dict."""
+        prices = np.asarray(prices, dtype=np.float64)
+        return self._replay(prices, np.arange(len(prices)), prices)
+
+    def initial_quantities(self):
+        """Per-level order quantity, floored to the lot step as GridLadder does."""
+        investment_per_grid = self.investment / (self.grids - 1)
+        qty = investment_per_grid / self.levels
+        if self.step_size:
+            qty = np.floor(qty / self.step_size) * self.step_size
+        return qty
+
+    def crossings(self, path):
+        """
+        Level crossings along a price path as (point, level, direction) arrays, in the
+        order they happen. Direction -1 means the level was reached from above (buys at it
+        fill), +1 from below (sells fill).
+        """
+        p1, p2 = path[:-1], path[1:]
+        down = p2 < p1
+        # Falling from p1 to p2 touches levels in [p2, p1); rising touches (p1, p2]
+        below_p1 = np.searchsorted(self.levels, p1, 'left')
+        below_p2 = np.searchsorted(self.levels, p2, 'left')
+        upto_p1 = np.searchsorted(self.levels, p1, 'right')
+        upto_p2 = np.searchsorted(self.levels, p2, 'right')
+        first = np.where(down, below_p1 - 1, upto_p1)
+        direction = np.where(down, -1, 1)
+        counts = np.where(down, below_p1 - below_p2, np.maximum(upto_p2 - upto_p1, 0))
+
+        segments = np.nonzero(counts)[0]
+        counts = counts[segments]
+        total = int(counts.sum())
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        seg = np.repeat(segments, counts)
+        levels = first[seg] + direction[seg] * offsets
+        return seg + 1, levels, direction[seg]
+
+    def _replay(self, path, bars, bar_closes):
+        levels = self.levels.tolist()
+        n = self.grids
+        qty = self.initial_quantities()
+        start_price = path[0]
+
+        # Open order quantity per level; initial orders and counter-orders kept apart so
+        # that only counter-order fills count as completed round trips
+        buys, buy_counters = [0.0] * n, [0.0] * n
+        sells, sell_counters = [0.0] * n, [0.0] * n
+        # Like GridBot.setup_grid, the level nearest the start price stays empty
+        skipped = int(np.argmin(np.abs(self.levels - start_price)))
+        for k in range(n):
+            if k < skipped:
+                buys[k] = float(qty[k])
+            elif k > skipped:
+                sells[k] = float(qty[k])
+
+        # GridBot assumes the base asset for its initial sells is already held
+        inventory = float(sum(sells))
+        cash = self.investment - inventory * start_price
+        fees = 0.0
+        grid_profit = 0.0
+        round_trips = 0
+        fills = 0
+        fee_rate = self.fee_rate
+        step = self.grid_step
+        initial_cash, initial_inventory = cash, inventory
+
+        points, event_levels, directions = self.crossings(path)
+        event_bars = bars[points]
+        cash_after = np.empty(len(points))
+        inventory_after = np.empty(len(points))
+
+        for i, (k, d) in enumerate(zip(event_levels.tolist(), directions.tolist())):
+            price = levels[k]
+            if d < 0:
+                filled = buys[k] + buy_counters[k]
+                if filled:
+                    fills += 1
+                    if buy_counters[k]:
+                        round_trips += 1
+                        grid_profit += buy_counters[k] * step
+                    buys[k] = buy_counters[k] = 0.0
+                    cash -= filled * price
+                    inventory += filled
+                    fees += filled * price * fee_rate
+                    # Re-list one grid step higher
+                    if k + 1 < n:
+                        sell_counters[k + 1] += filled
+            else:
+                filled = sells[k] + sell_counters[k]
+                if filled:
+                    fills += 1
+                    if sell_counters[k]:
+                        round_trips += 1
+                        grid_profit += sell_counters[k] * step
+                    sells[k] = sell_counters[k] = 0.0
+                    cash += filled * price
+                    inventory -= filled
+                    fees += filled * price * fee_rate
+                    # Re-list one grid step lower
+                    if k > 0:
+                        buy_counters[k - 1] += filled
+            cash_after[i] = cash - fees
+            inventory_after[i] = inventory
+
+        # State at each bar close is the state after the last crossing up to that bar
+        last_event = np.searchsorted(event_bars, np.arange(len(bar_closes)), 'right') - 1
+        bar_cash = np.r_[initial_cash, cash_after][last_event + 1]
+        bar_inventory = np.r_[initial_inventory, inventory_after][last_event + 1]
+        equity = bar_cash + bar_inventory * bar_closes
+        peak = np.maximum.accumulate(np.r_[self.investment, equity])[1:]
+        drawdown = peak - equity
+
+        pnl = float(equity[-1] - self.investment) if len(equity) else 0.0
+        return {
+            'pnl': pnl,
+            'return_pct': pnl / self.investment * 100,
+            'grid_profit': grid_profit,
+            'fees': fees,
+            'round_trips': round_trips,
+            'fills': fills,
+            'final_inventory': inventory,
+            'max_drawdown': float(drawdown.max()) if len(drawdown) else 0.0,
+            'max_drawdown_pct': float((drawdown / peak).max() * 100) if len(drawdown) else 0.0,
+            'inventory': bar_inventory,
+            'equity': equity,
+        }
+
+
+class GridOptimizer:
+    """
+    Sweeps grid bounds and density over recent history for many symbols at once.
+
+    Every (symbol, lower, upper, grids) candidate is scored with GridBacktester on a
+    process pool using all CPU cores. The candle history is copied once into a shared
+    memory block that workers map directly, so only small parameter tuples are pickled
+    per task. Candidates are ranked by return with a drawdown penalty; the best
+    configuration per symbol is kept, symbols whose best score is not positive are
+    dropped, and the total investment is split across the top symbols in proportion to
+    their score.
+    """
+    DEFAULT_INVESTMENT = 1000.0
+    LOOKBACK_DAYS = 7
+    # Candidate bounds as quantiles of the close prices in the lookback window
+    LOWER_QUANTILES = (0.0, 0.05, 0.1, 0.2, 0.3)
+    UPPER_QUANTILES = (1.0, 0.95, 0.9, 0.8, 0.7)
+    GRID_COUNTS = (10, 15, 20, 30, 40, 50, 75, 100)
+    DRAWDOWN_PENALTY = 0.5
+    TOP_SYMBOLS = 3
+    CHUNK_SIZE = 32
+
+    def __init__(self, investment=DEFAULT_INVESTMENT, fee_rate=GridBacktester.DEFAULT_FEE_RATE, max_workers=None):
+        self.investment = investment
+        self.fee_rate = fee_rate
+        self.max_workers = max_workers or os.cpu_count()
+        self.last_run_size = 0
+
+    def candidates(self, candles):
+        """Bounds/density combinations to try for one symbol."""
+        closes = np.asarray(candles['close'])
+        lowers = np.quantile(closes, self.LOWER_QUANTILES)
+        uppers = np.quantile(closes, self.UPPER_QUANTILES)
+        return [
+            (float(lower), float(upper), grids)
+            for lower in lowers for upper in uppers if upper > lower
+            for grids in self.GRID_COUNTS
+        ]
+
+    def optimize(self, candles_by_symbol):
+        """Returns a ranked list of recommendations, best first, one per profitable symbol."""
+        symbols = [s for s, c in candles_by_symbol.items() if len(c)]
+        if not symbols:
             return []
 
+        # Lay every symbol's candles out back to back in one shared block
+        layout, offset = {}, 0
+        for symbol in symbols:
+            layout[symbol] = (offset, len(candles_by_symbol[symbol]))
+            offset += len(candles_by_symbol[symbol])
+        block = shared_memory.SharedMemory(create=True, size=max(offset * candle_dtype().itemsize, 1))
+        try:
+            shared = np.ndarray(offset, dtype=candle_dtype(), buffer=block.buf)
+            for symbol in symbols:
+                start, count = layout[symbol]
+                shared[start:start + count] = candles_by_symbol[symbol]
+            del shared
+
+            tasks = []
+            for symbol in symbols:
+                configs = self.candidates(candles_by_symbol[symbol])
+                for i in range(0, len(configs), self.CHUNK_SIZE):
+                    tasks.append((symbol, configs[i:i + self.CHUNK_SIZE]))
+            self.last_run_size = sum(len(configs) for _, configs in tasks)
+
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_attach_optimizer_candles,
+                                     initargs=(block.name, layout)) as pool:
+                futures = [pool.submit(_score_grid_configs, symbol, configs, self.investment, self.fee_rate)
+                           for symbol, configs in tasks]
+                scored = [row for future in futures for row in future.result()]
+        finally:
+            block.close()
+            block.unlink()
+
+        for row in scored:
+            row['score'] = row['return_pct'] - self.DRAWDOWN_PENALTY * row['max_drawdown_pct']
+        best = {}
+        for row in sorted(scored, key=lambda r: r['score'], reverse=True):
+            best.setdefault(row['symbol'], row)
+        ranked = sorted(best.values(), key=lambda r: r['score'], reverse=True)
+        return self.allocate(ranked)
+
+    def allocate(self, ranked):
+        """
+        Turns ranked rows into recommendations and splits the investment over the top ones.
+        Rows that do not score above 0 are dropped, so the table may be empty.
+        """
+        ranked = [r for r in ranked if r['score'] > 0]
+        top = ranked[:self.TOP_SYMBOLS]
+        total_score = sum(r['score'] for r in top)
+        table = []
+        for row in ranked:
+            share = row['score'] / total_score if row in top else 0.0
+            table.append({
+                'trading_pair': row['symbol'],
+                'lower_bound': f"{row['lower_bound']:.4f}",
+                'upper_bound': f"{row['upper_bound']:.4f}",
+                'grid_density': row['grids'],
+                'investment': self.investment * share,
+                'return_pct': row['return_pct'],
+                'max_drawdown_pct': row['max_drawdown_pct'],
+                'round_trips': row['round_trips'],
+                'score': row['score'],
+                'justification': (
+                    f"Backtested over the last {self.LOOKBACK_DAYS} days: {row['return_pct']:.2f}% return, "
+                    f"{row['max_drawdown_pct']:.2f}% max drawdown, {row['round_trips']} round trips."
+                ),
+            })
+        return table
+
+
+# Per-process views onto the optimizer's shared candle block
+_optimizer_block = None
+_optimizer_candles = {}
+
+
+def _attach_optimizer_candles(block_name, layout):
+    """Process-pool initializer: maps the shared candle block without copying it."""
+    global _optimizer_block
+    _optimizer_block = shared_memory.SharedMemory(name=block_name)
+    buffer = np.ndarray(sum(count for _, count in layout.values()), dtype=candle_dtype(), buffer=_optimizer_block.buf)
+    for symbol, (start, count) in layout.items():
+        _optimizer_candles[symbol] = buffer[start:start + count]
+
+
+def _score_grid_configs(symbol, configs, investment, fee_rate):
+    """Process-pool task: backtests a chunk of configurations for one symbol."""
+    candles = _optimizer_candles[symbol]
+    rows = []
+    for lower, upper, grids in configs:
+        result = GridBacktester(lower, upper, grids, investment, fee_rate=fee_rate).run(candles)
+        rows.append({
+            'symbol': symbol, 'lower_bound': lower, 'upper_bound': upper, 'grids': grids,
+            'return_pct': result['return_pct'], 'max_drawdown_pct': result['max_drawdown_pct'],
+            'round_trips': result['round_trips'],
+        })
+    return rows
+
+
+class SymbolMetadataCache:
+    """
+    Process-wide cache of exchange symbol metadata.
+
+    Everything is loaded with one bulk exchangeInfo request and kept as ready-parsed
+    filters and asset fields per symbol. The cache refreshes itself once the TTL has
+    passed, and `invalidate()` forces a reload on the next lookup (e.g. after an order
+    was rejected by a filter). Separate snapshots are kept for testnet and mainnet.
+    """
+    DEFAULT_TTL = 60 * 60
+    # Error codes Binance returns when an order breaks a symbol filter or precision rule
+    FILTER_ERROR_CODES = (-1013, -1111)
+    LEVERAGED_SUFFIXES = ('UP', 'DOWN', 'BULL', 'BEAR')
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._symbols = {}
+        self._loaded_at = {}
+        self._lock = threading.Lock()
+
+    def get(self, client, symbol):
+        """Returns the parsed metadata for one symbol."""
+        symbols = self.symbols(client)
+        if symbol not in symbols:
+            raise ValueError(f"Unknown trading pair: {symbol}")
+        return symbols[symbol]
+
+    def symbols(self, client):
+        """Returns {symbol: metadata} for every symbol, loading it if missing or stale."""
+        env = self._env(client)
+        with self._lock:
+            if env not in self._symbols or time.time() - self._loaded_at[env] > self.ttl:
+                exchange_info = client.get_exchange_info()
+                self._symbols[env] = {
+                    info['symbol']: self.parse_symbol(info) for info in exchange_info['symbols']
+                }
+                self._loaded_at[env] = time.time()
+                logging.info(f"Loaded exchange metadata for {len(self._symbols[env])} symbols.")
+            return self._symbols[env]
+
+    def invalidate(self, client=None):
+        """Forces a reload on the next lookup, for one environment or all of them."""
+        with self._lock:
+            if client is None:
+                self._loaded_at.clear()
+                self._symbols.clear()
+            else:
+                self._symbols.pop(self._env(client), None)
+
+    def invalidate_on_filter_error(self, client, error):
+        """Drops cached filters if `error` says an order broke them. Returns True if so."""
+        if getattr(error, 'code', None) in self.FILTER_ERROR_CODES:
+            self.invalidate(client)
+            return True
+        return False
+
+    def tradable_pairs(self, client, quote_asset='USDT'):
+        """Returns the set of trading symbols quoted in `quote_asset`, leveraged tokens excluded."""
+        symbols = self.symbols(client)
+        base_assets = {meta['base_asset'] for meta in symbols.values()}
+        return {
+            symbol for symbol, meta in symbols.items()
+            if meta['quote_asset'] == quote_asset
+            and meta['status'] == 'TRADING'
+            and not self.is_leveraged_token(meta['base_asset'], base_assets)
+        }
+
+    @classmethod
+    def is_leveraged_token(cls, base_asset, base_assets):
+        """True for tokens like BTCUP/BTCDOWN, i.e. a known base asset plus a leveraged suffix."""
+        for suffix in cls.LEVERAGED_SUFFIXES:
+            underlying = base_asset[:-len(suffix)]
+            if base_asset.endswith(suffix) and underlying in base_assets:
+                return True
+        return False
+
+    @staticmethod
+    def _env(client):
+        return 'testnet' if getattr(client, 'testnet', False) else 'mainnet'
+
+    @staticmethod
+    def parse_symbol(info):
+        """Flattens one exchangeInfo symbol entry into the fields the bot uses."""
+        filters = {f['filterType']: f for f in info.get('filters', [])}
+        lot_size = filters.get('LOT_SIZE', {})
+        price_filter = filters.get('PRICE_FILTER', {})
+        # Newer symbols carry NOTIONAL instead of the legacy MIN_NOTIONAL filter
+        notional = filters.get('MIN_NOTIONAL') or filters.get('NOTIONAL') or {}
+        tick_size = price_filter.get('tickSize', '0')
+        step_size = lot_size.get('stepSize', '0')
+        return {
+            'symbol': info['symbol'],
+            'status': info.get('status'),
+            'base_asset': info['baseAsset'],
+            'quote_asset': info['quoteAsset'],
+            'tick_size': float(tick_size),
+            'min_price': float(price_filter.get('minPrice', 0)),
+            'max_price': float(price_filter.get('maxPrice', 0)),
+            'price_precision': _decimal_places(tick_size),
+            'step_size': float(step_size),
+            'min_qty': float(lot_size.get('minQty', 0)),
+            'max_qty': float(lot_size.get('maxQty', 0)),
+            'qty_precision': _decimal_places(step_size),
+            'min_notional': float(notional.get('minNotional', 0)),
+            'cancel_replace_allowed': info.get('cancelReplaceAllowed', False),
+        }
+
+
+class GeminiAdvisor:
+    """
+    Turns scanned market data into a grid recommendation via Google Gemini.
+
+    The model handle is built once per API key and prompts carry a compact table of
+    rounded features. Answers are cached by a digest of those features, the model and a
+    fingerprint of the API key, so repeating an analysis over an unchanged market costs
+    no tokens, and identical requests that are already in flight share one call. Each
+    call runs on its own daemon thread, so one that hangs past the timeout never holds
+    up later requests. If Gemini is slow or fails, a deterministic local ranking
+    (ranging pairs first, then highest ATR%) is returned instead.
+    """
+    MODEL_NAME = 'gemini-pro'
+    CACHE_TTL = 15 * 60
+    TIMEOUT = 30
+    FEATURES = ('pair', 'current_price', 'support', 'resistance', 'atr_percentage',
+                'is_ranging', 'band_crossings', 'realized_volatility')
+    PRICE_DIGITS = 6  # Significant digits kept for prices
+    REQUIRED_FIELDS = ('trading_pair', 'lower_bound', 'upper_bound', 'grid_density', 'justification')
+    MIN_GRIDS, MAX_GRIDS = 20, 50
+
+    PROMPT = (
+        "You are a crypto market analyst choosing the single best pair for a grid trading bot. "
+        "Prefer high-volume pairs in a sideways market (is_ranging true) with high volatility "
+        "inside the range (high atr_percentage).\n"
+        "Market data (columns, then one row per pair): {table}\n"
+        "Reply ONLY with a JSON object, no markdown: "
+        '{{"trading_pair":str,"lower_bound":str (near support),"upper_bound":str (near resistance),'
+        '"grid_density":int {min_grids}-{max_grids},"justification":short str}}'
+    )
+
+    def __init__(self, model_factory=None, cache_ttl=CACHE_TTL, timeout=TIMEOUT, log=None):
+        self.model_factory = model_factory or self.default_model_factory
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.log = log or logging.info
+        self._models = {}
+        self._cache = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default_model_factory(cls, api_key):
+        """Builds a Gemini model handle for one API key."""
+        genai.configure(api_key=api_key)
+        return genai.GenerativeModel(cls.MODEL_NAME)
+
+    def recommend(self, market_data, api_key):
+        """Returns a recommendation dict from cache, Gemini or the local fallback ranking."""
+        features = self.features(market_data)
+        key = self.digest(features, self.fingerprint(api_key))
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            cached = self._cache.get(key)
+            if cached:
+                self.log("AI Assistant: Market unchanged since last analysis, reusing cached recommendation.")
+                RECOMMENDATIONS.inc('cache')
+                return dict(cached[1])
+            future = self._inflight.get(key)
+            if future is None:
+                try:
+                    model = self._model(api_key)
+                except Exception as e:
+                    self.log(f"AI Assistant Error creating the Gemini model: {e}")
+                    RECOMMENDATIONS.inc('fallback')
+                    return self.fallback(market_data)
+                future = self._inflight[key] = Future()
+                future.add_done_callback(lambda f: self._settle(key, f))
+                threading.Thread(target=self._run, args=(future, model, self.prompt(features)),
+                                 daemon=True, name="gemini").start()
+            else:
+                self.log("AI Assistant: Identical analysis already in progress, waiting for it.")
+
+        try:
+            recommendation = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.log(f"AI Assistant: Gemini did not answer within {self.timeout}s, using local ranking.")
+            RECOMMENDATIONS.inc('fallback')
+            return self.fallback(market_data)
+        except Exception as e:
+            self.log(f"AI Assistant Error during Gemini API call: {e}")
+            self.log(f"Check your Gemini API key and ensure the model '{self.MODEL_NAME}' is available.")
+            RECOMMENDATIONS.inc('fallback')
+            return self.fallback(market_data)
+
+        self.log("AI Assistant: Received recommendation from Gemini.")
+        RECOMMENDATIONS.inc('gemini')
+        return dict(recommendation)
+
+    def _model(self, api_key):
+        """Returns the cached model handle for an API key, creating it on first use."""
+        key_hash = self.fingerprint(api_key)
+        model = self._models.get(key_hash)
+        if model is None:
+            model = self._models[key_hash] = self.model_factory(api_key)
+        return model
+
+    def _run(self, future, model, prompt):
+        """Daemon-thread body of one Gemini call."""
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(self._query(model, prompt))
+        except Exception as e:
+            future.set_exception(e)
 
-if __name__ == "__main__":
+    def _query(self, model, prompt):
+        """Sends one prompt and parses the JSON recommendation out of the reply."""
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = model.generate_content(prompt)
+            outcome = 'ok'
+        finally:
+            GEMINI_LATENCY.observe(time.perf_counter() - start, outcome)
+        cleaned_response_text = response.text.strip().replace('```json', '').replace('```', '').strip()
+        recommendation = json.loads(cleaned_response_text)
+        missing = [k for k in self.REQUIRED_FIELDS if k not in recommendation]
+        if missing:
+            raise ValueError(f"Gemini response was missing required fields: {', '.join(missing)}")
+        recommendation['lower_bound'] = str(recommendation['lower_bound'])
+        recommendation['upper_bound'] = str(recommendation['upper_bound'])
+        return recommendation
+
+    def _settle(self, key, future):
+        """Caches a finished Gemini answer and clears its in-flight entry."""
+        with self._lock:
+            self._inflight.pop(key, None)
+            if not future.cancelled() and future.exception() is None:
+                self._cache[key] = (time.monotonic() + self.cache_ttl, future.result())
+
+    def _evict(self, now):
+        """Drops expired cache entries; called with the lock held."""
+        expired = [k for k, (expires, _) in self._cache.items() if expires <= now]
+        for k in expired:
+            del self._cache[k]
+
+    def clear(self):
+        """Forgets every cached recommendation."""
+        with self._lock:
+            self._cache.clear()
+
+    @classmethod
+    def features(cls, market_data):
+        """Rounds market data to the precision that matters for a recommendation, sorted by pair."""
+        rows = []
+        for item in sorted(market_data, key=lambda d: d['pair']):
+            rows.append([
+                item['pair'],
+                _round_significant(_as_float(item['current_price']), cls.PRICE_DIGITS),
+                _round_significant(_as_float(item['support']), cls.PRICE_DIGITS),
+                _round_significant(_as_float(item['resistance']), cls.PRICE_DIGITS),
+                round(_as_float(item['atr_percentage']), 1),
+                bool(item['is_ranging']),
+                int(item.get('band_crossings', 0)),
+                round(_as_float(item.get('realized_volatility', 0.0)), 2),
+            ])
+        return rows
+
+    @staticmethod
+    def fingerprint(api_key):
+        """Hash of an API key, so the key itself is never kept as a dict key."""
+        return hashlib.sha256((api_key or '').encode()).hexdigest()
+
+    @classmethod
+    def digest(cls, features, account=''):
+        """Stable cache key for a feature table asked of the model by one account."""
+        payload = json.dumps([account, cls.MODEL_NAME, features], separators=(',', ':'))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @classmethod
+    def prompt(cls, features):
+        """Builds the compact prompt for a feature table."""
+        table = json.dumps([list(cls.FEATURES)] + features, separators=(',', ':'))
+        return cls.PROMPT.format(table=table, min_grids=cls.MIN_GRIDS, max_grids=cls.MAX_GRIDS)
+
+    @classmethod
+    def fallback(cls, market_data):
+        """Deterministic recommendation: ranging pairs first, then highest ATR%."""
+        if not market_data:
+            return None
+        best = min(market_data, key=lambda d: (not d['is_ranging'], -_as_float(d['atr_percentage']), d['pair']))
+        price, support, resistance = (_as_float(best[k]) for k in ('current_price', 'support', 'resistance'))
+        atr_percentage = _as_float(best['atr_percentage'])
+        range_pct = (resistance - support) / price * 100 if price else 0.0
+        # Aim for grid steps of roughly half the average true range
+        step_pct = atr_percentage / 2
+        grids = round(range_pct / step_pct) if step_pct > 0 else cls.MIN_GRIDS
+        grids = int(min(cls.MAX_GRIDS, max(cls.MIN_GRIDS, grids)))
+        state = "ranging" if best['is_ranging'] else "trending"
+        return {
+            'trading_pair': best['pair'],
+            'lower_bound': _format_significant(support, cls.PRICE_DIGITS),
+            'upper_bound': _format_significant(resistance, cls.PRICE_DIGITS),
+            'grid_density': grids,
+            'justification': (f"Local ranking: {best['pair']} has the highest ATR "
+                              f"({atr_percentage:.2f}%) of the {state} pairs scanned."),
+        }
+
+
+def _as_float(value):
+    """Parses a market-data field that may be a number or a formatted string like '1.25%'."""
+    if isinstance(value, str):
+        return float(value.rstrip('%'))
+    return float(value)
+
+
+def _round_significant(value, digits):
+    """Rounds a float to a number of significant digits."""
+    value = float(value)
+    if value == 0 or not math.isfinite(value):
+        return value
+    return round(value, digits - 1 - math.floor(math.log10(abs(value))))
+
+
+def _format_significant(value, digits):
+    """Formats a float with a number of significant digits and no exponent, e.g. 0.000123457."""
+    value = float(value)
+    if value == 0 or not math.isfinite(value):
+        return f"{value:f}"
+    decimals = max(0, digits - 1 - math.floor(math.log10(abs(value))))
+    return f"{value:.{decimals}f}"
+
+
+# --- Metrics ---
+
+class Counter:
+    """Monotonic count per label set."""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def total(self):
+        return sum(self.values.values())
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """Last set value per label set."""
+    kind = 'gauge'
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self.values[label_values] = value
+
+
+class Histogram:
+    """Fixed-bucket latency histogram per label set (values in seconds)."""
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def count(self):
+        with self._lock:
+            return sum(sum(series[:-1]) for series in self.series.values())
+
+    def quantile(self, q, *label_values):
+        """Upper bucket bound holding the q-quantile, over one label set or all of them."""
+        with self._lock:
+            if label_values:
+                merged = list(self.series.get(label_values, ()))
+            else:
+                merged = [sum(column) for column in zip(*self.series.values())]
+        if not merged:
+            return None
+        counts = merged[:-1]
+        rank = q * sum(counts)
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = [(key, list(series)) for key, series in self.series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                out.append((f"{self.name}_bucket", key + (le,), cumulative))
+            out.append((f"{self.name}_sum", key, series[-1]))
+            out.append((f"{self.name}_count", key, cumulative))
+        return out
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics, rendered in the Prometheus text format.
+
+    Metrics are created once (usually at import) and updated with a lock-protected dict
+    update per observation, cheap enough to leave on. `time()` measures a block into a
+    histogram; `summary()` is a one-line digest for the dashboard.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help_text, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, tuple(labels), **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=Histogram.DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, labels, buckets=buckets)
+
+    def time(self, histogram, *label_values):
+        """Context manager observing the duration of a block into `histogram`."""
+        return _Timer(histogram, label_values)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            names = metric.labels + (('le',) if metric.kind == 'histogram' else ())
+            for sample_name, label_values, value in metric.samples():
+                labels = ",".join(f'{n}="{v}"' for n, v in zip(names, label_values))
+                lines.append(f"{sample_name}{{{labels}}} {value}" if labels else f"{sample_name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Short digest of request latency, weight usage and fill reaction time."""
+        parts = [f"{EXCHANGE_REQUESTS.total()} exchange requests"]
+        p50, p95 = EXCHANGE_LATENCY.quantile(0.5), EXCHANGE_LATENCY.quantile(0.95)
+        if p50 is not None:
+            parts.append(f"latency p50 <={p50 * 1000:g} ms, p95 <={p95 * 1000:g} ms")
+        weight = USED_WEIGHT.values.get(())
+        if weight is not None:
+            parts.append(f"used weight {weight:g}/{RateLimiter.WEIGHT_PER_MINUTE}")
+        if FILLS.total():
+            parts.append(f"{FILLS.total()} fills")
+        reaction = FILL_REACTION.quantile(0.5, 'received')
+        if reaction is not None:
+            parts.append(f"fill reaction p50 <={reaction * 1000:g} ms")
+        return "Metrics: " + ", ".join(parts)
+
+
+class _Timer:
+    __slots__ = ('histogram', 'label_values', 'start')
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+        return False
+
+
+class MetricsServer(threading.Thread):
+    """Serves the registry as Prometheus text on http://host:port/metrics."""
+    DEFAULT_PORT = 9464
+
+    def __init__(self, registry, host="127.0.0.1", port=DEFAULT_PORT):
+        super().__init__(daemon=True)
+        registry_ref = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry_ref.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Scrapes would flood the log
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/metrics"
+
+    def run(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class InstrumentedClient:
+    """
+    Transparent proxy around a python-binance Client that times every method call,
+    counts outcomes per method and records the used-weight/order-count headers of
+    each response.
+    """
+
+    def __init__(self, client):
+        object.__setattr__(self, '_client', client)
+        object.__setattr__(self, '_wrapped', {})
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            wrapped = self._wrapped[name] = self._instrument(name, attr)
+        return wrapped
+
+    def __setattr__(self, name, value):
+        setattr(self._client, name, value)
+
+    def _instrument(self, name, method):
+        client = self._client
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = 'ok'
+            try:
+                return method(*args, **kwargs)
+            except BinanceAPIException as e:
+                outcome = str(e.code)
+                raise
+            except Exception:
+                outcome = 'error'
+                raise
+            finally:
+                EXCHANGE_LATENCY.observe(time.perf_counter() - start, name)
+                EXCHANGE_REQUESTS.inc(name, outcome)
+                headers = getattr(getattr(client, 'response', None), 'headers', None)
+                if headers:
+                    weight = headers.get('x-mbx-used-weight-1m')
+                    if weight is not None:
+                        USED_WEIGHT.set(float(weight))
+                    orders = headers.get('x-mbx-order-count-10s')
+                    if orders is not None:
+                        ORDER_COUNT.set(float(orders))
+
+        return call
+
+
+class PooledClient(Client):
+    """
+    python-binance Client meant to live for the whole process and be shared by threads.
+
+    Requests go through one keep-alive pool sized for the placement and supervisor
+    workers, so bursts reuse warm TLS connections. `response` is kept per thread,
+    because the rate limiter and metrics read the headers of the caller's own last
+    response. Signed requests use a server-time offset that is resynced by
+    ExchangeSessions and immediately after a -1021 timestamp rejection.
+    """
+    POOL_SIZE = 32
+    REQUEST_TIMEOUT = 10
+    # Only failed connects are retried; a request that reached the server is not resent
+    CONNECT_RETRIES = 2
+    # "Timestamp for this request is outside of the recvWindow."
+    TIMESTAMP_ERROR_CODE = -1021
+
+    def __init__(self, api_key, api_secret, testnet=False, pool_size=POOL_SIZE, timeout=REQUEST_TIMEOUT):
+        self._local = threading.local()
+        self.pool_size = pool_size
+        self.time_synced_at = None
+        # No ping: the first time sync warms the connection off the caller's thread
+        super().__init__(api_key, api_secret, requests_params={'timeout': timeout}, testnet=testnet, ping=False)
+
+    @property
+    def response(self):
+        return getattr(self._local, 'response', None)
+
+    @response.setter
+    def response(self, value):
+        self._local.response = value
+
+    def _init_session(self):
+        session = super()._init_session()
+        retries = Retry(total=self.CONNECT_RETRIES, connect=self.CONNECT_RETRIES, read=False,
+                        status=False, redirect=False, backoff_factor=0.1)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=retries)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _request(self, method, uri, signed, force_params=False, **kwargs):
+        data = kwargs.get('data')
+        if not signed or not isinstance(data, dict):
+            return super()._request(method, uri, signed, force_params, **kwargs)
+        # The request builder adds the timestamp and signature to `data` in place
+        original = dict(data)
+        try:
+            return super()._request(method, uri, signed, force_params, **kwargs)
+        except BinanceAPIException as e:
+            if e.code != self.TIMESTAMP_ERROR_CODE:
+                raise
+        logging.warning("Request timestamp rejected by Binance, resyncing the clock offset and retrying.")
+        self.sync_time()
+        return super()._request(method, uri, signed, force_params, **dict(kwargs, data=original))
+
+    def sync_time(self):
+        """Sets timestamp_offset (ms) from the server clock, assuming a symmetric round trip."""
+        started = time.time()
+        server_time = self.get_server_time()['serverTime']
+        finished = time.time()
+        self.timestamp_offset = int(server_time - (started + finished) * 500)
+        self.time_synced_at = time.monotonic()
+        return self.timestamp_offset
+
+    def close(self):
+        self.session.close()
+
+
+class ExchangeSessions:
+    """
+    One long-lived, instrumented PooledClient per (credentials, environment), shared by
+    the analysis thread, every bot and the daemon instead of a new Client per action.
+
+    `get()` never touches the network. A background thread syncs each new session's
+    clock offset right away and then every TIME_SYNC_INTERVAL seconds, retrying failed
+    syncs sooner.
+    """
+    TIME_SYNC_INTERVAL = 600
+    SYNC_RETRY = 30
+
+    def __init__(self, client_factory=PooledClient, time_sync_interval=TIME_SYNC_INTERVAL):
+        self.client_factory = client_factory
+        self.time_sync_interval = time_sync_interval
+        self._sessions = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def key_for(api_key, api_secret, testnet):
+        """Sessions are keyed by a hash so the registry never holds raw secrets as keys."""
+        return hashlib.sha256(f"{api_key}:{api_secret}".encode()).hexdigest(), bool(testnet)
+
+    def get(self, api_key, api_secret, testnet=False):
+        """Returns the shared client for these credentials, creating it on first use."""
+        key = self.key_for(api_key, api_secret, testnet)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                client = self._clients[key] = self.client_factory(api_key, api_secret, testnet=testnet)
+                session = self._sessions[key] = InstrumentedClient(client)
+                if self._thread is None or not self._thread.is_alive():
+                    self._closed.clear()
+                    self._thread = threading.Thread(target=self._run, daemon=True, name="exchange-time-sync")
+                    self._thread.start()
+        self._wake.set()
+        return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def sync_due(self):
+        """Syncs the clock of every session whose offset is missing or stale."""
+        with self._lock:
+            clients = list(self._clients.values())
+        for client in clients:
+            synced_at = client.time_synced_at
+            if synced_at is not None and time.monotonic() - synced_at < self.time_sync_interval:
+                continue
+            try:
+                offset = client.sync_time()
+                logging.info(f"Exchange clock offset: {offset} ms.")
+            except Exception as e:
+                logging.warning(f"Could not sync the exchange clock: {e}")
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wake.clear()
+            self.sync_due()
+            self._wake.wait(self.SYNC_RETRY)
+
+    def close(self):
+        """Stops the sync thread and closes every pooled connection."""
+        self._closed.set()
+        self._wake.set()
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients, self._sessions = {}, {}
+        for client in clients:
+            client.close()
+
+
+def _format_units(units, precision):
+    """Exact decimal string of an integer count of 10**-precision, e.g. (12345, 2) -> '123.45'."""
+    if not precision:
+        return str(units)
+    whole, fraction = divmod(units, 10 ** precision)
+    return f"{whole}.{fraction:0{precision}d}"
+
+
+def _decimal_places(step):
+    """Number of decimals in an exchange step string, e.g. '0.00100000' -> 3."""
+    fraction = step.partition('.')[2].rstrip('0')
+    return len(fraction)
+
+
+# Shared by every GridBot and the AI scanner
+symbol_cache = SymbolMetadataCache()
+
+# Shared by market analysis and backtesting
+candle_store = CandleStore()
+
+# Shared exchange connections, one per account and environment
+exchange_sessions = ExchangeSessions()
+
+# Process-wide metrics, served by MetricsServer and summarized on the dashboard
+metrics = MetricsRegistry()
+EXCHANGE_LATENCY = metrics.histogram('exchange_request_seconds', 'Latency of exchange REST calls.', ('method',))
+EXCHANGE_REQUESTS = metrics.counter('exchange_requests_total', 'Exchange REST calls by outcome (ok or error code).', ('method', 'outcome'))
+USED_WEIGHT = metrics.gauge('exchange_used_weight_1m', 'Request weight used in the current minute, from response headers.')
+ORDER_COUNT = metrics.gauge('exchange_order_count_10s', 'Orders placed in the current 10 seconds, from response headers.')
+FILL_REACTION = metrics.histogram('fill_reaction_seconds', 'Time from a fill to its acknowledged counter-order, measured from the exchange event or from local receipt.', ('since',))
+FILLS = metrics.counter('grid_fills_total', 'Grid fills handled.', ('pair', 'side'))
+STAGE_LATENCY = metrics.histogram('stage_seconds', 'Duration of bot and analysis stages.', ('stage',))
+GEMINI_LATENCY = metrics.histogram('gemini_request_seconds', 'Latency of Gemini generate_content calls.', ('outcome',))
+RECOMMENDATIONS = metrics.counter('recommendations_total', 'Recommendations served by source.', ('source',))
+
+
+# --- Headless entry points ---
+
+DAEMON_STATUS_INTERVAL = 60
+
+
+def load_config(path):
+    """
+    Reads a JSON config for the daemon or the analysis command. API keys may be given in
+    the file or, preferably, through BINANCE_API_KEY / BINANCE_API_SECRET / GEMINI_API_KEY.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    config.setdefault('api_key', os.environ.get('BINANCE_API_KEY'))
+    config.setdefault('api_secret', os.environ.get('BINANCE_API_SECRET'))
+    config.setdefault('gemini_api_key', os.environ.get('GEMINI_API_KEY'))
+    if not config['api_key'] or not config['api_secret']:
+        raise ValueError("Binance API key and secret are required (config file or environment).")
+    return config
+
+
+def client_from_config(config):
+    return exchange_sessions.get(config['api_key'], config['api_secret'], testnet=config.get('testnet', True))
+
+
+def run_daemon(config_path, cancel_on_exit=False):
+    """
+    Runs every grid in the config without a GUI until SIGINT/SIGTERM. The bots then
+    detach, leaving their orders open and journaled so a restarted daemon resumes them;
+    with cancel_on_exit (or the cancel_on_exit config key) they are stopped and their
+    orders cancelled instead. Config keys: testnet, bots (list of pair, lower_bound,
+    upper_bound, grids, investment), journal (path, or false to disable),
+    metrics_port (0 picks a free port, false disables it), status_interval, cancel_on_exit.
+    """
+    config = load_config(config_path)
+    cancel_on_exit = cancel_on_exit or bool(config.get('cancel_on_exit', False))
+    journal_path = config.get('journal', GridJournal.DEFAULT_PATH)
+    journal = GridJournal(os.path.expanduser(journal_path)) if journal_path else None
+    metrics_port = config.get('metrics_port', MetricsServer.DEFAULT_PORT)
+    server = None
+    if metrics_port is not False:
+        server = MetricsServer(metrics, port=metrics_port)
+        server.start()
+        logging.info(f"Serving metrics on {server.url}")
+
+    # Process supervisors (systemd, containers) send SIGTERM on every restart, so by
+    # default a signal detaches the grids rather than tearing them down
+    stopping = threading.Event()
+    previous_handlers = {sig: signal.signal(sig, lambda *_: stopping.set()) for sig in (signal.SIGINT, signal.SIGTERM)}
+
+    supervisor = BotSupervisor(client_from_config(config), journal=journal).start()
+    for params in config.get('bots', []):
+        supervisor.add_bot(dict(params, lower_bound=float(params['lower_bound']),
+                                upper_bound=float(params['upper_bound']), grids=int(params['grids']),
+                                investment=float(params['investment'])))
+
+    interval = config.get('status_interval', DAEMON_STATUS_INTERVAL)
+    while not stopping.wait(interval):
+        for pair, status in supervisor.status().items():
+            logging.info(f"[{pair}] {status['state']} | P&L {status['total_pnl']:.4f} realized, "
+                         f"{status['unrealized_pnl']:.4f} unrealized | max drawdown {status['max_drawdown']:.4f} | "
+                         f"inventory {status['inventory']:g} | {status['fills']} fills | "
+                         f"last price {status['last_price']}")
+        logging.info(metrics.summary())
+
+    if cancel_on_exit:
+        logging.info("Shutting down: stopping all bots and cancelling their orders...")
+    else:
+        logging.info("Shutting down: detaching all bots; their orders stay open for the next start...")
+    supervisor.shutdown(detach=not cancel_on_exit)
+    for sig, handler in previous_handlers.items():
+        signal.signal(sig, handler)
+    if server:
+        server.stop()
+    if journal:
+        journal.close()
+    exchange_sessions.close()
+    return 0
+
+
+def run_analysis(config_path, optimize=False):
+    """Prints a recommendation (or, with optimize, the optimizer's table) as JSON."""
+    config = load_config(config_path)
+    client = client_from_config(config)
+    analyzer = MarketAnalyzer()
+    pairs = analyzer.fetch_high_volume_pairs(client, limit=config.get('scan_limit', 10))
+    if optimize:
+        result = analyzer.optimize(client, pairs, config.get('investment'))
+    else:
+        market_data = analyzer.gather_market_data(client, pairs)
+        if config.get('gemini_api_key'):
+            result = analyzer.get_recommendation(market_data, config['gemini_api_key'])
+        else:
+            result = GeminiAdvisor.fallback(market_data)
+    if analyzer.market_scanner:
+        analyzer.market_scanner.stop()
+    exchange_sessions.close()
+    print(json.dumps(result, indent=2))
+    return 0 if result else 1
+
+
+def __getattr__(name):
+    """Lazy module attributes: the GUI class and the NumPy record dtypes."""
+    if name == 'BinanceGridBotApp':
+        from gui import BinanceGridBotApp
+        return BinanceGridBotApp
+    if name == 'CANDLE_DTYPE':
+        return candle_dtype()
+    if name == 'RANGE_METRICS_DTYPE':
+        return range_metrics_dtype()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI-powered Binance grid trading bot.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--daemon", metavar="CONFIG", help="Run the grids in CONFIG headless until interrupted")
+    mode.add_argument("--analyze", metavar="CONFIG", help="Print a grid recommendation as JSON and exit")
+    mode.add_argument("--optimize", metavar="CONFIG", help="Print the grid optimizer's results as JSON and exit")
+    parser.add_argument("--cancel-on-exit", action="store_true",
+                        help="With --daemon, cancel every grid's orders on shutdown instead of leaving them for a restart")
+    args = parser.parse_args(argv)
+
+    if args.daemon:
+        return run_daemon(args.daemon, cancel_on_exit=args.cancel_on_exit)
+    if args.analyze:
+        return run_analysis(args.analyze)
+    if args.optimize:
+        return run_analysis(args.optimize, optimize=True)
+
+    from gui import BinanceGridBotApp
     app = BinanceGridBotApp()
     app.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    # Run from the importable module: gui.py imports `bot`, and a second copy of this file
+    # as __main__ would have its own rate limiter, symbol cache, metrics and sessions
+    import bot
+    sys.exit(bot.main())
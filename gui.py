@@ -0,0 +1,489 @@
+"""Desktop GUI for the grid trading bot. Run `python bot.py` (or `python gui.py`) to start it."""
+import customtkinter
+import threading
+import queue
+import time
+import logging
+import os
+import sqlite3
+from logging.handlers import RotatingFileHandler
+
+from bot import (
+    exchange_sessions, BotSupervisor, GridJournal, GridOptimizer, MarketAnalyzer,
+    MetricsServer, metrics, EXCHANGE_REQUESTS, STAGE_LATENCY,
+)
+
+# --- Basic Configuration ---
+# Set the appearance and color theme for the GUI
+customtkinter.set_appearance_mode("Dark")
+customtkinter.set_default_color_theme("blue")
+
+
+class BinanceGridBotApp(customtkinter.CTk):
+    GUI_TICK_MS = 100
+    GUI_BACKLOG_TICK_MS = 10
+    GUI_BATCH_BUDGET = 0.015  # Seconds of GUI time spent draining the queue per tick
+    DASHBOARD_MAX_LINES = 5000
+    LOG_FILE = os.path.join(os.path.expanduser("~"), ".crypto_trader", "dashboard.log")
+    LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+    LOG_FILE_BACKUPS = 3
+    METRICS_SUMMARY_MS = 60 * 1000
+    PNL_REFRESH_MS = 1000
+
+    def __init__(self, max_dashboard_lines=DASHBOARD_MAX_LINES, log_file=LOG_FILE):
+        super().__init__()
+
+        self.title("AI-Powered Binance Grid Trading Bot")
+        self.geometry("1100x780")
+
+        # The GUI runs its bot under the same BotSupervisor as the daemon, one per client
+        self.supervisor = None
+        self.bot_pair = None
+        self.bot_running = False
+        self.gui_queue = queue.Queue()
+        self.max_dashboard_lines = max_dashboard_lines
+        self.dashboard_lines = 0  # Text lines in the widget; a message may span several
+        self.log_sink = self.create_log_sink(log_file)
+        self.analyzer = MarketAnalyzer(log=self.log_to_dashboard)
+        self.metrics_server = None
+        self._summarized_requests = 0
+        try:
+            self.metrics_server = MetricsServer(metrics)
+            self.metrics_server.start()
+            logging.info(f"Serving metrics on {self.metrics_server.url}")
+        except OSError as e:
+            logging.warning(f"Metrics endpoint disabled: {e}")
+        try:
+            self.journal = GridJournal()
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Order journal disabled: {e}")
+            self.journal = None
+
+        # --- Main Grid Layout ---
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        # --- Left Frame for Controls ---
+        self.left_frame = customtkinter.CTkFrame(self, width=280, corner_radius=10)
+        self.left_frame.grid(row=0, column=0, padx=20, pady=20, sticky="nsew")
+        self.left_frame.grid_propagate(False)
+
+        # --- Right Frame for Dashboard ---
+        self.right_frame = customtkinter.CTkFrame(self, corner_radius=10)
+        self.right_frame.grid(row=0, column=1, padx=(0, 20), pady=20, sticky="nsew")
+        self.right_frame.grid_columnconfigure(0, weight=1)
+        self.right_frame.grid_rowconfigure(0, weight=1)
+
+        self.create_controls()
+        self.create_dashboard()
+
+        # Start the GUI update loop
+        self.after(self.GUI_TICK_MS, self.process_gui_queue)
+        self.after(self.METRICS_SUMMARY_MS, self.post_metrics_summary)
+        self.after(self.PNL_REFRESH_MS, self.refresh_pnl)
+
+    def create_controls(self):
+        """Creates all the input fields and buttons in the left control frame."""
+        frame = self.left_frame
+        
+        # --- Title ---
+        title_label = customtkinter.CTkLabel(frame, text="Bot Configuration", font=customtkinter.CTkFont(size=20, weight="bold"))
+        title_label.pack(pady=20)
+
+        # --- API Configuration ---
+        api_frame = customtkinter.CTkFrame(frame)
+        api_frame.pack(pady=10, padx=10, fill="x")
+        api_label = customtkinter.CTkLabel(api_frame, text="Binance Credentials", font=customtkinter.CTkFont(size=14, weight="bold"))
+        api_label.pack(pady=(5,10))
+
+        self.api_key_entry = customtkinter.CTkEntry(api_frame, placeholder_text="API Key")
+        self.api_key_entry.pack(pady=5, padx=10, fill="x")
+        self.api_secret_entry = customtkinter.CTkEntry(api_frame, placeholder_text="API Secret", show="*")
+        self.api_secret_entry.pack(pady=5, padx=10, fill="x")
+
+        # --- Environment Selection ---
+        self.env_selection = customtkinter.CTkSegmentedButton(frame, values=["Demo (Testnet)", "Live Trading"])
+        self.env_selection.pack(pady=10, padx=10, fill="x")
+        self.env_selection.set("Demo (Testnet)")
+
+        # --- AI Strategy Assistant ---
+        ai_frame = customtkinter.CTkFrame(frame)
+        ai_frame.pack(pady=10, padx=10, fill="x")
+        ai_label = customtkinter.CTkLabel(ai_frame, text="AI Strategy Assistant", font=customtkinter.CTkFont(size=14, weight="bold"))
+        ai_label.pack(pady=(5,10))
+
+        self.gemini_api_key_entry = customtkinter.CTkEntry(ai_frame, placeholder_text="Google Gemini API Key", show="*")
+        self.gemini_api_key_entry.pack(pady=5, padx=10, fill="x")
+
+        self.find_opportunity_button = customtkinter.CTkButton(ai_frame, text="Find Best Opportunity", command=self.find_best_opportunity)
+        self.find_opportunity_button.pack(pady=10, padx=10, fill="x")
+        self.optimize_button = customtkinter.CTkButton(ai_frame, text="Optimize Grid Parameters", command=self.find_optimal_grid)
+        self.optimize_button.pack(pady=(0, 10), padx=10, fill="x")
+        self.ai_recommendation_label = customtkinter.CTkLabel(ai_frame, text="Recommendation will appear here...", wraplength=220, justify="left")
+        self.ai_recommendation_label.pack(pady=5, padx=10)
+
+        # --- Manual Bot Configuration ---
+        manual_frame = customtkinter.CTkFrame(frame)
+        manual_frame.pack(pady=10, padx=10, fill="x")
+        manual_label = customtkinter.CTkLabel(manual_frame, text="Manual Configuration", font=customtkinter.CTkFont(size=14, weight="bold"))
+        manual_label.pack(pady=(5,10))
+
+        self.pair_entry = customtkinter.CTkEntry(manual_frame, placeholder_text="Trading Pair (e.g., BTCUSDT)")
+        self.pair_entry.pack(pady=5, padx=10, fill="x")
+        self.lower_bound_entry = customtkinter.CTkEntry(manual_frame, placeholder_text="Lower Price Boundary")
+        self.lower_bound_entry.pack(pady=5, padx=10, fill="x")
+        self.upper_bound_entry = customtkinter.CTkEntry(manual_frame, placeholder_text="Upper Price Boundary")
+        self.upper_bound_entry.pack(pady=5, padx=10, fill="x")
+        self.grids_entry = customtkinter.CTkEntry(manual_frame, placeholder_text="Number of Grids")
+        self.grids_entry.pack(pady=5, padx=10, fill="x")
+        self.investment_entry = customtkinter.CTkEntry(manual_frame, placeholder_text="Total Investment (e.g., 1000 USDT)")
+        self.investment_entry.pack(pady=5, padx=10, fill="x")
+        self.trailing_checkbox = customtkinter.CTkCheckBox(manual_frame, text="Trail price (re-centre when it leaves the range)")
+        self.trailing_checkbox.pack(pady=5, padx=10, fill="x")
+
+        # --- Bot Controls ---
+        self.start_bot_button = customtkinter.CTkButton(frame, text="Start Bot", command=self.start_bot)
+        self.start_bot_button.pack(pady=15, padx=10, fill="x")
+        self.stop_bot_button = customtkinter.CTkButton(frame, text="Stop Bot", command=self.stop_bot, state="disabled")
+        self.stop_bot_button.pack(pady=5, padx=10, fill="x")
+        # Leaves the grid's orders open and journaled, for restarting the app without rebuilding it
+        self.detach_bot_button = customtkinter.CTkButton(frame, text="Stop (Keep Orders)", command=lambda: self.stop_bot(detach=True), state="disabled")
+        self.detach_bot_button.pack(pady=5, padx=10, fill="x")
+        self.update_grid_button = customtkinter.CTkButton(frame, text="Update Running Grid", command=self.update_running_grid, state="disabled")
+        self.update_grid_button.pack(pady=5, padx=10, fill="x")
+
+    def create_dashboard(self):
+        """Creates the text box for logging bot activity."""
+        self.dashboard_textbox = customtkinter.CTkTextbox(self.right_frame, state="disabled", corner_radius=10, font=("Courier", 13))
+        self.dashboard_textbox.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
+        self.pnl_label = customtkinter.CTkLabel(self.right_frame, text="No position", anchor="w", font=("Courier", 13))
+        self.pnl_label.grid(row=1, column=0, padx=10, pady=(0, 10), sticky="ew")
+
+    def log_to_dashboard(self, message):
+        """Thread-safe method to log messages to the GUI."""
+        self.gui_queue.put(message)
+
+    def create_log_sink(self, log_file):
+        """Creates a rotating file logger holding the full, untrimmed dashboard log."""
+        if not log_file:
+            return None
+        sink = logging.getLogger("crypto_trader.dashboard")
+        sink.propagate = False
+        try:
+            os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+            handler = RotatingFileHandler(log_file, maxBytes=self.LOG_FILE_MAX_BYTES,
+                                          backupCount=self.LOG_FILE_BACKUPS, encoding="utf-8")
+        except OSError as e:
+            logging.warning(f"Dashboard log file disabled: {e}")
+            return None
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        sink.handlers = [handler]
+        sink.setLevel(logging.INFO)
+        return sink
+
+    def drain_gui_queue(self):
+        """Takes queued messages until the queue is empty or the per-tick time budget is spent."""
+        batch = []
+        deadline = time.perf_counter() + self.GUI_BATCH_BUDGET
+        while time.perf_counter() < deadline:
+            try:
+                batch.append(self.gui_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def process_gui_queue(self):
+        """Renders queued messages in one widget update per tick, keeping only the newest lines."""
+        batch = self.drain_gui_queue()
+        if batch:
+            if self.log_sink:
+                stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+                self.log_sink.info("\n".join(f"{stamp} {message}" for message in batch))
+            max_lines = self.max_dashboard_lines
+            # Messages that would be trimmed straight away are never inserted into the widget
+            shown, lines = [], 0
+            for message in reversed(batch):
+                if lines >= max_lines:
+                    break
+                shown.append(message)
+                lines += message.count("\n") + 1
+            shown.reverse()
+            self.dashboard_textbox.configure(state="normal")
+            self.dashboard_textbox.insert("end", "\n".join(shown) + "\n")
+            self.dashboard_lines += lines
+            excess = self.dashboard_lines - max_lines
+            if excess > 0:
+                self.dashboard_textbox.delete("1.0", f"{excess + 1}.0")
+                self.dashboard_lines = max_lines
+            self.dashboard_textbox.see("end")
+            self.dashboard_textbox.configure(state="disabled")
+        delay = self.GUI_TICK_MS if self.gui_queue.empty() else self.GUI_BACKLOG_TICK_MS
+        self.after(delay, self.process_gui_queue)
+
+    def post_metrics_summary(self):
+        """Logs a metrics digest to the dashboard periodically, if anything was measured since the last one."""
+        requests = EXCHANGE_REQUESTS.total()
+        if requests != self._summarized_requests:
+            self._summarized_requests = requests
+            self.log_to_dashboard(metrics.summary())
+        self.after(self.METRICS_SUMMARY_MS, self.post_metrics_summary)
+
+    def refresh_pnl(self):
+        """Shows the running bot's position and P&L from its ledger snapshot."""
+        bot = self.supervisor.bot(self.bot_pair) if self.supervisor and self.bot_pair else None
+        ledger = bot.ledger if bot else None
+        if ledger:
+            p = ledger.snapshot()
+            quote = ledger.quote_asset
+            text = (f"P&L {p['total_pnl']:+.4f} {quote} (realized {p['realized_pnl']:+.4f}, "
+                    f"unrealized {p['unrealized_pnl']:+.4f}) | inventory {p['inventory']:g} {ledger.base_asset} "
+                    f"@ {p['avg_cost']:.4f} | fees {p['fees']:.4f} | max drawdown {p['max_drawdown']:.4f}")
+            # Reconfiguring the widget costs a redraw, so only when the numbers changed
+            if text != self.pnl_label.cget("text"):
+                self.pnl_label.configure(text=text)
+        self.after(self.PNL_REFRESH_MS, self.refresh_pnl)
+
+    def find_best_opportunity(self):
+        """Starts a thread to get the LLM recommendation."""
+        self.log_to_dashboard("AI Assistant: Starting market analysis...")
+        self.find_opportunity_button.configure(state="disabled", text="Analyzing...")
+        
+        # Run analysis in a separate thread to not freeze the GUI
+        threading.Thread(target=self.run_llm_analysis, daemon=True).start()
+
+    def run_llm_analysis(self):
+        """Gathers data, queries the LLM, and updates the GUI."""
+        try:
+            client = self.get_binance_client()
+            if not client:
+                 self.log_to_dashboard("AI Assistant Error: Please enter valid API keys first.")
+                 self.find_opportunity_button.configure(state="normal", text="Find Best Opportunity")
+                 return
+            
+            # Dynamically fetch high-volume pairs instead of using a hardcoded list.
+            with metrics.time(STAGE_LATENCY, 'select_pairs'):
+                pairs = self.analyzer.fetch_high_volume_pairs(client, limit=10)
+            self.log_to_dashboard(f"AI Assistant: Analyzing pairs: {', '.join(pairs)}")
+            
+            gemini_api_key = self.gemini_api_key_entry.get()
+            if not gemini_api_key:
+                self.log_to_dashboard("AI Assistant Error: Please enter your Google Gemini API key.")
+                self.after(0, lambda: self.find_opportunity_button.configure(state="normal", text="Find Best Opportunity"))
+                return
+                 
+            with metrics.time(STAGE_LATENCY, 'gather_market_data'):
+                market_data = self.analyzer.gather_market_data(client, pairs)
+            
+            if market_data:
+                with metrics.time(STAGE_LATENCY, 'recommendation'):
+                    recommendation = self.get_gemini_recommendation(market_data, gemini_api_key)
+            else:
+                recommendation = None
+                self.log_to_dashboard("AI Assistant: No market data gathered. Cannot get recommendation.")
+
+            if recommendation:
+                self.log_to_dashboard("AI Assistant: Analysis complete. Found an opportunity!")
+                # Update GUI from the main thread
+                self.after(0, self.update_ui_with_recommendation, recommendation)
+            else:
+                self.log_to_dashboard("AI Assistant: Could not determine a clear opportunity.")
+        
+        except Exception as e:
+            self.log_to_dashboard(f"AI Assistant Error: {e}")
+        finally:
+            # Re-enable the button from the main thread
+            self.after(0, lambda: self.find_opportunity_button.configure(state="normal", text="Find Best Opportunity"))
+
+    def find_optimal_grid(self):
+        """Starts a thread that backtests grid settings for the top pairs."""
+        self.log_to_dashboard("Optimizer: Starting parameter sweep...")
+        self.optimize_button.configure(state="disabled", text="Optimizing...")
+        threading.Thread(target=self.run_optimizer, daemon=True).start()
+
+    def run_optimizer(self):
+        """Sweeps grid bounds and density over recent history and fills in the best result."""
+        try:
+            client = self.get_binance_client()
+            if not client:
+                self.log_to_dashboard("Optimizer Error: Please enter valid API keys first.")
+                return
+            try:
+                investment = float(self.investment_entry.get())
+            except ValueError:
+                investment = GridOptimizer.DEFAULT_INVESTMENT
+
+            pairs = self.analyzer.fetch_high_volume_pairs(client, limit=10)
+            table = self.analyzer.optimize(client, pairs, investment)
+            if not table:
+                self.log_to_dashboard("Optimizer: No profitable configuration found.")
+                return
+            for rank, row in enumerate(table[:5], start=1):
+                self.log_to_dashboard(
+                    f"Optimizer #{rank}: {row['trading_pair']} {row['lower_bound']}-{row['upper_bound']} "
+                    f"x{row['grid_density']} | return {row['return_pct']:.2f}% | "
+                    f"max DD {row['max_drawdown_pct']:.2f}% | {row['round_trips']} round trips | "
+                    f"allocate {row['investment']:.2f}"
+                )
+            self.after(0, self.update_ui_with_recommendation, table[0])
+        except Exception as e:
+            self.log_to_dashboard(f"Optimizer Error: {e}")
+        finally:
+            self.after(0, lambda: self.optimize_button.configure(state="normal", text="Optimize Grid Parameters"))
+
+    def get_gemini_recommendation(self, market_data, api_key):
+        """
+        Gets a trading recommendation from the Gemini advisor (cached, with a local fallback).
+        """
+        self.log_to_dashboard("AI Assistant: Contacting Google Gemini for analysis...")
+        return self.analyzer.get_recommendation(market_data, api_key)
+
+    def update_ui_with_recommendation(self, recommendation):
+        """Populates the GUI fields with the AI's suggestion."""
+        self.pair_entry.delete(0, "end")
+        self.pair_entry.insert(0, recommendation['trading_pair'])
+        
+        self.lower_bound_entry.delete(0, "end")
+        self.lower_bound_entry.insert(0, recommendation['lower_bound'])
+
+        self.upper_bound_entry.delete(0, "end")
+        self.upper_bound_entry.insert(0, recommendation['upper_bound'])
+
+        self.grids_entry.delete(0, "end")
+        self.grids_entry.insert(0, str(recommendation['grid_density']))
+
+        # Never overwrite the user's investment with a zero allocation
+        if recommendation.get('investment'):
+            self.investment_entry.delete(0, "end")
+            self.investment_entry.insert(0, f"{recommendation['investment']:.2f}")
+
+        self.ai_recommendation_label.configure(text=recommendation['justification'])
+
+    def get_binance_client(self):
+        """Returns the shared Binance session for the credentials and environment in the GUI."""
+        api_key = self.api_key_entry.get()
+        api_secret = self.api_secret_entry.get()
+        if not api_key or not api_secret:
+            return None
+            
+        testnet = self.env_selection.get() == "Demo (Testnet)"
+        return exchange_sessions.get(api_key, api_secret, testnet=testnet)
+
+    def read_grid_params(self):
+        """Grid parameters from the manual configuration fields, or None if they are invalid."""
+        try:
+            params = {
+                "pair": self.pair_entry.get(),
+                "lower_bound": float(self.lower_bound_entry.get()),
+                "upper_bound": float(self.upper_bound_entry.get()),
+                "grids": int(self.grids_entry.get()),
+                "investment": float(self.investment_entry.get()),
+                "trailing": bool(self.trailing_checkbox.get())
+            }
+            
+            if params['lower_bound'] >= params['upper_bound'] or params['grids'] < 2:
+                raise ValueError("Invalid grid parameters.")
+
+        except ValueError as e:
+            self.log_to_dashboard(f"Error: Invalid input. Please check your parameters. Details: {e}")
+            return None
+        return params
+
+    def get_supervisor(self, client):
+        """The supervisor for `client`, replacing the previous one if the keys or environment changed."""
+        if self.supervisor is not None and self.supervisor.client is not client:
+            self.supervisor.shutdown()
+            self.supervisor = None
+        if self.supervisor is None:
+            self.supervisor = BotSupervisor(client, self.gui_queue, journal=self.journal).start()
+        return self.supervisor
+
+    def start_bot(self):
+        """Validates inputs and starts the bot under the supervisor."""
+        if self.bot_running:
+            self.log_to_dashboard("Bot is already running.")
+            return
+
+        params = self.read_grid_params()
+        if params is None:
+            return
+
+        client = self.get_binance_client()
+        if not client:
+            self.log_to_dashboard("Error: Binance API keys are required.")
+            return
+
+        try:
+            self.bot_pair = self.get_supervisor(client).add_bot(params)
+        except ValueError as e:
+            self.log_to_dashboard(f"Error: {e}")
+            return
+        self.bot_running = True
+        self.toggle_controls_state()
+
+        self.log_to_dashboard("Bot has been started.")
+
+    def update_running_grid(self):
+        """Moves the running grid to the bounds, density and investment in the form."""
+        if not self.bot_running:
+            self.log_to_dashboard("Bot is not currently running.")
+            return
+        params = self.read_grid_params()
+        if params is None:
+            return
+        if params['pair'] != self.bot_pair:
+            self.log_to_dashboard(f"Error: The running grid trades {self.bot_pair}; stop it to trade {params['pair']}.")
+            return
+        try:
+            self.supervisor.regrid(self.bot_pair, params)
+        except ValueError as e:
+            self.log_to_dashboard(f"Error: {e} Wait for the grid to finish starting.")
+            return
+        self.log_to_dashboard("Updating the running grid...")
+
+    def stop_bot(self, detach=False):
+        """Asks the supervisor to stop the bot without blocking the GUI. With detach its orders stay open."""
+        if not self.bot_running:
+            self.log_to_dashboard("Bot is not currently running.")
+            return
+
+        if detach:
+            self.log_to_dashboard("Stopping bot... Its orders stay open and the grid resumes on the next start.")
+        else:
+            self.log_to_dashboard("Stopping bot... Please wait for open orders to be cancelled.")
+        self.stop_bot_button.configure(state="disabled")
+        self.detach_bot_button.configure(state="disabled")
+        self.update_grid_button.configure(state="disabled")
+        self.supervisor.stop_bot(self.bot_pair, detach=detach)
+        self.after(50, self.wait_for_bot_stop)
+
+    def wait_for_bot_stop(self):
+        """Polls the supervisor from the Tk loop until the bot's cleanup has finished."""
+        if self.supervisor.state(self.bot_pair) not in ('stopped', 'error'):
+            self.after(50, self.wait_for_bot_stop)
+            return
+        self.bot_running = False
+        self.toggle_controls_state()
+        self.log_to_dashboard("Bot has been stopped.")
+
+    def toggle_controls_state(self):
+        """Enables/disables GUI controls based on bot status."""
+        state = "disabled" if self.bot_running else "normal"
+        self.start_bot_button.configure(state=("disabled" if self.bot_running else "normal"))
+        self.stop_bot_button.configure(state=("normal" if self.bot_running else "disabled"))
+        self.detach_bot_button.configure(state=("normal" if self.bot_running and self.journal else "disabled"))
+        self.update_grid_button.configure(state=("normal" if self.bot_running else "disabled"))
+        
+        # Disable all configuration entries when bot is running
+        self.api_key_entry.configure(state=state)
+        self.api_secret_entry.configure(state=state)
+        self.env_selection.configure(state=state)
+        self.gemini_api_key_entry.configure(state=state)
+        self.find_opportunity_button.configure(state=state)
+        self.optimize_button.configure(state=state)
+        self.pair_entry.configure(state=state)
+        # Bounds, density and investment stay editable so a running grid can be updated
+
+
+if __name__ == "__main__":
+    app = BinanceGridBotApp()
+    app.mainloop()
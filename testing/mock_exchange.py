@@ -0,0 +1,541 @@
+"""
+Offline stand-ins for Binance, used by the test suite and benchmark.py.
+
+`MockExchange` replaces the python-binance Client and `FakeUserDataStreamServer` the
+user-data WebSocket stream, so a GridBot can be driven end to end without a network.
+"""
+import asyncio
+import bisect
+import heapq
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+import numpy as np
+import websockets
+from binance.exceptions import BinanceAPIException
+from binance.helpers import date_to_milliseconds, interval_to_milliseconds
+
+
+class FakeUserDataStreamServer:
+    """
+    Local stand-in for the Binance user-data stream, for testing the fill path offline.
+
+    Start it, point a UserDataStream (or GridBot) at `server.url` via `stream_url`, and
+    call `push_fill()` to deliver executionReport events to every connected client.
+    `drop_connections()` closes all sockets to exercise the reconnect path.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.url = None
+        self._clients = set()
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        return self
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def client_count(self):
+        return len(self._clients)
+
+    def push_event(self, event):
+        """Broadcasts a raw event dict to all connected clients."""
+        message = json.dumps(event)
+        asyncio.run_coroutine_threadsafe(self._broadcast(message), self._loop).result(timeout=5)
+
+    def push_fill(self, symbol, order_id, side, price, qty):
+        """Broadcasts an executionReport for a fully filled limit order."""
+        now = int(time.time() * 1000)
+        self.push_event({
+            'e': 'executionReport', 'E': now, 's': symbol, 'c': f"fake{order_id}",
+            'S': side, 'o': 'LIMIT', 'f': 'GTC', 'q': str(qty), 'p': str(price),
+            'x': 'TRADE', 'X': 'FILLED', 'i': order_id, 'l': str(qty), 'z': str(qty),
+            'Z': str(price * qty), 'L': str(price), 'n': '0', 'N': None, 'T': now
+        })
+
+    def drop_connections(self):
+        asyncio.run_coroutine_threadsafe(self._close_all(), self._loop).result(timeout=5)
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(self._start_server())
+        port = list(self._server.sockets)[0].getsockname()[1]
+        self.url = f"ws://{self.host}:{port}/ws/"
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    async def _start_server(self):
+        return await websockets.serve(self._handler, self.host, self.port)
+
+    async def _handler(self, ws, path=None):
+        self._clients.add(ws)
+        try:
+            await ws.wait_closed()
+        finally:
+            self._clients.discard(ws)
+
+    async def _broadcast(self, message):
+        for ws in list(self._clients):
+            await ws.send(message)
+
+    async def _close_all(self):
+        for ws in list(self._clients):
+            await ws.close()
+
+
+class MockExchange:
+    """
+    In-process stand-in for the python-binance Client, for offline tests and benchmarks.
+
+    Each symbol follows a replayable price path (one price per `interval`); `step()`
+    advances the market and fills resting limit orders in price-time priority at their
+    limit price, while orders that cross the current price fill at once. Orders are
+    checked against tick/step/min-notional filters, every call can be delayed by a fixed
+    or random latency, and request weight and order counts are limited over sliding
+    windows, answering with the same 429/-1003 errors and usage headers as Binance.
+    Fills are reported by get_my_trades and, as executionReport events, to subscribers
+    (e.g. `FakeUserDataStreamServer.push_event`).
+    """
+    WEIGHTS = {
+        'get_exchange_info': 20, 'get_symbol_info': 20, 'get_klines': 2, 'get_historical_klines': 2,
+        'get_symbol_ticker': 2, 'get_ticker': 2, 'create_order': 1, 'get_order': 4,
+        'get_open_orders': 6, 'get_all_orders': 20, 'cancel_order': 1, 'cancel_all_open_orders': 1,
+        'cancel_replace_order': 1, 'get_my_trades': 20,
+    }
+    # Weight of the all-symbol variants of the ticker endpoints
+    ALL_SYMBOLS_WEIGHTS = {'get_symbol_ticker': 4, 'get_ticker': 80}
+    DEFAULT_FILTERS = {'tick_size': '0.01', 'step_size': '0.00001', 'min_qty': '0.00001', 'min_notional': '5'}
+    FEE_RATE = 0.001
+    WEIGHT_PER_MINUTE = 6000
+    ORDERS_PER_10S = 100
+
+    def __init__(self, prices, interval='1m', start_ms=0, filters=None, latency=0.0,
+                 weight_per_minute=WEIGHT_PER_MINUTE, orders_per_10s=ORDERS_PER_10S,
+                 volume_per_step=1.0, testnet=True):
+        self.paths = {symbol: np.asarray(path, dtype=float) for symbol, path in prices.items()}
+        self.position = {symbol: 0 for symbol in self.paths}
+        self.interval = interval
+        self.interval_ms = interval_to_milliseconds(interval)
+        self.start_ms = start_ms
+        self.filters = {symbol: dict(self.DEFAULT_FILTERS, **(filters or {}).get(symbol, {})) for symbol in self.paths}
+        self.latency = latency
+        self.weight_per_minute = weight_per_minute
+        self.orders_per_10s = orders_per_10s
+        self.volume_per_step = volume_per_step
+        self.testnet = testnet
+        self.response = None
+        self.orders = {}
+        self.trades = {symbol: [] for symbol in self.paths}
+        self.request_count = 0
+        self._books = {symbol: ([], []) for symbol in self.paths}  # (bids, asks) heaps
+        self._weights = deque()
+        self._used_weight = 0
+        self._order_times = deque()
+        self._open_client_ids = set()
+        self._subscribers = []
+        self._next_order_id = 1
+        self._next_trade_id = 1
+        self._sequence = 0
+        self._lock = threading.RLock()
+
+    # --- Market control ---
+
+    def subscribe(self, callback):
+        """Calls `callback(event)` with an executionReport dict for every fill."""
+        self._subscribers.append(callback)
+
+    def price(self, symbol):
+        return float(self.paths[symbol][self.position[symbol]])
+
+    def now_ms(self, symbol=None):
+        """Exchange clock: the open time of the current step of the path."""
+        position = self.position[symbol] if symbol else max(self.position.values(), default=0)
+        return self.start_ms + position * self.interval_ms
+
+    def step(self, n=1):
+        """Advances every path by up to n steps, matching resting orders at each price. Returns the fills."""
+        fills = []
+        for _ in range(n):
+            step_fills = []
+            with self._lock:
+                for symbol, path in self.paths.items():
+                    if self.position[symbol] + 1 < len(path):
+                        self.position[symbol] += 1
+                        step_fills.extend(self._match(symbol, self.price(symbol)))
+            self._publish(step_fills)
+            fills.extend(step_fills)
+        return fills
+
+    def set_price(self, symbol, price):
+        """Moves one symbol to `price` at the current step and matches its book."""
+        with self._lock:
+            self.paths[symbol][self.position[symbol]] = price
+            fills = self._match(symbol, price)
+        self._publish(fills)
+        return fills
+
+    def exhausted(self):
+        return all(self.position[s] + 1 >= len(p) for s, p in self.paths.items())
+
+    # --- Client API: market data ---
+
+    def ping(self):
+        self._request('ping', 1)
+        return {}
+
+    def get_server_time(self):
+        self._request('get_server_time', 1)
+        return {'serverTime': int(time.time() * 1000)}
+
+    def get_exchange_info(self):
+        self._request('get_exchange_info')
+        return {'symbols': [self._symbol_info(symbol) for symbol in self.paths]}
+
+    def get_symbol_info(self, symbol):
+        self._request('get_symbol_info')
+        return self._symbol_info(symbol) if symbol in self.paths else None
+
+    def get_symbol_ticker(self, symbol=None):
+        self._request('get_symbol_ticker', None if symbol else self.ALL_SYMBOLS_WEIGHTS['get_symbol_ticker'])
+        with self._lock:
+            if symbol:
+                return {'symbol': symbol, 'price': self._fmt(self.price(symbol))}
+            return [{'symbol': s, 'price': self._fmt(self.price(s))} for s in self.paths]
+
+    def get_ticker(self, symbol=None):
+        """24h statistics over the last day of each path."""
+        self._request('get_ticker', None if symbol else self.ALL_SYMBOLS_WEIGHTS['get_ticker'])
+        with self._lock:
+            symbols = [symbol] if symbol else list(self.paths)
+            tickers = [self._ticker(s) for s in symbols]
+        return tickers[0] if symbol else tickers
+
+    def get_klines(self, symbol, interval, startTime=None, endTime=None, limit=500):
+        self._request('get_klines')
+        with self._lock:
+            return self._klines(symbol, interval, startTime, endTime, min(limit, 1000))
+
+    def get_historical_klines(self, symbol, interval, start_str=None, end_str=None, limit=None):
+        """All klines between two times (ms or date strings), paged like the real client."""
+        start_ms = self._to_ms(start_str) if start_str is not None else 0
+        end_ms = self._to_ms(end_str) if end_str is not None else None
+        klines = []
+        step = interval_to_milliseconds(interval)
+        while True:
+            self._request('get_historical_klines')
+            with self._lock:
+                page = self._klines(symbol, interval, start_ms, end_ms, 1000)
+            klines.extend(page)
+            if len(page) < 1000 or (limit and len(klines) >= limit):
+                return klines[:limit] if limit else klines
+            start_ms = page[-1][0] + step
+
+    # --- Client API: orders ---
+
+    def create_order(self, **params):
+        self._request('create_order', orders=1)
+        with self._lock:
+            self._validate_new(params)
+            result, fills = self._new_order(params)
+        self._publish(fills)
+        return result
+
+    def cancel_replace_order(self, **params):
+        """Cancels cancelOrderId and places the new order, with STOP_ON_FAILURE semantics."""
+        self._request('cancel_replace_order', orders=1)
+        with self._lock:
+            self._validate_new(params)
+            order = self.orders.get(int(params['cancelOrderId']))
+            if order is None or order['symbol'] != params['symbol'] or order['status'] != 'NEW':
+                self._reject(-2022, "Order cancel-replace failed.")
+            self._close(order, 'CANCELED')
+            result, fills = self._new_order(params)
+        self._publish(fills)
+        return {'cancelResult': 'SUCCESS', 'newOrderResult': 'SUCCESS',
+                'cancelResponse': dict(order), 'newOrderResponse': result}
+
+    def _validate_new(self, params):
+        symbol = params['symbol']
+        if symbol not in self.paths:
+            self._reject(-1121, "Invalid symbol.")
+        if params.get('newClientOrderId') in self._open_client_ids:
+            self._reject(-2010, "Duplicate order sent.")
+        self._check_filters(symbol, float(params['price']), float(params['quantity']))
+
+    def _new_order(self, params):
+        """Adds a validated limit order to the book. Returns it and any fills it caused."""
+        symbol = params['symbol']
+        client_order_id = params.get('newClientOrderId') or f"mock{uuid.uuid4().hex[:16]}"
+        price, qty = float(params['price']), float(params['quantity'])
+        self._sequence += 1
+        now = self.now_ms(symbol)
+        order = {
+            'symbol': symbol, 'orderId': self._next_order_id, 'clientOrderId': client_order_id,
+            'price': self._fmt(price), 'origQty': self._fmt(qty), 'executedQty': '0',
+            'status': 'NEW', 'timeInForce': params.get('timeInForce', 'GTC'),
+            'type': params.get('type', 'LIMIT'), 'side': params['side'], 'time': now, 'updateTime': now,
+            'transactTime': now,
+        }
+        self._next_order_id += 1
+        self.orders[order['orderId']] = order
+        self._open_client_ids.add(client_order_id)
+        bids, asks = self._books[symbol]
+        if order['side'] == 'BUY':
+            heapq.heappush(bids, (-price, self._sequence, order['orderId']))
+        else:
+            heapq.heappush(asks, (price, self._sequence, order['orderId']))
+        # Marketable orders take the current price straight away
+        fills = self._match(symbol, self.price(symbol), taker=order['orderId'])
+        return dict(order), fills
+
+    def get_order(self, symbol, orderId):
+        self._request('get_order')
+        with self._lock:
+            return dict(self._order(symbol, orderId))
+
+    def get_open_orders(self, symbol=None):
+        self._request('get_open_orders', None if symbol else 80)
+        with self._lock:
+            return [dict(o) for o in self.orders.values()
+                    if o['status'] == 'NEW' and (symbol is None or o['symbol'] == symbol)]
+
+    def get_all_orders(self, symbol, orderId=None, limit=500):
+        self._request('get_all_orders')
+        with self._lock:
+            orders = [o for o in self.orders.values()
+                      if o['symbol'] == symbol and (orderId is None or o['orderId'] >= orderId)]
+            return [dict(o) for o in (orders[:limit] if orderId is not None else orders[-limit:])]
+
+    def cancel_order(self, symbol, orderId):
+        self._request('cancel_order')
+        with self._lock:
+            order = self._order(symbol, orderId)
+            if order['status'] != 'NEW':
+                self._reject(-2011, "Unknown order sent.")
+            self._close(order, 'CANCELED')
+            return dict(order)
+
+    def cancel_all_open_orders(self, symbol):
+        self._request('cancel_all_open_orders')
+        with self._lock:
+            cancelled = [o for o in self.orders.values() if o['symbol'] == symbol and o['status'] == 'NEW']
+            if not cancelled:
+                self._reject(-2011, "Unknown order sent.")
+            for order in cancelled:
+                self._close(order, 'CANCELED')
+            return [dict(o) for o in cancelled]
+
+    def get_my_trades(self, symbol, fromId=None, limit=500):
+        self._request('get_my_trades')
+        with self._lock:
+            trades = self.trades[symbol]
+            if fromId is None:
+                return [dict(t) for t in trades[-limit:]]
+            start = bisect.bisect_left([t['id'] for t in trades], fromId)
+            return [dict(t) for t in trades[start:start + limit]]
+
+    # --- Client API: user-data stream ---
+
+    def stream_get_listen_key(self):
+        self._request('stream_get_listen_key', 2)
+        return "mock-listen-key"
+
+    def stream_keepalive(self, listenKey):
+        self._request('stream_keepalive', 2)
+
+    def stream_close(self, listenKey):
+        self._request('stream_close', 2)
+
+    # --- Internals ---
+
+    def _request(self, name, weight=None, orders=0):
+        """Applies latency and the sliding-window limits, and sets the usage headers."""
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        weight = self.WEIGHTS.get(name, 1) if weight is None else weight
+        with self._lock:
+            now = time.monotonic()
+            while self._weights and now - self._weights[0][0] >= 60:
+                self._used_weight -= self._weights.popleft()[1]
+            while self._order_times and now - self._order_times[0] >= 10:
+                self._order_times.popleft()
+            used = self._used_weight + weight
+            order_count = len(self._order_times) + orders
+            self.request_count += 1
+            headers = {'x-mbx-used-weight-1m': str(used), 'x-mbx-order-count-10s': str(order_count)}
+            if used > self.weight_per_minute:
+                retry_after = 60 - (now - self._weights[0][0]) if self._weights else 1
+                self._reject(-1003, "Too much request weight used.", 429, dict(headers, **{'Retry-After': f"{max(retry_after, 0.1):.1f}"}))
+            if order_count > self.orders_per_10s:
+                self._reject(-1015, "Too many new orders.", 429, dict(headers, **{'Retry-After': '1'}))
+            self._weights.append((now, weight))
+            self._used_weight += weight
+            if orders:
+                self._order_times.append(now)
+            self.response = MockResponse(headers)
+
+    def _reject(self, code, message, status_code=400, headers=None):
+        response = MockResponse(headers or getattr(self.response, 'headers', {}), status_code,
+                                json.dumps({'code': code, 'msg': message}))
+        self.response = response
+        raise BinanceAPIException(response, status_code, response.text)
+
+    def _close(self, order, status):
+        order['status'] = status
+        self._open_client_ids.discard(order['clientOrderId'])
+
+    def _order(self, symbol, order_id):
+        order = self.orders.get(int(order_id))
+        if order is None or order['symbol'] != symbol:
+            self._reject(-2013, "Order does not exist.")
+        return order
+
+    def _check_filters(self, symbol, price, qty):
+        f = self.filters[symbol]
+        tick, step = float(f['tick_size']), float(f['step_size'])
+        if abs(price / tick - round(price / tick)) > 1e-6:
+            self._reject(-1013, "Filter failure: PRICE_FILTER")
+        if abs(qty / step - round(qty / step)) > 1e-6 or qty < float(f['min_qty']):
+            self._reject(-1013, "Filter failure: LOT_SIZE")
+        if price * qty < float(f['min_notional']):
+            self._reject(-1013, "Filter failure: NOTIONAL")
+
+    def _match(self, symbol, price, taker=None):
+        """Fills resting orders the price has reached, best price first, then oldest."""
+        bids, asks = self._books[symbol]
+        fills = []
+        while bids and -bids[0][0] >= price:
+            _, _, order_id = heapq.heappop(bids)
+            fills.extend(self._fill(order_id, price if order_id == taker else None))
+        while asks and asks[0][0] <= price:
+            _, _, order_id = heapq.heappop(asks)
+            fills.extend(self._fill(order_id, price if order_id == taker else None))
+        return fills
+
+    def _fill(self, order_id, taker_price=None):
+        order = self.orders[order_id]
+        if order['status'] != 'NEW':
+            return []  # Cancelled while resting; dropped lazily
+        price = taker_price if taker_price is not None else float(order['price'])
+        qty = float(order['origQty'])
+        now = self.now_ms(order['symbol'])
+        self._close(order, 'FILLED')
+        order.update(executedQty=order['origQty'], updateTime=now)
+        # Like Binance without BNB fees: buyers pay in the base asset, sellers in the quote asset
+        info = self._symbol_info(order['symbol'])
+        if order['side'] == 'BUY':
+            commission, commission_asset = qty * self.FEE_RATE, info['baseAsset']
+        else:
+            commission, commission_asset = price * qty * self.FEE_RATE, info['quoteAsset']
+        trade = {
+            'symbol': order['symbol'], 'id': self._next_trade_id, 'orderId': order_id,
+            'price': self._fmt(price), 'qty': order['origQty'], 'quoteQty': self._fmt(price * qty),
+            'commission': self._fmt(commission), 'commissionAsset': commission_asset,
+            'time': now, 'isBuyer': order['side'] == 'BUY', 'isMaker': taker_price is None,
+        }
+        self._next_trade_id += 1
+        self.trades[order['symbol']].append(trade)
+        return [(order, trade)]
+
+    def _publish(self, fills):
+        if not self._subscribers:
+            return
+        for order, trade in fills:
+            event = {
+                'e': 'executionReport', 'E': trade['time'], 's': order['symbol'], 'c': order['clientOrderId'],
+                'S': order['side'], 'o': order['type'], 'f': order['timeInForce'], 'q': order['origQty'],
+                'p': order['price'], 'x': 'TRADE', 'X': 'FILLED', 'i': order['orderId'], 'l': trade['qty'],
+                'z': order['executedQty'], 'Z': trade['quoteQty'], 'L': trade['price'], 'n': trade['commission'],
+                'N': trade['commissionAsset'], 'T': trade['time'], 't': trade['id'],
+            }
+            for callback in self._subscribers:
+                callback(event)
+
+    def _symbol_info(self, symbol):
+        f = self.filters[symbol]
+        base = symbol[:-4] if symbol.endswith('USDT') else symbol[:-3]
+        return {
+            'symbol': symbol, 'status': 'TRADING', 'baseAsset': base, 'quoteAsset': symbol[len(base):],
+            'cancelReplaceAllowed': True,
+            'filters': [
+                {'filterType': 'PRICE_FILTER', 'minPrice': f['tick_size'], 'maxPrice': '1000000', 'tickSize': f['tick_size']},
+                {'filterType': 'LOT_SIZE', 'minQty': f['min_qty'], 'maxQty': '9000000', 'stepSize': f['step_size']},
+                {'filterType': 'NOTIONAL', 'minNotional': f['min_notional']},
+            ],
+        }
+
+    def _ticker(self, symbol):
+        position = self.position[symbol]
+        window = max(1, 24 * 60 * 60 * 1000 // self.interval_ms)
+        prices = self.paths[symbol][max(0, position - window + 1):position + 1]
+        volume = self.volume_per_step * len(prices)
+        return {
+            'symbol': symbol, 'lastPrice': self._fmt(prices[-1]), 'openPrice': self._fmt(prices[0]),
+            'highPrice': self._fmt(prices.max()), 'lowPrice': self._fmt(prices.min()),
+            'priceChangePercent': f"{(prices[-1] / prices[0] - 1) * 100:.3f}",
+            'volume': self._fmt(volume), 'quoteVolume': self._fmt(volume * prices.mean()),
+        }
+
+    def _klines(self, symbol, interval, start_ms, end_ms, limit):
+        """Candles aggregated from the path up to the current step (the last one may be open)."""
+        per_candle = interval_to_milliseconds(interval) // self.interval_ms
+        if per_candle < 1:
+            raise ValueError(f"MockExchange paths are {self.interval}; cannot serve {interval} klines")
+        candle_ms = per_candle * self.interval_ms
+        path = self.paths[symbol][:self.position[symbol] + 1]
+        first = 0 if start_ms is None else max(0, -(-(start_ms - self.start_ms) // candle_ms))
+        last = (len(path) - 1) // per_candle
+        if end_ms is not None:
+            last = min(last, (end_ms - self.start_ms) // candle_ms)
+        rows = []
+        for candle in range(first, min(last + 1, first + limit)):
+            chunk = path[candle * per_candle:(candle + 1) * per_candle]
+            open_time = self.start_ms + candle * candle_ms
+            volume = self.volume_per_step * len(chunk)
+            rows.append([
+                open_time, self._fmt(chunk[0]), self._fmt(chunk.max()), self._fmt(chunk.min()),
+                self._fmt(chunk[-1]), self._fmt(volume), open_time + candle_ms - 1,
+                self._fmt(volume * chunk.mean()), len(chunk), '0', '0', '0',
+            ])
+        return rows
+
+    @staticmethod
+    def _to_ms(value):
+        if isinstance(value, (int, float)) or str(value).isdigit():
+            return int(value)
+        return date_to_milliseconds(value)
+
+    @staticmethod
+    def _fmt(value):
+        return f"{value:.8f}"
+
+
+class MockResponse:
+    """Minimal requests.Response stand-in carrying status, headers and body."""
+
+    def __init__(self, headers=None, status_code=200, text=''):
+        self.headers = headers or {}
+        self.status_code = status_code
+        self.text = text
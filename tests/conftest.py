@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import bot
+from testing.mock_exchange import MockExchange
+
+PAIR = "BTCUSDT"
+
+
+def grid_params(grids=10, lower=90.0, upper=110.0, **extra):
+    return dict({'pair': PAIR, 'lower_bound': lower, 'upper_bound': upper, 'grids': grids,
+                 'investment': 20.0 * grids}, **extra)
+
+
+def stream_fills(exchange, grid_bot):
+    """Feeds every mock fill to the bot as the user-data stream would."""
+    exchange.subscribe(lambda event: grid_bot.handle_filled_order(bot.UserDataStream.execution_report_to_order(event)))
+
+
+def assert_book_matches(exchange, grid_bot):
+    live = {int(o['orderId']) for o in exchange.get_open_orders(symbol=PAIR)}
+    assert set(grid_bot.book.open_orders()) == live
+
+
+@pytest.fixture(autouse=True)
+def unthrottled(monkeypatch):
+    """Fresh symbol metadata and no client-side rate limiting for every test."""
+    monkeypatch.setattr(bot, 'rate_limiter', bot.RateLimiter(weight_per_minute=10 ** 9, orders_per_10s=10 ** 9))
+    bot.symbol_cache.invalidate()
+
+
+@pytest.fixture
+def exchange():
+    return MockExchange({PAIR: np.full(1000, 100.0)}, weight_per_minute=10 ** 9, orders_per_10s=10 ** 9)
+
+
+@pytest.fixture
+def grid_bot(exchange):
+    grid_bot = bot.GridBot(exchange, grid_params(), None)
+    grid_bot.setup_grid(100.0)
+    return grid_bot
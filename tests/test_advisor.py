@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+
+import bot
+
+MARKET = [
+    {'pair': 'BTCUSDT', 'current_price': '100.0000', 'support': '90.0000', 'resistance': '110.0000',
+     'atr_percentage': '1.50%', 'is_ranging': True, 'band_crossings': 8, 'realized_volatility': '40.00%'},
+    {'pair': 'ETHUSDT', 'current_price': '10.0000', 'support': '8.0000', 'resistance': '12.0000',
+     'atr_percentage': '3.00%', 'is_ranging': False, 'band_crossings': 2, 'realized_volatility': '60.00%'},
+]
+ANSWER = {'trading_pair': 'BTCUSDT', 'lower_bound': 91, 'upper_bound': 109, 'grid_density': 30,
+          'justification': 'stub'}
+
+
+class Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Answers every prompt with ANSWER, optionally after `gate` is set."""
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        return Reply("```json\n" + json.dumps(ANSWER) + "\n```")
+
+
+def advisor(model, **kwargs):
+    models = []
+
+    def factory(api_key):
+        models.append(api_key)
+        return model
+    return bot.GeminiAdvisor(model_factory=factory, log=lambda message: None, **kwargs), models
+
+
+def test_identical_requests_in_flight_share_one_call():
+    gate = threading.Event()
+    model = StubModel(gate)
+    gemini, _ = advisor(model)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gemini.recommend(MARKET, 'key'))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert model.calls == 1
+    assert [r['trading_pair'] for r in results] == ['BTCUSDT'] * 3
+    assert results[0]['lower_bound'] == '91'
+
+
+def test_answers_are_cached_per_key_until_the_ttl():
+    model = StubModel()
+    gemini, models = advisor(model, cache_ttl=0.2)
+    gemini.recommend(MARKET, 'key-a')
+    time.sleep(0.05)
+    gemini.recommend(MARKET, 'key-a')
+    assert model.calls == 1
+    # Another account never gets key-a's cached answer
+    gemini.recommend(MARKET, 'key-b')
+    assert model.calls == 2 and models == ['key-a', 'key-b']
+    time.sleep(0.25)
+    gemini.recommend(MARKET, 'key-a')
+    assert model.calls == 3
+
+
+def test_timeout_falls_back_to_the_local_ranking():
+    gate = threading.Event()
+    gemini, _ = advisor(StubModel(gate), timeout=0.05)
+    recommendation = gemini.recommend(MARKET, 'key')
+    gate.set()
+    assert recommendation == bot.GeminiAdvisor.fallback(MARKET)
+    assert recommendation['trading_pair'] == 'BTCUSDT'
+    assert recommendation['lower_bound'] == '90.0000'
+
+
+def test_hung_calls_do_not_hold_up_later_requests():
+    gate = threading.Event()
+    slow, fast = StubModel(gate), StubModel()
+    gemini = bot.GeminiAdvisor(model_factory=lambda key: slow if key.startswith('slow') else fast,
+                               timeout=0.5, log=lambda message: None)
+    for key in ('slow-1', 'slow-2', 'slow-3'):
+        gemini.timeout = 0.01
+        gemini.recommend(MARKET, key)
+    gemini.timeout = 0.5
+    started = time.perf_counter()
+    recommendation = gemini.recommend(MARKET, 'fast')
+    gate.set()
+    assert recommendation['justification'] == 'stub'
+    assert time.perf_counter() - started < 0.4
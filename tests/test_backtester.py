@@ -0,0 +1,42 @@
+import pytest
+
+import bot
+from conftest import PAIR, grid_params
+
+
+def test_round_trips_fees_and_drawdown_on_a_hand_checked_path():
+    # Levels 90, 95, 100, 105, 110 with 100 quote per order; 100 stays empty at the start
+    result = bot.GridBacktester(90.0, 110.0, 5, 400.0).run_prices([100.0, 94.0, 100.0, 106.0, 100.0])
+    buy_95, sell_105 = 100.0 / 95, 100.0 / 105
+    # Buy at 95 -> sold at 100; sell at 105 -> bought back at 100
+    assert result['fills'] == 4
+    assert result['round_trips'] == 2
+    assert result['grid_profit'] == pytest.approx((buy_95 + sell_105) * 5.0)
+    assert result['fees'] == pytest.approx(0.001 * (buy_95 * 95 + buy_95 * 100 + sell_105 * 105 + sell_105 * 100))
+    # Back at the start price with the start inventory, so P&L is the grid profit net of fees
+    assert result['pnl'] == pytest.approx(result['grid_profit'] - result['fees'])
+    # Deepest point is the dip to 94: initial sells lose 6 each, the fresh buy at 95 loses 1
+    initial_inventory = 100.0 / 105 + 100.0 / 110
+    assert result['max_drawdown'] == pytest.approx(initial_inventory * 6 + buy_95 * 1 + 0.1)
+    assert result['final_inventory'] == pytest.approx(initial_inventory)
+
+
+def test_levels_and_sides_match_the_live_grid(exchange):
+    params = grid_params(grids=11)
+    grid_bot = bot.GridBot(exchange, params, None)
+    grid_bot.setup_grid(100.0)
+    backtester = bot.GridBacktester(params['lower_bound'], params['upper_bound'], params['grids'],
+                                    params['investment'], step_size=grid_bot.ladder.step_size)
+    assert [grid_bot.book.price(level) for level in range(len(grid_bot.book))] == pytest.approx(
+        backtester.levels.tolist())
+
+    skipped = grid_bot.book.nearest_level(100.0)
+    quantities = backtester.initial_quantities()
+    for level in range(len(grid_bot.book)):
+        expected = None if level == skipped else ('BUY' if level < skipped else 'SELL')
+        assert grid_bot.book.side_at(level) == expected
+        if expected:
+            assert grid_bot.book.qty[level] == pytest.approx(quantities[level], abs=grid_bot.ladder.step_size)
+    sells = [o for o in exchange.get_open_orders(symbol=PAIR) if o['side'] == 'SELL']
+    assert grid_bot.ledger.inventory == pytest.approx(sum(float(o['origQty']) for o in sells))
+    assert backtester.run_prices([100.0])['final_inventory'] == pytest.approx(grid_bot.ledger.inventory, abs=1e-4)
@@ -0,0 +1,123 @@
+import os
+import time
+
+import numpy as np
+
+import bot
+from conftest import PAIR
+from testing.mock_exchange import MockExchange
+
+MINUTE_MS = 60 * 1000
+FOUR_HOURS_MS = 4 * 60 * MINUTE_MS
+DAY_MS = 24 * 60 * MINUTE_MS
+
+
+class MaintenanceExchange(MockExchange):
+    """Serves no candles inside `maintenance`, like the gaps Binance leaves after downtime."""
+    maintenance = (0, -1)
+
+    def _klines(self, symbol, interval, start_ms, end_ms, limit):
+        # Like Binance, a page skips the missing candles but still holds `limit` rows
+        rows = super()._klines(symbol, interval, start_ms, end_ms, len(self.paths[symbol]))
+        return [row for row in rows if not self.maintenance[0] <= row[0] <= self.maintenance[1]][:limit]
+
+
+def minute_market(days=31, exchange_class=MockExchange):
+    """A mock exchange whose 1m path ends now and starts `days` ago on a 4h boundary."""
+    now = int(time.time() * 1000)
+    start = (now - days * DAY_MS) // FOUR_HOURS_MS * FOUR_HOURS_MS
+    steps = (now - start) // MINUTE_MS + 1
+    exchange = exchange_class({PAIR: 100 + np.sin(np.arange(steps) / 500)}, start_ms=start,
+                              weight_per_minute=10 ** 9, orders_per_10s=10 ** 9)
+    exchange.position[PAIR] = steps - 1
+    return exchange, now - (days - 1) * DAY_MS
+
+
+def test_cold_scan_downloads_the_requested_interval(tmp_path):
+    exchange, start_ms = minute_market()
+    store = bot.CandleStore(str(tmp_path))
+    candles = store.candles(bot.KlineFetcher(exchange), PAIR, '4h', start_ms)
+    assert exchange.request_count == 1
+    assert 179 <= len(candles) <= 181
+    assert np.all(candles['open_time'] % FOUR_HOURS_MS == 0)
+    assert os.path.exists(store._file(PAIR, '4h'))
+    assert len(store.load(PAIR, '1m')) == 0
+
+    store.candles(bot.KlineFetcher(exchange), PAIR, '4h', start_ms)
+    assert exchange.request_count <= 2
+
+
+def test_stored_base_series_is_resampled(tmp_path):
+    exchange, start_ms = minute_market()
+    store = bot.CandleStore(str(tmp_path))
+    fetcher = bot.KlineFetcher(exchange)
+    minutes = store.candles(fetcher, PAIR, '1m', start_ms)
+    requests = exchange.request_count
+    candles = store.candles(fetcher, PAIR, '4h', start_ms)
+    assert exchange.request_count - requests <= 1
+    assert not os.path.exists(store._file(PAIR, '4h'))
+    assert candles['close'][-1] == minutes['close'][-1]
+
+
+def test_resample_aggregates_each_bucket():
+    minutes = bot.CandleStore.to_records([
+        [i * MINUTE_MS, str(o), str(h), str(lo), str(c), '1', 0, str(c)]
+        for i, (o, h, lo, c) in enumerate([(10, 12, 9, 11), (11, 15, 10, 14), (14, 14, 8, 9), (9, 10, 9, 10)])
+    ])
+    candles = bot.CandleStore.resample(minutes, 2 * MINUTE_MS)
+    assert candles['open_time'].tolist() == [0, 2 * MINUTE_MS]
+    assert candles['open'].tolist() == [10, 14]
+    assert candles['high'].tolist() == [15, 14]
+    assert candles['low'].tolist() == [9, 8]
+    assert candles['close'].tolist() == [14, 10]
+    assert candles['volume'].tolist() == [2, 2]
+    assert candles['quote_volume'].tolist() == [25, 19]
+
+
+def test_unclosed_candles_are_not_stored(tmp_path):
+    exchange, start_ms = minute_market(days=2)
+    store = bot.CandleStore(str(tmp_path))
+    fetcher = bot.KlineFetcher(exchange)
+    # The mock serves the candle that is still open at both intervals
+    assert fetcher.fetch(PAIR, '1m', exchange.now_ms(PAIR))[-1][0] == exchange.now_ms(PAIR)
+    for interval, step in (('1m', MINUTE_MS), ('4h', FOUR_HOURS_MS)):
+        store.sync(fetcher, PAIR, interval, start_ms)
+        last = int(store.load(PAIR, interval)['open_time'][-1])
+        assert last + step <= int(time.time() * 1000)
+
+
+def test_empty_range_before_listing_is_recorded(tmp_path):
+    exchange, start_ms = minute_market(days=2)
+    store = bot.CandleStore(str(tmp_path))
+    fetcher = bot.KlineFetcher(exchange)
+    before_listing = exchange.start_ms - DAY_MS
+    store.sync(fetcher, PAIR, '1m', before_listing)
+    assert not os.path.exists(store._file(PAIR, '1m') + ".holes.json")
+
+    store.sync(fetcher, PAIR, '1m', before_listing)
+    assert store._load_holes(PAIR, '1m') == [[before_listing // MINUTE_MS * MINUTE_MS, exchange.start_ms - 1]]
+    requests = exchange.request_count
+    store.sync(fetcher, PAIR, '1m', before_listing)
+    # Only the (empty or one-candle) tail is requested, not the known hole
+    assert exchange.request_count - requests <= 1
+
+
+def test_holes_inside_the_series_are_recorded_once(tmp_path):
+    exchange, start_ms = minute_market(days=2, exchange_class=MaintenanceExchange)
+    outage_start = exchange.start_ms + 600 * MINUTE_MS
+    exchange.maintenance = (outage_start, outage_start + 29 * MINUTE_MS)
+    store = bot.CandleStore(str(tmp_path))
+    fetcher = bot.KlineFetcher(exchange)
+    store.sync(fetcher, PAIR, '1m', exchange.start_ms)
+    stored = store.load(PAIR, '1m')
+    assert not np.isin(np.arange(outage_start, outage_start + 30 * MINUTE_MS, MINUTE_MS), stored['open_time']).any()
+
+    requests = exchange.request_count
+    store.sync(fetcher, PAIR, '1m', exchange.start_ms)
+    assert store._load_holes(PAIR, '1m') == [[outage_start, outage_start + 30 * MINUTE_MS - 1]]
+    assert exchange.request_count - requests <= 2
+
+    requests = exchange.request_count
+    store.sync(fetcher, PAIR, '1m', exchange.start_ms)
+    assert exchange.request_count - requests <= 1
+    assert len(store.load(PAIR, '1m')) >= len(stored)
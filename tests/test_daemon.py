@@ -0,0 +1,48 @@
+import json
+import os
+import signal
+import threading
+
+import pytest
+
+import bot
+from conftest import PAIR, grid_params
+from testing.mock_exchange import FakeUserDataStreamServer
+
+
+@pytest.fixture
+def daemon_config(tmp_path, monkeypatch, exchange):
+    server = FakeUserDataStreamServer().start()
+    exchange.subscribe(server.push_event)
+    monkeypatch.setattr(bot, 'client_from_config', lambda config: exchange)
+    monkeypatch.setattr(bot.UserDataStream, 'TESTNET_URL', server.url)
+    config = {'testnet': True, 'api_key': 'key', 'api_secret': 'secret', 'journal': str(tmp_path / "journal.sqlite3"), 'metrics_port': False,
+              'status_interval': 0.2, 'bots': [grid_params()]}
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(config))
+    yield str(path)
+    server.stop()
+
+
+def run_until_sigterm(argv, after=1.5):
+    timer = threading.Timer(after, os.kill, (os.getpid(), signal.SIGTERM))
+    timer.start()
+    try:
+        return bot.main(argv)
+    finally:
+        timer.cancel()
+
+
+def test_sigterm_detaches_the_grids(exchange, daemon_config):
+    assert run_until_sigterm(['--daemon', daemon_config]) == 0
+    live = exchange.get_open_orders(symbol=PAIR)
+    assert live
+
+    # A restarted daemon resumes the same orders
+    assert run_until_sigterm(['--daemon', daemon_config]) == 0
+    assert {o['orderId'] for o in exchange.get_open_orders(symbol=PAIR)} == {o['orderId'] for o in live}
+
+
+def test_cancel_on_exit_cancels_the_grids(exchange, daemon_config):
+    assert run_until_sigterm(['--daemon', daemon_config, '--cancel-on-exit']) == 0
+    assert exchange.get_open_orders(symbol=PAIR) == []
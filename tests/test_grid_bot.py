@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import bot
+from conftest import PAIR, assert_book_matches, grid_params, stream_fills
+from testing.mock_exchange import MockExchange
+
+
+def test_setup_places_ladder_around_price(exchange, grid_bot):
+    orders = exchange.get_open_orders(symbol=PAIR)
+    assert len(orders) == len(grid_bot.book) - 1
+    assert all(float(o['price']) < 100 for o in orders if o['side'] == 'BUY')
+    assert all(float(o['price']) > 100 for o in orders if o['side'] == 'SELL')
+    assert_book_matches(exchange, grid_bot)
+
+
+def test_ledger_holds_the_base_backing_initial_sells(exchange, grid_bot):
+    sells = [float(o['origQty']) for o in exchange.get_open_orders(symbol=PAIR) if o['side'] == 'SELL']
+    snapshot = grid_bot.ledger.snapshot()
+    # Matches GridBacktester, whose inventory starts at the sum of the initial sells
+    assert snapshot['inventory'] == pytest.approx(sum(sells))
+    assert snapshot['avg_cost'] == pytest.approx(100.0)
+    assert snapshot['fills'] == 0
+
+
+def test_buy_fill_places_sell_one_level_up(exchange, grid_bot):
+    stream_fills(exchange, grid_bot)
+    level = grid_bot.book.nearest_level(100.0) - 1
+    exchange.set_price(PAIR, grid_bot.book.price(level))
+    assert grid_bot.book.side_at(level) is None
+    assert grid_bot.book.side_at(level + 1) == 'SELL'
+    assert_book_matches(exchange, grid_bot)
+
+
+def test_price_sweeps_keep_book_in_sync():
+    path = np.concatenate([np.linspace(100, 89, 500), np.linspace(89, 111, 1000), np.linspace(111, 95, 800)])
+    exchange = MockExchange({PAIR: path}, weight_per_minute=10 ** 9, orders_per_10s=10 ** 9)
+    grid_bot = bot.GridBot(exchange, grid_params(), None)
+    grid_bot.setup_grid(100.0)
+    stream_fills(exchange, grid_bot)
+    while not exchange.exhausted():
+        exchange.step(50)
+    assert grid_bot.ledger.fills > 0
+    assert grid_bot.total_pnl > 0
+    assert_book_matches(exchange, grid_bot)
@@ -0,0 +1,70 @@
+import math
+
+import numpy as np
+import pytest
+
+import bot
+
+FOUR_HOURS_MS = 4 * 60 * 60 * 1000
+
+
+def candles(highs, lows, closes):
+    out = np.zeros(len(closes), dtype=bot.candle_dtype())
+    out['high'], out['low'], out['close'] = highs, lows, closes
+    out['open'] = np.r_[closes[0], closes[:-1]]
+    return out
+
+
+def ewm(values, span=14):
+    alpha = 2 / (span + 1)
+    average = values[0]
+    for value in values[1:]:
+        average += alpha * (value - average)
+    return average
+
+
+def test_metrics_match_hand_computed_values_for_series_of_different_lengths():
+    long = candles([11, 12, 15, 12], [9, 10, 11, 10], [10, 11, 14, 11])
+    short = candles([20, 22], [18, 19], [19, 21.8])
+    rows = bot.IndicatorEngine().compute(['LONG', 'SHORT'], [long, short], FOUR_HOURS_MS)
+
+    first, second = rows
+    assert (first['support'], first['resistance'], first['current_price']) == (9, 15, 11)
+    # True ranges 2, 2, 4, 4 (the last one from the previous close of 14)
+    assert first['atr'] == pytest.approx(ewm([2, 2, 4, 4]))
+    assert first['atr_percentage'] == pytest.approx(ewm([2, 2, 4, 4]) / 11 * 100)
+    # 11 is inside 9 + 0.9 .. 15 - 0.9
+    assert first['is_ranging']
+    # Closes against the middle (12): below, below, above, below
+    assert first['band_crossings'] == 2
+    returns = np.log([11 / 10, 14 / 11, 11 / 14])
+    assert first['realized_volatility'] == pytest.approx(returns.std() * math.sqrt(365 * 6) * 100)
+
+    # The short series is right-aligned: its ATR starts at its own first candle
+    assert (second['support'], second['resistance']) == (18, 22)
+    assert second['atr'] == pytest.approx(ewm([2, 3]))
+    assert second['atr_percentage'] == pytest.approx(ewm([2, 3]) / 21.8 * 100)
+    # 21.8 is above 22 - 0.15 * 4
+    assert not second['is_ranging']
+    assert second['band_crossings'] == 1
+    assert second['realized_volatility'] == 0.0
+
+
+def test_matches_the_previous_pandas_implementation():
+    pd = pytest.importorskip("pandas")
+    rng = np.random.default_rng(7)
+    closes = 100 + np.cumsum(rng.normal(0, 1, 180))
+    highs = closes + rng.uniform(0, 2, 180)
+    lows = closes - rng.uniform(0, 2, 180)
+    row = bot.IndicatorEngine().compute(['PAIR'], [candles(highs, lows, closes)], FOUR_HOURS_MS)[0]
+
+    df = pd.DataFrame({'high': highs, 'low': lows, 'close': closes})
+    tr = pd.concat([df['high'] - df['low'], (df['high'] - df['close'].shift()).abs(),
+                    (df['low'] - df['close'].shift()).abs()], axis=1).max(axis=1)
+    atr = tr.ewm(span=14, adjust=False).mean().iloc[-1]
+    support, resistance, current = df['low'].min(), df['high'].max(), df['close'].iloc[-1]
+    price_range = resistance - support
+    assert row['atr'] == pytest.approx(atr)
+    assert row['atr_percentage'] == pytest.approx(atr / current * 100)
+    assert (row['support'], row['resistance']) == pytest.approx((support, resistance))
+    assert row['is_ranging'] == (support + 0.15 * price_range < current < resistance - 0.15 * price_range)
@@ -0,0 +1,97 @@
+import bot
+from conftest import PAIR, grid_params, stream_fills
+
+
+def test_crashed_bot_restores_without_replacing_orders(tmp_path, exchange):
+    journal = bot.GridJournal(str(tmp_path / "journal.sqlite3"))
+    first = bot.GridBot(exchange, grid_params(), None, journal=journal)
+    first.setup_grid(100.0)
+    first.release_grid(detach=True)
+    placed = exchange.request_count
+    live = {int(o['orderId']) for o in exchange.get_open_orders(symbol=PAIR)}
+
+    second = bot.GridBot(exchange, grid_params(), None, journal=journal)
+    assert second.restore_grid() == []
+    assert set(second.book.open_orders()) == live
+    assert not any(o['status'] == 'CANCELED' for o in exchange.orders.values())
+    assert exchange.request_count - placed < 5
+    assert second.ledger.inventory == first.ledger.inventory
+    journal.close()
+
+
+def test_restore_reports_fills_missed_while_down(tmp_path, exchange):
+    journal = bot.GridJournal(str(tmp_path / "journal.sqlite3"))
+    first = bot.GridBot(exchange, grid_params(), None, journal=journal)
+    first.setup_grid(100.0)
+    first.release_grid(detach=True)
+    level = first.book.nearest_level(100.0) - 1
+    exchange.set_price(PAIR, first.book.price(level))
+
+    second = bot.GridBot(exchange, grid_params(), None, journal=journal)
+    missed = second.restore_grid()
+    assert [o['price'] for o in missed] == [second.book.price_str(level)]
+    journal.close()
+
+
+def test_changed_settings_start_fresh(tmp_path, exchange):
+    journal = bot.GridJournal(str(tmp_path / "journal.sqlite3"))
+    first = bot.GridBot(exchange, grid_params(), None, journal=journal)
+    first.setup_grid(100.0)
+    first.release_grid(detach=True)
+    assert bot.GridBot(exchange, grid_params(grids=8), None, journal=journal).restore_grid() is None
+    journal.close()
+
+
+def test_restore_finds_fills_missed_before_a_stream_fill(tmp_path, exchange):
+    journal = bot.GridJournal(str(tmp_path / "journal.sqlite3"))
+    first = bot.GridBot(exchange, grid_params(), None, journal=journal)
+    first.setup_grid(100.0)
+    below = first.book.nearest_level(100.0) - 1
+    exchange.set_price(PAIR, first.book.price(below))
+    stream_fills(exchange, first)
+    exchange.set_price(PAIR, first.book.price(below - 1))
+    first.release_grid(detach=True)
+
+    second = bot.GridBot(exchange, grid_params(), None, journal=journal)
+    assert [o['price'] for o in second.restore_grid()] == [second.book.price_str(below)]
+    journal.close()
+
+
+def test_plain_stop_cancels_and_forgets_the_grid(tmp_path, exchange):
+    journal = bot.GridJournal(str(tmp_path / "journal.sqlite3"))
+    grid_bot = bot.GridBot(exchange, grid_params(), None, journal=journal)
+    grid_bot.setup_grid(100.0)
+    grid_bot.release_grid()
+    assert exchange.get_open_orders(symbol=PAIR) == []
+    assert journal.load(grid_bot.journal_key) is None
+    journal.close()
+
+
+def test_accounts_trading_one_pair_get_separate_journals(exchange):
+    keys = set()
+    for api_key in ("key-a", "key-b"):
+        exchange.API_KEY = api_key
+        keys.add(bot.GridJournal.key_for(exchange, PAIR))
+    assert len(keys) == 2
+    assert not any("key-" in key for key in keys)
+
+
+def test_re_centred_grid_resumes_from_its_configured_settings(tmp_path, exchange):
+    journal = bot.GridJournal(str(tmp_path / "journal.sqlite3"))
+    first = bot.GridBot(exchange, grid_params(trailing=True), None, journal=journal)
+    first.setup_grid(100.0)
+    stream_fills(exchange, first)
+    exchange.set_price(PAIR, 80.0)
+    assert first.check_trailing(80.0)
+    shifted = (first.params['lower_bound'], first.params['upper_bound'])
+    assert shifted[1] < 110.0
+    first.release_grid(detach=True)
+    placed = exchange.request_count
+    live = {int(o['orderId']) for o in exchange.get_open_orders(symbol=PAIR)}
+
+    second = bot.GridBot(exchange, grid_params(trailing=True), None, journal=journal)
+    assert second.restore_grid() == []
+    assert set(second.book.open_orders()) == live
+    assert (second.params['lower_bound'], second.params['upper_bound']) == shifted
+    assert exchange.request_count - placed < 5
+    journal.close()
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from binance.exceptions import BinanceAPIException
+
+import bot
+from conftest import PAIR
+from testing.mock_exchange import MockExchange
+
+MINUTE = 60_000
+
+
+def market(minutes, **kwargs):
+    exchange = MockExchange({PAIR: np.linspace(100.0, 110.0, minutes), 'ETHUSDT': np.full(minutes, 10.0)}, **kwargs)
+    exchange.position = {symbol: minutes - 1 for symbol in exchange.position}
+    return exchange
+
+
+class BanningExchange(MockExchange):
+    """Answers the first kline request with an IP ban (418), as Binance does after ignoring 429s."""
+    bans = 1
+
+    def get_klines(self, **params):
+        if self.bans:
+            self.bans -= 1
+            self._reject(-1003, "Way too much request weight used; IP banned.", 418, {'Retry-After': '7'})
+        return super().get_klines(**params)
+
+
+def resume(exchange, penalties):
+    """Retry log callback that records our pause and then stands in for it passing."""
+    def log(message):
+        penalties.append(bot.rate_limiter.blocked_until - bot.time.monotonic())
+        exchange.weight_per_minute = 10 ** 9
+        bot.rate_limiter.blocked_until = 0.0
+    return log
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(bot.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+@pytest.mark.parametrize('minutes, pages', [(2500, 3), (2000, 3), (999, 1)])
+def test_pages_cover_the_range_without_gaps_or_duplicates(minutes, pages):
+    exchange = market(minutes)
+    klines = bot.KlineFetcher(exchange).fetch(PAIR, '1m', 0)
+    assert [k[0] for k in klines] == [i * MINUTE for i in range(minutes)]
+    assert exchange.request_count == pages
+
+
+def test_end_time_is_inclusive_and_stops_paging():
+    exchange = market(2500)
+    klines = bot.KlineFetcher(exchange).fetch(PAIR, '1m', 0, end_ms=999 * MINUTE)
+    assert len(klines) == 1000 and klines[-1][0] == 999 * MINUTE
+    # A full page ending at end_ms needs no extra request
+    assert exchange.request_count == 1
+    klines = bot.KlineFetcher(exchange).fetch(PAIR, '1m', 30_000, end_ms=1500 * MINUTE)
+    assert (klines[0][0], klines[-1][0], len(klines)) == (MINUTE, 1500 * MINUTE, 1500)
+
+
+def test_throttled_page_waits_for_retry_after(sleeps):
+    exchange = market(1500, weight_per_minute=2)
+    penalties = []
+    klines = bot.KlineFetcher(exchange, log=resume(exchange, penalties)).fetch(PAIR, '1m', 0)
+    assert len(klines) == 1500
+    assert len(sleeps) == 1 and sleeps[0] > 50
+    assert penalties == [pytest.approx(sleeps[0], abs=1)]
+    # Two pages plus the rejected request
+    assert exchange.request_count == 3
+
+
+def test_ban_waits_for_retry_after(sleeps):
+    exchange = BanningExchange({PAIR: np.full(10, 100.0)})
+    exchange.position[PAIR] = 9
+    penalties = []
+    assert len(bot.KlineFetcher(exchange, log=resume(exchange, penalties)).fetch(PAIR, '1m', 0)) == 10
+    assert sleeps == [7.0]
+    assert penalties == [pytest.approx(7.0, abs=1)]
+
+
+def test_retries_are_bounded(sleeps):
+    exchange = BanningExchange({PAIR: np.full(10, 100.0)})
+    exchange.bans = 10
+    with pytest.raises(BinanceAPIException) as error:
+        bot.KlineFetcher(exchange, max_retries=2, log=resume(exchange, [])).fetch(PAIR, '1m', 0)
+    assert error.value.status_code == 418
+    assert len(sleeps) == 2
+
+
+def test_fetch_many_reports_failures_per_symbol():
+    exchange = market(1200)
+    done = []
+    results = bot.KlineFetcher(exchange).fetch_many([PAIR, 'ETHUSDT', 'XRPUSDT'], '1m', 0,
+                                                    on_result=lambda symbol, result: done.append(symbol))
+    assert len(results[PAIR]) == len(results['ETHUSDT']) == 1200
+    assert isinstance(results['XRPUSDT'], Exception)
+    assert sorted(done) == sorted(results)
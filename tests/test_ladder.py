@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import bot
+
+
+def ladder(tick_size=0.01, step_size=0.001, min_qty=0.001, min_notional=5.0, **filters):
+    metadata = dict(tick_size=tick_size, price_precision=bot._decimal_places(f"{tick_size:.8f}"),
+                    step_size=step_size, qty_precision=bot._decimal_places(f"{step_size:.8f}"),
+                    min_qty=min_qty, min_notional=min_notional, **filters)
+    return bot.GridLadder(metadata)
+
+
+def test_prices_and_quantities_round_to_tick_and_step():
+    grid_ladder = ladder()
+    grid = grid_ladder.build(90.004, 110.0, 3, 300.0)
+    assert grid['ticks'].tolist() == [9000, 10000, 11000]
+    # 150 quote per level, floored to whole 0.001 steps
+    assert grid['qty_steps'].tolist() == [1666, 1500, 1363]
+    orders = grid_ladder.orders(grid['ticks'], grid['qty_steps'], skipped=1)
+    assert [(o['side'], o['price_str'], o['qty']) for o in orders] == [('BUY', '90.00', '1.666'),
+                                                                    ('SELL', '110.00', '1.363')]
+    assert ladder(step_size=0.1).qty_str(0.3) == '0.3'
+
+
+def test_levels_on_the_same_tick_are_merged():
+    grid = ladder(tick_size=1.0, step_size=0.01).build(100.0, 102.0, 5, 1000.0)
+    assert grid['ticks'].tolist() == [100, 101, 102]
+    assert (grid['requested'], grid['levels'], grid['dropped']) == (5, 3, 0)
+
+
+def test_grid_is_coarsened_to_what_min_notional_allows():
+    grid = ladder(min_notional=10.0).build(90.0, 110.0, 11, 50.0)
+    assert grid['ticks'].tolist() == [9000, 9500, 10000, 10500, 11000]
+    assert grid['qty_steps'].tolist() == [138, 131, 125, 119, 113]
+
+
+def test_grid_is_coarsened_to_what_min_qty_allows():
+    grid = ladder(min_qty=1.0).build(90.0, 110.0, 11, 300.0)
+    assert grid['ticks'].tolist() == [9000, 10000, 11000]
+    assert (grid['qty_steps'] >= 1000).all()
+
+
+def test_levels_still_outside_the_filters_are_dropped():
+    # max_qty caps every order at 0.1, which is under MIN_NOTIONAL below 100
+    grid = ladder(min_notional=10.0, max_qty=0.1).build(90.0, 110.0, 5, 200.0)
+    assert grid['ticks'].tolist() == [10000, 10500, 11000]
+    assert (grid['levels'], grid['dropped']) == (3, 2)
+
+
+def test_unfundable_grid_is_rejected():
+    with pytest.raises(ValueError):
+        ladder(min_notional=10.0).build(90.0, 110.0, 5, 5.0)
+    with pytest.raises(ValueError):
+        ladder(tick_size=1.0).build(100.0, 100.4, 5, 1000.0)
+
+
+def test_geometric_levels_have_equal_ratios():
+    grid = ladder().build(100.0, 400.0, 3, 3000.0, spacing=bot.GridLadder.GEOMETRIC)
+    assert grid['ticks'].tolist() == [10000, 20000, 40000]
+    with pytest.raises(ValueError):
+        ladder().level_ticks(100.0, 400.0, 3, spacing='logarithmic')
+
+
+def test_format_many_is_exact_for_awkward_tick_sizes():
+    assert bot.GridLadder.format_many(np.array([1, 123456789, 100000000]), 8) == [
+        '0.00000001', '1.23456789', '1.00000000']
+    half = ladder(tick_size=0.5, step_size=1.0, min_qty=1.0)
+    grid = half.build(100.0, 101.0, 3, 1000.0)
+    orders = half.orders(grid['ticks'], grid['qty_steps'], skipped=1)
+    assert [o['price_str'] for o in orders] == ['100.0', '101.0']
+    assert [o['qty'] for o in orders] == ['5', '4']
+    tiny = ladder(tick_size=1e-8, step_size=1.0, min_qty=1.0, min_notional=0.0)
+    grid = tiny.build(0.00000123, 0.00000125, 3, 1.0)
+    assert [o['price_str'] for o in tiny.orders(grid['ticks'], grid['qty_steps'], skipped=-1)] == [
+        '0.00000123', '0.00000124', '0.00000125']
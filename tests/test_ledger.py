@@ -0,0 +1,64 @@
+import pytest
+
+from bot import PositionLedger
+
+
+def ledger():
+    return PositionLedger('BTC', 'USDT')
+
+
+def test_sell_closes_lots_of_level_below_first():
+    book = ledger()
+    book.buy(99, 99.0, 1.0)
+    book.buy(98, 98.0, 1.0)
+    assert book.sell(98, 99.0, 1.0) == pytest.approx(1.0)
+    snapshot = book.snapshot()
+    assert snapshot['inventory'] == pytest.approx(1.0)
+    assert snapshot['avg_cost'] == pytest.approx(99.0)
+
+
+def test_lots_on_one_level_close_fifo():
+    book = ledger()
+    book.buy(99, 99.0, 1.0)
+    book.buy(99, 97.0, 1.0)
+    assert book.sell(99, 100.0, 1.0) == pytest.approx(1.0)
+    assert book.sell(99, 100.0, 1.0) == pytest.approx(3.0)
+    assert book.snapshot()['open_lots'] == 0
+
+
+def test_commissions_by_asset():
+    book = ledger()
+    book.buy(99, 99.0, 1.0, commission=0.001, commission_asset='BTC')
+    assert book.inventory == pytest.approx(0.999)
+    pnl = book.sell(99, 100.0, 0.999, commission=0.1, commission_asset='USDT')
+    assert pnl == pytest.approx(0.999 * 100.0 - 0.1 - 99.0)
+    book.buy(99, 99.0, 1.0, commission=0.0001, commission_asset='BNB')
+    snapshot = book.snapshot()
+    assert snapshot['fees'] == pytest.approx(0.001 * 99.0 + 0.1)
+    assert snapshot['other_fees'] == {'BNB': 0.0001}
+
+
+def test_unrealized_and_drawdown():
+    book = ledger()
+    book.buy(99, 99.0, 2.0)
+    book.mark(101.0)
+    assert book.snapshot()['unrealized_pnl'] == pytest.approx(4.0)
+    book.mark(95.0)
+    snapshot = book.snapshot()
+    assert snapshot['unrealized_pnl'] == pytest.approx(-8.0)
+    assert snapshot['max_drawdown'] == pytest.approx(12.0)
+
+
+def test_seeded_lots_cost_the_opening_price():
+    book = ledger()
+    book.seed(100, 100.0, 1.0)
+    assert book.sell(100, 101.0, 1.0) == pytest.approx(1.0)
+    snapshot = book.snapshot()
+    assert snapshot['fills'] == 1
+    assert snapshot['unmatched_qty'] == 0.0
+
+
+def test_sell_without_lots_books_no_pnl():
+    book = ledger()
+    assert book.sell(99, 100.0, 1.0) == pytest.approx(0.0)
+    assert book.snapshot()['unmatched_qty'] == pytest.approx(1.0)
@@ -0,0 +1,99 @@
+import re
+import urllib.request
+
+import numpy as np
+import pytest
+from binance.exceptions import BinanceAPIException
+
+import bot
+from conftest import PAIR
+from testing.mock_exchange import MockExchange
+
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="[^"]*",?)*\})? -?[0-9.e+-]+$')
+
+
+def registry():
+    registry = bot.MetricsRegistry()
+    requests = registry.counter('requests_total', 'Requests by outcome.', ('method', 'outcome'))
+    requests.inc('get_order', 'ok', amount=2)
+    requests.inc('create_order', '-1013')
+    registry.gauge('used_weight', 'Used weight.').set(42.0)
+    latency = registry.histogram('request_seconds', 'Request latency.', ('method',), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, 'get_order')
+    return registry
+
+
+def test_render_is_prometheus_text():
+    text = registry().render()
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    for line in lines:
+        assert line.startswith(("# HELP ", "# TYPE ")) or SAMPLE.match(line), line
+    assert lines[:4] == ['# HELP requests_total Requests by outcome.', '# TYPE requests_total counter',
+                         'requests_total{method="get_order",outcome="ok"} 2',
+                         'requests_total{method="create_order",outcome="-1013"} 1']
+    assert '# TYPE used_weight gauge' in lines and 'used_weight 42.0' in lines
+    assert lines[lines.index('# TYPE request_seconds histogram') + 1:] == [
+        'request_seconds_bucket{method="get_order",le="0.1"} 1',
+        'request_seconds_bucket{method="get_order",le="1"} 3',
+        'request_seconds_bucket{method="get_order",le="+Inf"} 4',
+        'request_seconds_sum{method="get_order"} 4.05',
+        'request_seconds_count{method="get_order"} 4',
+    ]
+
+
+def test_render_parses_with_the_prometheus_client():
+    parser = pytest.importorskip('prometheus_client.parser')
+    families = {family.name: family for family in parser.text_string_to_metric_families(registry().render())}
+    assert families['request_seconds'].type == 'histogram'
+    assert families['used_weight'].samples[0].value == 42.0
+
+
+def test_histogram_quantiles():
+    latency = registry()._metrics['request_seconds']
+    assert latency.count() == 4
+    assert latency.quantile(0.5, 'get_order') == 1
+    assert latency.quantile(0.99) == float('inf')
+    assert latency.quantile(0.5, 'create_order') is None
+
+
+def test_server_serves_the_registry_once():
+    server = bot.MetricsServer(registry(), port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen(server.url, timeout=5) as response:
+            assert response.headers['Content-Type'].startswith("text/plain; version=0.0.4")
+            body = response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(server.url.replace('/metrics', '/other'), timeout=5)
+    finally:
+        server.stop()
+    assert body == registry().render()
+
+
+def test_instrumented_client_records_outcomes_and_usage_headers():
+    client = bot.InstrumentedClient(MockExchange({PAIR: np.full(10, 100.0)}))
+    before = dict(bot.EXCHANGE_REQUESTS.values)
+    calls = bot.EXCHANGE_LATENCY.count()
+
+    client.get_exchange_info()
+    assert bot.USED_WEIGHT.values[()] == 20
+    client.create_order(symbol=PAIR, side='BUY', type='LIMIT', timeInForce='GTC', quantity='0.1', price='99.00')
+    assert (bot.USED_WEIGHT.values[()], bot.ORDER_COUNT.values[()]) == (21, 1)
+    with pytest.raises(BinanceAPIException):
+        client.create_order(symbol=PAIR, side='BUY', type='LIMIT', timeInForce='GTC', quantity='0.1', price='99.001')
+    with pytest.raises(KeyError):
+        client.get_symbol_ticker(symbol='ETHUSDT')
+
+    def delta(method, outcome):
+        return bot.EXCHANGE_REQUESTS.values.get((method, outcome), 0) - before.get((method, outcome), 0)
+    assert delta('get_exchange_info', 'ok') == 1
+    assert delta('create_order', 'ok') == 1
+    assert delta('create_order', '-1013') == 1
+    assert delta('get_symbol_ticker', 'error') == 1
+    assert bot.EXCHANGE_LATENCY.count() - calls == 4
+    # Attributes pass through to the wrapped client
+    assert client.request_count == 4
+    client.testnet = False
+    assert client._client.testnet is False
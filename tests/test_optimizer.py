@@ -0,0 +1,34 @@
+import numpy as np
+
+import bot
+
+
+def row(symbol, score):
+    return {'symbol': symbol, 'lower_bound': 90.0, 'upper_bound': 110.0, 'grids': 10, 'return_pct': score,
+            'max_drawdown_pct': 0.0, 'round_trips': 3, 'score': score}
+
+
+def falling_candles(n=500):
+    closes = np.linspace(100.0, 60.0, n)
+    candles = np.zeros(n, dtype=bot.candle_dtype())
+    candles['open_time'] = np.arange(n) * 60000
+    candles['open'] = np.r_[closes[0], closes[:-1]]
+    candles['close'] = closes
+    candles['high'] = np.maximum(candles['open'], closes)
+    candles['low'] = np.minimum(candles['open'], closes)
+    return candles
+
+
+def test_investment_is_split_by_score_over_the_top_symbols():
+    optimizer = bot.GridOptimizer(1000.0)
+    table = optimizer.allocate([row('A', 6.0), row('B', 3.0), row('C', 1.0), row('D', 0.5), row('E', -2.0)])
+    assert [r['trading_pair'] for r in table] == ['A', 'B', 'C', 'D']
+    assert [r['investment'] for r in table] == [600.0, 300.0, 100.0, 0.0]
+
+
+def test_no_profitable_configuration_gives_an_empty_table():
+    assert bot.GridOptimizer(1000.0).allocate([row('A', 0.0), row('B', -24.36)]) == []
+
+
+def test_falling_market_recommends_nothing():
+    assert bot.GridOptimizer(1000.0, max_workers=2).optimize({'BTCUSDT': falling_candles()}) == []
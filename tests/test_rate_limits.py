@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+import pytest
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+import bot
+from conftest import PAIR, grid_params
+from testing.mock_exchange import MockExchange, MockResponse
+
+
+def ladder(*prices):
+    return [{'side': 'BUY' if price < 100 else 'SELL', 'qty': '0.10000', 'price': price, 'price_str': f"{price:.2f}"}
+            for price in prices]
+
+
+def rejected(call, **params):
+    with pytest.raises(BinanceAPIException) as error:
+        call(**params)
+    return error.value
+
+
+def scheduler(exchange, calls, **kwargs):
+    grid_bot = bot.GridBot(exchange, grid_params(), None)
+
+    def submit(order, client_order_id=None):
+        calls.append((order['price'], client_order_id))
+        return grid_bot.submit_ladder_order(order, client_order_id)
+    return bot.OrderPlacementScheduler(submit, max_workers=1, **kwargs)
+
+
+def test_acquire_waits_for_the_bucket_to_refill():
+    limiter = bot.RateLimiter(weight_per_minute=600, orders_per_10s=100, safety=1.0)
+    limiter.acquire(weight=1, orders=100)
+    start = time.monotonic()
+    limiter.acquire(weight=1, orders=1)
+    # Order slots refill at 10 per second
+    assert time.monotonic() - start >= 0.08
+
+
+def test_usage_headers_correct_the_budget():
+    exchange = MockExchange({PAIR: np.full(10, 100.0)})
+    limiter = bot.RateLimiter(weight_per_minute=1000, orders_per_10s=100, safety=1.0)
+    # Weight spent by another client on the same account
+    for _ in range(5):
+        exchange.get_exchange_info()
+    exchange.create_order(symbol=PAIR, side='BUY', type='LIMIT', timeInForce='GTC', quantity='0.1', price='99.00')
+    limiter.update_from_response(exchange.response)
+    assert limiter.used_weight == 101
+    assert limiter.weight_tokens <= 1000 - 101
+    assert limiter.order_tokens <= 100 - 1
+    assert limiter.remaining_fraction() == pytest.approx(0.899, abs=0.01)
+
+
+def test_retry_delay_follows_retry_after_and_pauses_the_limiter():
+    exchange = MockExchange({PAIR: np.full(10, 100.0)}, weight_per_minute=30)
+    exchange.get_exchange_info()
+    error = rejected(exchange.get_exchange_info)
+    assert (error.status_code, error.code) == (429, -1003)
+    delay = bot.retry_delay(error, attempt=0)
+    assert delay == float(error.response.headers['Retry-After']) > 50
+    assert bot.rate_limiter.blocked_until > time.monotonic() + 50
+
+
+def test_retry_delay_backs_off_transient_errors_only():
+    exchange = MockExchange({PAIR: np.full(10, 100.0)})
+    order = dict(symbol=PAIR, side='BUY', type='LIMIT', timeInForce='GTC', quantity='0.1', price='99.00',
+                 newClientOrderId='grid-1')
+    exchange.create_order(**order)
+    duplicate = rejected(exchange.create_order, **order)
+    assert duplicate.code == -2010 and bot.retry_delay(duplicate, attempt=0) is None
+    assert bot.retry_delay(BinanceRequestException("Invalid Response"), attempt=2) == 2.0
+    assert bot.retry_delay(ConnectionResetError(), attempt=10) == 30
+    server_error = BinanceAPIException(MockResponse({}, 503, '{"code": -1001, "msg": "Disconnected."}'), 503, '')
+    assert bot.retry_delay(server_error, attempt=0) == 0.5
+
+
+def test_nearest_levels_are_placed_first(exchange):
+    calls = []
+    results = scheduler(exchange, calls).place_all(ladder(90.0, 110.0, 99.0, 104.0, 101.5, 95.0), 100.0)
+    assert [r['price'] for r in results] == [99.0, 101.5, 104.0, 95.0, 90.0, 110.0]
+    placed = sorted(exchange.orders.values(), key=lambda o: o['orderId'])
+    assert [float(o['price']) for o in placed] == [99.0, 101.5, 104.0, 95.0, 90.0, 110.0]
+    assert "6/6 orders placed" in bot.OrderPlacementScheduler.summarize(results)
+
+
+def test_throttled_placement_retries_with_the_same_client_order_id():
+    exchange = MockExchange({PAIR: np.full(10, 100.0)}, orders_per_10s=1)
+    calls, logs = [], []
+
+    def log(message):
+        logs.append(message)
+        # The order window has rolled over by the time the retry is sent
+        exchange.orders_per_10s = 100
+
+    results = scheduler(exchange, calls, log=log).place_all(ladder(99.0, 101.0), 100.0)
+    assert [r['attempts'] for r in results] == [1, 2]
+    assert all(r['response'] is not None for r in results)
+    assert "throttled" in logs[0]
+    (_, first_id), (retried_price, retry_id), (_, again_id) = calls
+    assert retried_price == 101.0 and retry_id == again_id != first_id
+    # Exactly one order per level reached the book
+    assert sorted(o['clientOrderId'] for o in exchange.orders.values()) == sorted([first_id, retry_id])
+
+
+def test_stopping_mid_placement_leaves_the_rest_unplaced(exchange):
+    logs = []
+    stop_after_two = scheduler(exchange, [], log=logs.append, cancelled=lambda: len(exchange.orders) >= 2)
+    results = stop_after_two.place_all(
+        ladder(95.0, 98.0, 99.0, 101.0, 102.0), 100.0)
+    assert [r['response'] is not None for r in results] == [True, True, False, False, False]
+    assert all(r['error'] == "placement cancelled" for r in results[2:])
+    assert len(exchange.orders) == 2
+    assert not any(message.startswith("Failed to place") for message in logs)
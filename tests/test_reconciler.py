@@ -0,0 +1,68 @@
+import threading
+import time
+
+import bot
+from conftest import PAIR, assert_book_matches, grid_params, stream_fills
+from testing.mock_exchange import FakeUserDataStreamServer
+
+
+def test_poll_reports_fills_once(exchange, grid_bot):
+    level = grid_bot.book.nearest_level(100.0) - 2
+    exchange.set_price(PAIR, grid_bot.book.price(level))
+    filled = grid_bot.check_filled_orders()
+    assert sorted(o['price'] for o in filled) == sorted(grid_bot.book.price_str(lv) for lv in (level, level + 1))
+    assert all(o['side'] == 'BUY' and o['cummulativeQuoteQty'] for o in filled)
+    assert grid_bot.check_filled_orders() == []
+
+
+def test_fills_of_other_orders_are_ignored(exchange, grid_bot):
+    exchange.create_order(symbol=PAIR, side='BUY', type='LIMIT', timeInForce='GTC', quantity='0.1', price='100.00')
+    assert grid_bot.check_filled_orders() == []
+
+
+def test_stream_reconnects_after_missing_fills(exchange, grid_bot):
+    below = grid_bot.book.nearest_level(100.0) - 1
+    # Two buys fill while the stream is down...
+    exchange.set_price(PAIR, grid_bot.book.price(below - 1))
+    # ...then it is back and reports a newer fill
+    stream_fills(exchange, grid_bot)
+    exchange.set_price(PAIR, grid_bot.book.price(below - 2))
+
+    missed = grid_bot.check_filled_orders()
+    assert sorted(o['price'] for o in missed) == sorted(grid_bot.book.price_str(lv) for lv in (below - 1, below))
+    for order in missed:
+        grid_bot.handle_filled_order(order)
+    assert grid_bot.ledger.fills == 3
+    assert grid_bot.check_filled_orders() == []
+    assert_book_matches(exchange, grid_bot)
+
+
+def test_reconnect_catch_up_runs_on_the_bot_thread(exchange):
+    server = FakeUserDataStreamServer().start()
+    grid_bot = bot.GridBot(exchange, grid_params(), None, stream_url=server.url)
+    polled_on = []
+    poll = grid_bot.check_filled_orders
+
+    def check_filled_orders():
+        polled_on.append(threading.current_thread())
+        return poll()
+
+    grid_bot.check_filled_orders = check_filled_orders
+    grid_bot.start()
+    try:
+        deadline = time.time() + 10
+        while not (grid_bot.stream_connected() and grid_bot.book and len(grid_bot.book.open_orders()) == 9):
+            assert time.time() < deadline
+            time.sleep(0.02)
+        below = grid_bot.book.nearest_level(100.0) - 1
+        exchange.set_price(PAIR, grid_bot.book.price(below))
+        grid_bot.on_stream_connect(True)
+        assert polled_on == []
+        while grid_bot.ledger.fills < 1 and time.time() < deadline:
+            time.sleep(0.02)
+        assert polled_on == [grid_bot]
+        assert grid_bot.ledger.fills == 1
+    finally:
+        grid_bot.stop()
+        grid_bot.join(10)
+        server.stop()
@@ -0,0 +1,81 @@
+import pytest
+
+import bot
+from conftest import PAIR, assert_book_matches, grid_params
+
+STEP = 20.0 / 9
+
+
+def test_noop_regrid_keeps_every_order(exchange, grid_bot):
+    before = set(grid_bot.book.open_orders())
+    counts = grid_bot.regrid(grid_params(), 100.0)
+    assert counts['kept'] == len(before) and counts['moved'] == counts['placed'] == counts['cancelled'] == 0
+    assert set(grid_bot.book.open_orders()) == before
+
+
+def test_shift_keeps_surviving_levels(exchange, grid_bot):
+    requests = exchange.request_count
+    counts = grid_bot.regrid(grid_params(lower=90.0 - 2 * STEP, upper=110.0 - 2 * STEP), 100.0)
+    assert counts['kept'] > 0 and counts['failed'] == 0
+    # One request per moved, cancelled or placed order, plus the metadata lookup
+    assert exchange.request_count - requests <= counts['moved'] + counts['cancelled'] + counts['placed'] + 1
+    assert_book_matches(exchange, grid_bot)
+
+
+def test_trailing_params_shift_by_whole_levels(grid_bot):
+    grid_bot.params['trailing'] = True
+    assert grid_bot.trailing_params(100.0) is None
+    params = grid_bot.trailing_params(120.0)
+    step = (110.0 - 90.0) / (len(grid_bot.book) - 1)
+    shift = params['lower_bound'] - 90.0
+    assert abs(shift / step - round(shift / step)) < 1e-9
+    assert params['lower_bound'] <= 120.0 <= params['upper_bound']
+
+
+def test_regrid_rejects_other_pair(grid_bot):
+    try:
+        grid_bot.regrid(dict(grid_params(), pair='ETHUSDT'), 100.0)
+    except ValueError:
+        return
+    raise AssertionError("regrid accepted another pair")
+
+
+def test_open_orders_after_regrid_are_exchange_orders(exchange, grid_bot):
+    grid_bot.regrid(grid_params(grids=6), 100.0)
+    assert len(exchange.get_open_orders(symbol=PAIR)) == len(grid_bot.book) - 1
+
+
+def racing_fills(exchange, method):
+    """Wraps a cancel endpoint so the first order it targets fills just before the request lands."""
+    original = getattr(exchange, method)
+    raced = []
+
+    def cancel(**params):
+        if not raced:
+            order_id = int(params.get('cancelOrderId') or params['orderId'])
+            raced.append(order_id)
+            exchange.set_price(PAIR, float(exchange.orders[order_id]['price']))
+            exchange.set_price(PAIR, 100.0)
+        return original(**params)
+    setattr(exchange, method, cancel)
+    return raced
+
+
+@pytest.mark.parametrize('new_params, method', [
+    (grid_params(lower=90.0 - 2 * STEP, upper=110.0 - 2 * STEP), 'cancel_replace_order'),
+    (grid_params(grids=4), 'cancel_order'),
+])
+def test_regrid_handles_orders_filled_before_their_cancel(exchange, grid_bot, new_params, method):
+    events = []
+    exchange.subscribe(events.append)
+    raced = racing_fills(exchange, method)
+    grid_bot.regrid(new_params, 100.0)
+    # Stream events queued while the re-grid ran arrive afterwards
+    for event in events:
+        grid_bot.handle_filled_order(bot.UserDataStream.execution_report_to_order(event))
+
+    assert raced
+    filled = [o for o in exchange.orders.values() if o['status'] == 'FILLED']
+    assert grid_bot.ledger.fills == len(filled)
+    assert not grid_bot.book.retired
+    assert_book_matches(exchange, grid_bot)
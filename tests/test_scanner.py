@@ -0,0 +1,50 @@
+import math
+import os
+
+import numpy as np
+import pytest
+
+import bot
+from testing.mock_exchange import MockExchange
+
+RECORDING = os.path.join(os.path.dirname(__file__), "fixtures", "mini_ticker.jsonl")
+SYMBOLS = ('BTCUSDT', 'ETHUSDT', 'BTCUPUSDT', 'SUPERUSDT', 'JUPUSDT', 'ETHBTC')
+
+
+def replayed(universe=None):
+    scanner = bot.MarketScanner(log=lambda message: None)
+    if universe is not None:
+        scanner.set_universe(universe)
+    scanner.replay(RECORDING)
+    return scanner
+
+
+def test_replay_ranks_the_tradable_pairs():
+    exchange = MockExchange({symbol: np.full(10, 1.0) for symbol in SYMBOLS})
+    scanner = replayed(bot.symbol_cache.tradable_pairs(exchange, 'USDT'))
+    assert scanner.messages == 3
+    assert scanner.top(10) == ['JUPUSDT', 'BTCUSDT', 'ETHUSDT', 'SUPERUSDT']
+    assert scanner.top(2) == ['JUPUSDT', 'BTCUSDT']
+    assert scanner.top(10, by='volatility') == ['JUPUSDT', 'ETHUSDT', 'BTCUSDT', 'SUPERUSDT']
+    stats = scanner.stats('BTCUSDT')
+    assert stats['price'] == 102.0
+    assert stats['range_pct'] == pytest.approx(10 / 102 * 100)
+    assert stats['volatility'] == pytest.approx(math.sqrt(0.05) * math.log(1.02) * 100)
+
+
+def test_without_a_universe_every_quote_asset_pair_is_eligible():
+    scanner = replayed()
+    assert scanner.top(10) == ['BTCUPUSDT', 'JUPUSDT', 'BTCUSDT', 'ETHUSDT', 'SUPERUSDT']
+    scanner.set_universe({'ETHUSDT', 'ETHBTC'})
+    assert scanner.top(10) == ['ETHUSDT', 'ETHBTC']
+    with pytest.raises(ValueError):
+        scanner.top(by='price')
+
+
+@pytest.mark.parametrize("base_asset, leveraged", [
+    ('BTCUP', True), ('BTCDOWN', True), ('ETHBULL', True), ('ETHBEAR', True),
+    ('SUPER', False), ('JUP', False), ('UP', False), ('SOLUP', False), ('BTC', False),
+])
+def test_leveraged_tokens_need_a_listed_underlying(base_asset, leveraged):
+    base_assets = {'BTC', 'ETH', 'SUPER', 'JUP', 'UP', base_asset}
+    assert bot.SymbolMetadataCache.is_leveraged_token(base_asset, base_assets) == leveraged
@@ -0,0 +1,169 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+import requests
+from binance.exceptions import BinanceAPIException
+
+import bot
+
+
+class FakeRestServer:
+    """Local stand-in for the Binance REST API with an adjustable clock."""
+
+    def __init__(self, clock_offset_ms=0):
+        self.clock_offset_ms = clock_offset_ms
+        self.drop_orders = False
+        self.orders = []
+        self.time_requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if self.path.startswith('/api/v3/time'):
+                    server.time_requests += 1
+                    self.reply(200, {'serverTime': server.now_ms()})
+                else:
+                    self.reply(404, {'code': -1, 'msg': 'Unknown path.'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                params = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                server.orders.append(params)
+                if server.drop_orders:
+                    # The request reached the server but no response makes it back
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    self.close_connection = True
+                elif abs(int(params['timestamp']) - server.now_ms()) > 1000:
+                    self.reply(400, {'code': -1021, 'msg': 'Timestamp for this request is outside of the recvWindow.'})
+                else:
+                    self.reply(200, {'symbol': params['symbol'], 'orderId': len(server.orders),
+                                     'clientOrderId': params['newClientOrderId']})
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('x-mbx-used-weight-1m', str(len(server.orders) + server.time_requests))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/api"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def now_ms(self):
+        return int(time.time() * 1000) + self.clock_offset_ms
+
+    def client(self, api_key='key', api_secret='secret', testnet=True):
+        client = bot.PooledClient(api_key, api_secret, testnet=testnet)
+        client.API_URL = client.API_TESTNET_URL = self.url
+        return client
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    server = FakeRestServer()
+    yield server
+    server.stop()
+
+
+def order(client, client_order_id='grid-1'):
+    return client.create_order(symbol='BTCUSDT', side='BUY', type='LIMIT', timeInForce='GTC',
+                               quantity='0.1', price='99.00', newClientOrderId=client_order_id)
+
+
+def test_timestamp_rejection_resyncs_and_retries_once(server):
+    server.clock_offset_ms = 5000
+    client = server.client()
+    assert order(client)['orderId'] == 2
+    assert server.time_requests == 1 and abs(client.timestamp_offset - 5000) < 1000
+    first, retry = server.orders
+    assert retry['newClientOrderId'] == first['newClientOrderId'] == 'grid-1'
+    assert int(retry['timestamp']) > int(first['timestamp']) + 4000
+    assert client.time_synced_at is not None
+
+
+def test_timestamp_rejection_is_not_retried_twice(server):
+    client = server.client()
+    # The resync returns the same (wrong) offset, so the retry is rejected too
+    client.sync_time = lambda: client.timestamp_offset
+    server.clock_offset_ms = 5000
+    with pytest.raises(BinanceAPIException) as error:
+        order(client)
+    assert error.value.code == -1021
+    assert len(server.orders) == 2
+
+
+def test_order_that_reached_the_server_is_not_resent(server):
+    server.drop_orders = True
+    client = server.client()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        order(client)
+    assert len(server.orders) == 1
+    retries = client.session.get_adapter(server.url).max_retries
+    assert (retries.connect, retries.read, retries.status) == (bot.PooledClient.CONNECT_RETRIES, False, False)
+
+
+def test_response_is_kept_per_thread(server):
+    client = server.client()
+    seen = {}
+    first_done, second_done = threading.Event(), threading.Event()
+
+    def first():
+        client.get_server_time()
+        first_done.set()
+        second_done.wait(5)
+        seen['first'] = client.response.url
+
+    def second():
+        first_done.wait(5)
+        order(client)
+        seen['second'] = client.response.url
+        second_done.set()
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert seen['first'].endswith('/api/v3/time')
+    assert '/api/v3/order' in seen['second']
+    assert client.response is None
+
+
+def test_one_session_per_credentials_and_environment(server):
+    sessions = bot.ExchangeSessions(client_factory=server.client)
+    try:
+        session = sessions.get('key', 'secret', testnet=True)
+        assert sessions.get('key', 'secret', testnet=True) is session
+        mainnet = sessions.get('key', 'secret', testnet=False)
+        other_account = sessions.get('key', 'other', testnet=True)
+        assert len({id(session), id(mainnet), id(other_account)}) == 3 and len(sessions) == 3
+        assert isinstance(session, bot.InstrumentedClient)
+        assert all('secret' not in part for part in map(str, bot.ExchangeSessions.key_for('key', 'secret', True)))
+
+        # The background thread syncs every new session's clock once
+        deadline = time.monotonic() + 5
+        while server.time_requests < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert server.time_requests == 3
+        sessions.sync_due()
+        assert server.time_requests == 3
+    finally:
+        sessions.close()
+    assert len(sessions) == 0
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+import bot
+from conftest import PAIR, grid_params
+from testing.mock_exchange import FakeUserDataStreamServer
+
+
+@pytest.fixture
+def server(exchange):
+    server = FakeUserDataStreamServer().start()
+    exchange.subscribe(server.push_event)
+    yield server
+    server.stop()
+
+
+def run_supervisor(exchange, server, journal=None):
+    supervisor = bot.BotSupervisor(exchange, stream_url=server.url, journal=journal).start()
+    supervisor.add_bot(grid_params())
+    deadline = time.time() + 10
+    while supervisor.state(PAIR) != 'running' and time.time() < deadline:
+        time.sleep(0.02)
+    return supervisor
+
+
+def test_shutdown_cancels_every_grid(exchange, server):
+    supervisor = run_supervisor(exchange, server)
+    assert exchange.get_open_orders(symbol=PAIR)
+    supervisor.shutdown()
+    assert exchange.get_open_orders(symbol=PAIR) == []
+
+
+def test_detached_shutdown_resumes_the_grid(tmp_path, exchange, server):
+    journal = bot.GridJournal(str(tmp_path / "journal.sqlite3"))
+    supervisor = run_supervisor(exchange, server, journal)
+    live = {o['orderId'] for o in exchange.get_open_orders(symbol=PAIR)}
+    supervisor.shutdown(detach=True)
+    assert {o['orderId'] for o in exchange.get_open_orders(symbol=PAIR)} == live
+
+    supervisor = run_supervisor(exchange, server, journal)
+    assert set(supervisor._bots[PAIR]['bot'].book.open_orders()) == live
+    supervisor.shutdown()
+    journal.close()
+
+
+def test_catch_up_waits_for_the_fill_in_progress(exchange, server):
+    supervisor = run_supervisor(exchange, server)
+    grid_bot = supervisor.bot(PAIR)
+    busy, overlaps, polls = [], [], []
+
+    def exclusive(fn):
+        def wrapper(*args):
+            if busy:
+                overlaps.append(fn.__name__)
+            busy.append(fn.__name__)
+            try:
+                time.sleep(0.1)
+                return fn(*args)
+            finally:
+                busy.pop()
+        return wrapper
+
+    grid_bot.handle_filled_order = exclusive(grid_bot.handle_filled_order)
+    check_filled_orders = exclusive(grid_bot.check_filled_orders)
+    grid_bot.check_filled_orders = lambda: polls.append(1) or check_filled_orders()
+    exchange.set_price(PAIR, grid_bot.book.price(grid_bot.book.nearest_level(100.0) - 1))
+    deadline = time.time() + 10
+    while not busy and time.time() < deadline:
+        time.sleep(0.005)
+    supervisor._on_stream_connect(True)
+    while not polls and time.time() < deadline:
+        time.sleep(0.02)
+    supervisor.shutdown()
+    assert polls and overlaps == []
@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+import pytest
+from binance.exceptions import BinanceAPIException
+
+import bot
+from conftest import PAIR, grid_params
+from testing.mock_exchange import MockExchange, MockResponse
+
+FILTERS = {PAIR: {'tick_size': '0.50', 'step_size': '0.00100000', 'min_qty': '0.002', 'min_notional': '10'}}
+
+
+def test_filters_are_parsed_from_exchange_info():
+    exchange = MockExchange({PAIR: np.full(10, 100.0)}, filters=FILTERS)
+    metadata = bot.SymbolMetadataCache().get(exchange, PAIR)
+    assert (metadata['base_asset'], metadata['quote_asset'], metadata['status']) == ('BTC', 'USDT', 'TRADING')
+    assert (metadata['tick_size'], metadata['price_precision']) == (0.5, 1)
+    assert (metadata['min_price'], metadata['max_price']) == (0.5, 1000000.0)
+    assert (metadata['step_size'], metadata['qty_precision']) == (0.001, 3)
+    assert (metadata['min_qty'], metadata['max_qty']) == (0.002, 9000000.0)
+    assert metadata['min_notional'] == 10.0
+    assert metadata['cancel_replace_allowed'] is True
+    with pytest.raises(ValueError):
+        bot.SymbolMetadataCache().get(exchange, 'ETHUSDT')
+
+
+def test_legacy_min_notional_filter_and_missing_filters():
+    info = MockExchange({PAIR: np.full(10, 100.0)}).get_symbol_info(PAIR)
+    info['filters'] = [f for f in info['filters'] if f['filterType'] != 'NOTIONAL']
+    assert bot.SymbolMetadataCache.parse_symbol(info)['min_notional'] == 0.0
+    info['filters'].append({'filterType': 'MIN_NOTIONAL', 'minNotional': '5.00000000'})
+    assert bot.SymbolMetadataCache.parse_symbol(info)['min_notional'] == 5.0
+
+
+def test_snapshot_is_reused_until_the_ttl_and_kept_per_environment():
+    testnet = MockExchange({PAIR: np.full(10, 100.0)})
+    mainnet = MockExchange({PAIR: np.full(10, 100.0)}, filters=FILTERS, testnet=False)
+    cache = bot.SymbolMetadataCache(ttl=0.1)
+    cache.get(testnet, PAIR)
+    cache.get(testnet, PAIR)
+    assert testnet.request_count == 1
+    assert cache.get(mainnet, PAIR)['tick_size'] == 0.5
+    assert cache.get(testnet, PAIR)['tick_size'] == 0.01
+    time.sleep(0.15)
+    cache.get(testnet, PAIR)
+    assert testnet.request_count == 2
+
+
+def test_filter_rejection_reloads_the_filters(exchange):
+    grid_bot = bot.GridBot(exchange, grid_params(), None)
+    assert bot.symbol_cache.get(exchange, PAIR)['min_notional'] == 5.0
+    exchange.filters[PAIR]['min_notional'] = '50'
+    assert grid_bot.place_order(PAIR, 'BUY', '0.10000', '100.00') is None
+    assert bot.symbol_cache.get(exchange, PAIR)['min_notional'] == 50.0
+
+
+def test_other_errors_keep_the_cached_filters(exchange):
+    cache = bot.SymbolMetadataCache()
+    cache.get(exchange, PAIR)
+    response = MockResponse({}, 400, '{"code": -2010, "msg": "Duplicate order sent."}')
+    assert not cache.invalidate_on_filter_error(exchange, BinanceAPIException(response, 400, response.text))
+    cache.get(exchange, PAIR)
+    assert exchange.request_count == 1
@@ -0,0 +1,24 @@
+import queue
+
+import bot
+from testing.mock_exchange import FakeUserDataStreamServer, MockExchange
+
+
+def test_stream_delivers_fills_and_reconnects():
+    server = FakeUserDataStreamServer().start()
+    fills, connects = queue.Queue(), queue.Queue()
+    stream = bot.UserDataStream(MockExchange({'BTCUSDT': [100.0]}), fills.put, on_connect=connects.put,
+                                stream_url=server.url)
+    try:
+        stream.start()
+        assert stream.wait_connected(5)
+        assert connects.get(timeout=5) is False
+        server.push_fill('BTCUSDT', 7, 'BUY', 99.0, 0.5)
+        order = fills.get(timeout=5)
+        assert (order['orderId'], order['side'], order['executedQty']) == (7, 'BUY', '0.5')
+
+        server.drop_connections()
+        assert connects.get(timeout=10) is True
+    finally:
+        stream.stop()
+        server.stop()